@@ -0,0 +1,125 @@
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+import constants
+from editor_options import EditorOptions
+from enums import OperationType
+from image_editor import ImageEditor
+from image_operation import ImageOperation
+
+
+class BatchEditor:
+    """
+    Class applying the same list of operations on many images, spreading the images across worker processes.
+    """
+
+    def __init__(self, batch_input: str, batch_output: str, operations: List[ImageOperation],
+                 workers: Optional[int] = None, options: Optional[EditorOptions] = None):
+        """
+        :param batch_input: A directory of images, a glob pattern of images or a manifest file listing an image path
+        in every line.
+        :param batch_output: A directory to save the edited images into, or a filename template that may contain the
+        {name}, {stem}, {ext} and {index} fields of every image.
+        :param operations: Operations to apply on every image.
+        :param workers: Number of worker processes. None uses the number of CPUs.
+        :param options: Options of how every image editor applies the operations.
+        :raise: ValueError in case no images were found.
+        """
+        self._image_paths = collect_image_paths(batch_input)
+        if not self._image_paths:
+            raise ValueError(constants.EMPTY_BATCH_ERR_MSG)
+        self._batch_output = batch_output
+        self._operations = operations
+        self._workers = workers
+        self._options = options or EditorOptions()
+
+    def apply_operations(self) -> List[Tuple[str, str]]:
+        """
+        Applies the operations on all the images and saves the results. A failure of one image is reported without
+        aborting the batch, and the batch throughput is printed when it finishes.
+        :return: A list of tuples of the image path and the error message, for every image that failed.
+        """
+        failures = []
+        edited_pixels = 0
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            futures = {}
+            for index, image_path in enumerate(self._image_paths):
+                output_path = build_output_path(self._batch_output, image_path, index)
+                future = executor.submit(_edit_image, image_path, output_path, self._operations, self._options)
+                futures[future] = image_path
+
+            for future in as_completed(futures):
+                image_path = futures[future]
+                try:
+                    edited_pixels += future.result()
+                except Exception as e:
+                    failures.append((image_path, str(e)))
+                    print(f"Unable to edit {image_path}: {e}", file=sys.stderr)
+
+        elapsed_time = time.perf_counter() - start_time
+        edited_images = len(self._image_paths) - len(failures)
+        print(f"Edited {edited_images}/{len(self._image_paths)} images in {elapsed_time:.2f}s: "
+              f"{edited_images / elapsed_time:.2f} images/s, {edited_pixels / 1e6 / elapsed_time:.2f} megapixels/s.")
+        return failures
+
+
+def collect_image_paths(batch_input: str) -> List[str]:
+    """
+    Collects the paths of the images of a batch.
+    :param batch_input: A directory of images, a glob pattern of images or a manifest file listing an image path in
+    every line. Relative paths in a manifest are relative to the manifest directory.
+    :return: A list of image paths.
+    """
+    if os.path.isdir(batch_input):
+        return sorted(os.path.join(batch_input, file_name) for file_name in os.listdir(batch_input)
+                      if file_name.lower().endswith(constants.BATCH_IMAGE_EXTENSIONS))
+
+    if any(character in batch_input for character in constants.BATCH_GLOB_CHARACTERS):
+        return sorted(glob.glob(batch_input))
+
+    manifest_directory = os.path.dirname(batch_input)
+    with open(batch_input) as manifest:
+        return [os.path.join(manifest_directory, line.strip()) for line in manifest if line.strip()]
+
+
+def build_output_path(batch_output: str, image_path: str, index: int) -> str:
+    """
+    Builds the output path of a single image of a batch.
+    :param batch_output: A directory to save the image into, or a filename template that may contain the {name},
+    {stem}, {ext} and {index} fields.
+    :param image_path: Path of the input image.
+    :param index: Index of the image in the batch.
+    :return: The output path.
+    """
+    name = os.path.basename(image_path)
+    # Templates contain format fields, anything else is a directory
+    if "{" not in batch_output:
+        return os.path.join(batch_output, name)
+    stem, ext = os.path.splitext(name)
+    return batch_output.format(name=name, stem=stem, ext=ext, index=index)
+
+
+def _edit_image(image_path: str, output_path: str, operations: List[ImageOperation], options: EditorOptions) -> int:
+    """
+    Applies the operations on a single image of a batch and saves it. Runs in a worker process.
+    :param image_path: Path of the input image.
+    :param output_path: Path in which to save the edited image.
+    :param operations: Operations to apply on the image.
+    :param options: Options of how the image editor applies the operations.
+    :return: Number of pixels of the edited image.
+    """
+    output_directory = os.path.dirname(output_path)
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+    image_editor = ImageEditor(image_path,
+                               operations + [ImageOperation(type=OperationType.OUTPUT.value, output_path=output_path)],
+                               max_memory=options.max_memory, threads=options.threads, precision=options.precision,
+                               color_lut_size=options.color_lut_size,
+                               fuse_color_matrices=options.fuse_color_matrices)
+    image_editor.apply_operations()
+    width, height = image_editor.size
+    return width * height
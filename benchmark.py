@@ -0,0 +1,383 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+import numpy as np
+from cli import parse_command_line_arguments
+import constants
+from enums import AdjustmentType, FilterType, OperationType, Precision
+from image_editor import ImageEditor
+from image_utils import convert_array_to_image, convert_image_to_uint8_array, convert_to_rgb
+from image_operation import ImageOperation
+from PIL import Image
+from pipeline import Pipeline
+
+# Arguments of every filter and value of every adjustment used in the benchmark
+FILTER_BENCHMARK_ARGUMENTS = {
+    FilterType.BLUR.value: "--x 9 --y 9",
+    FilterType.EDGE_DETECTION.value: "",
+    FilterType.SHARPEN.value: "--x 1.2",
+    FilterType.INVERT.value: "",
+    FilterType.SEPIA.value: ""
+}
+ADJUSTMENT_BENCHMARK_VALUES = {
+    AdjustmentType.BRIGHTNESS.value: 30,
+    AdjustmentType.CONTRAST.value: 20,
+    AdjustmentType.SATURATION.value: 40,
+    AdjustmentType.TEMPERATURE.value: -30,
+    AdjustmentType.EXPOSURE.value: 20
+}
+# Representative chained pipelines
+PIPELINE_BENCHMARKS = {
+    "pipeline_point_adjustments": "--adjust brightness 20 contrast 30 exposure -10 temperature 40 --filter invert",
+    "pipeline_vintage_look": "--adjust saturation -30 contrast 15 --filter sepia --adjust temperature 20 exposure 10",
+    "pipeline_blur_sharpen": "--filter blur --x 25 --y 25 --filter sharpen --x 1.5 --filter edge_detection"
+}
+# Formats timed for decoding and encoding
+CODEC_BENCHMARK_FORMATS = ["jpg", "png"]
+BENCHMARK_SIZES = ["256x256", "1024x1024", "2048x2048", "3840x2160", "7680x4320"]
+
+THREAD_SCALING_PIPELINE = "--filter blur --x 9 --y 9 --filter sharpen --x 1.2 --adjust saturation 30 contrast 20 " \
+                          "--filter sepia"
+
+STARTUP_PIPELINE = "--adjust brightness 20 contrast 10 --filter blur --x 5 --y 5"
+
+# Operations with a fixed-point version, and the documented maximal deviation in levels of their fixed-point result from
+# their float result. The automatic precision should never deviate
+FIXED_POINT_DEVIATION_CASES = {
+    "blur": ("--filter blur --x 9 --y 9", 0),
+    "blur_large_kernel": ("--filter blur --x 301 --y 301", 1),
+    "sharpen": ("--filter sharpen --x 1.5", 0),
+    "sepia": ("--filter sepia", 1),
+    "color_matrix": ("--adjust exposure -20 --filter sepia --adjust brightness 10", 1)
+}
+SAMPLE_IMAGES_PATTERN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", "*.jpg")
+
+
+def parse_pipeline(pipeline: str) -> List[ImageOperation]:
+    """
+    Parses a pipeline written in the command line syntax of the operations.
+    :param pipeline: Operations in command line syntax, for example "--adjust brightness 10 --filter invert".
+    :return: A list of the parsed operations.
+    """
+    _, operations = parse_command_line_arguments(["", constants.EDIT_CMD, constants.IMAGE_CMD, ""] + pipeline.split())
+    return operations
+
+
+def create_synthetic_image(path: str, width: int, height: int) -> None:
+    """
+    Creates a reproducible synthetic image, a smooth gradient with noise, and saves it.
+    :param path: Path in which to save the image.
+    :param width: Width of the image.
+    :param height: Height of the image.
+    :return: None.
+    """
+    rng = np.random.default_rng(0)
+    rows, columns = np.mgrid[0:height, 0:width]
+    gradient = np.stack((rows * 255 // max(height - 1, 1), columns * 255 // max(width - 1, 1),
+                         (rows + columns) * 255 // max(height + width - 2, 1)), axis=2)
+    noise = rng.integers(-20, 21, size=gradient.shape)
+    image_array = np.clip(gradient + noise, constants.MIN_INTENSITY, constants.MAX_INTENSITY).astype(np.uint8)
+    convert_array_to_image(image_array).save(path)
+
+
+def time_pipeline(image_path: str, operations: List[ImageOperation], repeats: int, **editor_arguments) -> float:
+    """
+    Times applying operations on an image, excluding decoding the image.
+    :param image_path: Path of the input image.
+    :param operations: Operations to apply.
+    :param repeats: Number of runs, the fastest is reported.
+    :param editor_arguments: Additional arguments of ImageEditor.
+    :return: The fastest run time in seconds.
+    """
+    run_times = []
+    for _ in range(repeats):
+        image_editor = ImageEditor(image_path, operations, **editor_arguments)
+        start_time = time.perf_counter()
+        image_editor.apply_operations()
+        run_times.append(time.perf_counter() - start_time)
+    return min(run_times)
+
+
+def benchmark_cases() -> Dict[str, str]:
+    """
+    Builds the compute benchmark cases: every filter, every adjustment and the chained pipelines.
+    :return: A dictionary from the case name to its operations in command line syntax.
+    """
+    cases = {}
+    for filter_type, arguments in FILTER_BENCHMARK_ARGUMENTS.items():
+        cases[f"filter_{filter_type}"] = f"--filter {filter_type} {arguments}".strip()
+    for adjustment_type in AdjustmentType:
+        cases[f"adjust_{adjustment_type.value}"] = f"--adjust {adjustment_type.value} " \
+                                                   f"{ADJUSTMENT_BENCHMARK_VALUES[adjustment_type.value]}"
+    cases.update(PIPELINE_BENCHMARKS)
+    return cases
+
+
+def measure_peak_memory(function) -> int:
+    """
+    Measures the peak memory allocated while running a function, including numpy arrays.
+    :param function: Function to run, without arguments.
+    :return: Peak allocated bytes above the memory allocated before running the function.
+    """
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] - start_memory
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_case(name: str, size: str, megapixels: float, run, prepare, repeats: int) -> dict:
+    """
+    Times a single benchmark case and measures its peak memory.
+    :param name: Name of the case.
+    :param size: Image size of the case, WIDTHxHEIGHT.
+    :param megapixels: Number of megapixels processed by a single run.
+    :param run: Function running the timed part of the case on the object returned by prepare.
+    :param prepare: Function preparing a single run, which isn't timed.
+    :param repeats: Number of timed runs, the fastest is reported.
+    :return: A dictionary of the case results.
+    """
+    run_times = []
+    for _ in range(repeats):
+        prepared = prepare()
+        start_time = time.perf_counter()
+        run(prepared)
+        run_times.append(time.perf_counter() - start_time)
+    prepared = prepare()
+    peak_memory = measure_peak_memory(lambda: run(prepared))
+    seconds = min(run_times)
+    return {"case": name, "size": size, "seconds": seconds, "megapixels_per_second": megapixels / seconds,
+            "peak_memory_bytes": peak_memory}
+
+
+def run_benchmark_suite(sizes: List[str], repeats: int, case_filter: str = "") -> Dict[str, dict]:
+    """
+    Runs the codec and compute benchmarks on synthetic images of every size.
+    :param sizes: Image sizes, WIDTHxHEIGHT.
+    :param repeats: Number of timed runs of every case.
+    :param case_filter: Only cases whose name contains this string are run.
+    :return: A dictionary from "case@size" to the case results.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            width, height = (int(dimension) for dimension in size.split("x"))
+            megapixels = width * height / 1e6
+            image_paths = {}
+            for image_format in CODEC_BENCHMARK_FORMATS:
+                image_paths[image_format] = os.path.join(directory, f"input_{size}.{image_format}")
+                create_synthetic_image(image_paths[image_format], width, height)
+
+            cases = []
+            for image_format, image_path in image_paths.items():
+                output_path = os.path.join(directory, f"output.{image_format}")
+                output_operations = [ImageOperation(type=OperationType.OUTPUT.value, output_path=output_path)]
+                cases.append((f"decode_{image_format}", lambda path=image_path: path,
+                              lambda path: ImageEditor(path, [])))
+                cases.append((f"encode_{image_format}",
+                              lambda path=image_path, operations=output_operations: ImageEditor(path, operations),
+                              lambda image_editor: image_editor.apply_operations()))
+            for name, pipeline in benchmark_cases().items():
+                operations = parse_pipeline(pipeline)
+                cases.append((name,
+                              lambda path=image_paths["png"], operations=operations: ImageEditor(path, operations),
+                              lambda image_editor: image_editor.apply_operations()))
+
+            for name, prepare, run in cases:
+                if case_filter not in name:
+                    continue
+                result = benchmark_case(name, size, megapixels, run, prepare, repeats)
+                results[f"{name}@{size}"] = result
+                print(f"{name:<30} {size:>10} {result['seconds']:>9.4f}s {result['megapixels_per_second']:>9.2f} MP/s "
+                      f"{result['peak_memory_bytes'] / 2 ** 20:>9.1f} MiB peak", flush=True)
+    return results
+
+
+def compare_to_baseline(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """
+    Compares benchmark results to stored baseline results.
+    :param results: Current results, from "case@size" to the case results.
+    :param baseline: Baseline results, in the same format.
+    :param threshold: Allowed relative throughput decrease, for example 0.1 for 10%.
+    :return: A list of the keys whose throughput regressed beyond the threshold.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["megapixels_per_second"] / baseline[key]["megapixels_per_second"]
+        if ratio < 1 - threshold:
+            regressions.append(key)
+            print(f"Regression in {key}: {ratio:.2f}x of the baseline throughput.", file=sys.stderr)
+    return regressions
+
+
+def benchmark_thread_scaling(image_path: str, pipeline: str, max_threads: int, repeats: int) -> None:
+    """
+    Prints the run time and speedup of a pipeline for an increasing number of threads.
+    :param image_path: Path of the input image.
+    :param pipeline: Operations in command line syntax.
+    :param max_threads: Maximal number of threads.
+    :param repeats: Number of runs of every thread count.
+    :return: None.
+    """
+    operations = parse_pipeline(pipeline)
+    thread_counts = sorted({1} | {2 ** i for i in range(max_threads.bit_length()) if 2 ** i <= max_threads}
+                           | {max_threads})
+    single_thread_time = None
+    for threads in thread_counts:
+        run_time = time_pipeline(image_path, operations, repeats, threads=threads)
+        single_thread_time = single_thread_time or run_time
+        print(f"threads={threads:<3} time={run_time:.3f}s speedup={single_thread_time / run_time:.2f}x")
+
+
+def benchmark_startup(image_path: str, repeats: int) -> None:
+    """
+    Prints the wall time of starting the program to reject an invalid command line or value and to validate a command
+    line, against the time of importing the editor modules, which the program used to import before parsing the command
+    line.
+    :param image_path: Path of the input image.
+    :param repeats: Number of runs of every command, the fastest of which is reported.
+    :return: None.
+    """
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    output_path = os.path.join(os.path.dirname(image_path), "output.png")
+    edit_command = [sys.executable, main_path, constants.EDIT_CMD, constants.IMAGE_CMD, image_path]
+    commands = {
+        "interpreter": [sys.executable, "-c", "pass"],
+        "import editor modules": [sys.executable, "-c", "import image_editor, batch_editor, result_cache"],
+        "invalid command line": edit_command + [constants.FILTER_CMD, "unknown"],
+        "invalid value": edit_command + [constants.ADJUST_CMD, "brightness", "1000"],
+        "validate only": edit_command + STARTUP_PIPELINE.split() + [constants.OUTPUT_CMD, output_path,
+                                                                    constants.VALIDATE_ONLY_CMD],
+        "edit": edit_command + STARTUP_PIPELINE.split() + [constants.OUTPUT_CMD, output_path, constants.NO_CACHE_CMD]
+    }
+    for name, command in commands.items():
+        run_times = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            subprocess.run(command, cwd=os.path.dirname(main_path), stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            run_times.append(time.perf_counter() - start_time)
+        print(f"{name:<22} time={min(run_times) * 1000:.1f}ms")
+
+
+def check_fixed_point_deviations(image_paths: List[str], repeats: int) -> List[str]:
+    """
+    Applies every fixed-point case in float, fixed and automatic precision on every image, and prints the maximal
+    deviation from the float result along with the speedup of the fixed precision. Images a case can't be applied on
+    are skipped.
+    :param image_paths: Paths of the images to check.
+    :param repeats: Number of timed runs of every precision, the fastest is reported.
+    :return: A list of the cases deviating beyond their documented maximal deviation.
+    """
+    images = [convert_image_to_uint8_array(convert_to_rgb(Image.open(image_path))) for image_path in image_paths]
+    failed_cases = []
+    for name, (pipeline, max_deviation) in FIXED_POINT_DEVIATION_CASES.items():
+        operations = parse_pipeline(pipeline)
+        # The color matrices are fused in every precision, so that their fixed-point version is checked as well
+        pipelines = {precision.value: Pipeline(operations, precision=precision.value, fuse_color_matrices=True)
+                     for precision in Precision}
+        deviations = {precision: 0 for precision in pipelines}
+        run_times = {precision: 0.0 for precision in pipelines}
+        for image_array in images:
+            results = {}
+            image_run_times = {precision: [] for precision in pipelines}
+            try:
+                for precision, precision_pipeline in pipelines.items():
+                    for _ in range(repeats):
+                        start_time = time.perf_counter()
+                        results[precision] = precision_pipeline.apply(image_array)
+                        image_run_times[precision].append(time.perf_counter() - start_time)
+            except ValueError:
+                # The case can't be applied on the image, for example an image smaller than its kernel
+                continue
+            for precision in pipelines:
+                run_times[precision] += min(image_run_times[precision])
+            float_result = results[Precision.FLOAT.value].astype(np.int16)
+            for precision, result in results.items():
+                deviations[precision] = max(deviations[precision], int(np.abs(result - float_result).max()))
+        passed = deviations[Precision.FIXED.value] <= max_deviation and deviations[Precision.AUTO.value] == 0
+        if not passed:
+            failed_cases.append(name)
+        print(f"{name:<20} fixed deviation={deviations[Precision.FIXED.value]} (max {max_deviation}) "
+              f"auto deviation={deviations[Precision.AUTO.value]} "
+              f"speedup={run_times[Precision.FLOAT.value] / run_times[Precision.FIXED.value]:.2f}x "
+              f"{'ok' if passed else 'FAILED'}")
+    return failed_cases
+
+
+def main() -> None:
+    """
+    Runs the benchmarks given in the command line.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the image editing CLI tool.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    threads_parser = subparsers.add_parser("threads", help="Speedup of a pipeline with the number of threads.")
+    threads_parser.add_argument("--size", default="4000x3000", help="Synthetic image size, WIDTHxHEIGHT.")
+    threads_parser.add_argument("--max-threads", type=int, default=os.cpu_count(), help="Maximal number of threads.")
+    threads_parser.add_argument("--pipeline", default=THREAD_SCALING_PIPELINE, help="Operations to apply.")
+    threads_parser.add_argument("--repeats", type=int, default=3, help="Number of runs of every thread count.")
+    suite_parser = subparsers.add_parser("suite", help="Throughput and peak memory of every filter, adjustment, "
+                                                       "pipeline and codec.")
+    suite_parser.add_argument("--sizes", nargs="+", default=BENCHMARK_SIZES,
+                              help="Synthetic image sizes, WIDTHxHEIGHT.")
+    suite_parser.add_argument("--repeats", type=int, default=3, help="Number of runs of every case.")
+    suite_parser.add_argument("--cases", default="", help="Only run cases whose name contains this string.")
+    suite_parser.add_argument("--output", help="Path of a JSON file to write the results into.")
+    suite_parser.add_argument("--baseline", help="Path of a JSON results file to compare the results against.")
+    suite_parser.add_argument("--threshold", type=float, default=0.1,
+                              help="Allowed relative throughput decrease before failing, for example 0.1 for 10%%.")
+    startup_parser = subparsers.add_parser("startup", help="Startup time of rejecting and validating command lines.")
+    startup_parser.add_argument("--repeats", type=int, default=10, help="Number of runs of every command.")
+    precision_parser = subparsers.add_parser("precision", help="Deviation of the fixed-point operations from the "
+                                                               "float ones on the sample images, failing beyond the "
+                                                               "documented maximum.")
+    precision_parser.add_argument("--images", nargs="+", help="Images to check, the sample images by default.")
+    precision_parser.add_argument("--repeats", type=int, default=3, help="Number of runs of every precision.")
+    args = parser.parse_args()
+
+    if args.benchmark == "suite":
+        results = run_benchmark_suite(args.sizes, args.repeats, args.cases)
+        if args.output:
+            with open(args.output, "w") as output_file:
+                json.dump({"environment": {"python": platform.python_version(), "numpy": np.__version__,
+                                           "machine": platform.machine(), "cpus": os.cpu_count()},
+                           "results": results}, output_file, indent=2)
+        if args.baseline:
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)["results"]
+            if compare_to_baseline(results, baseline, args.threshold):
+                sys.exit(1)
+
+    elif args.benchmark == "threads":
+        width, height = (int(dimension) for dimension in args.size.split("x"))
+        with tempfile.TemporaryDirectory() as directory:
+            image_path = os.path.join(directory, "input.png")
+            create_synthetic_image(image_path, width, height)
+            benchmark_thread_scaling(image_path, args.pipeline, args.max_threads, args.repeats)
+
+    elif args.benchmark == "precision":
+        if check_fixed_point_deviations(args.images or sorted(glob.glob(SAMPLE_IMAGES_PATTERN)), args.repeats):
+            sys.exit(1)
+
+    elif args.benchmark == "startup":
+        with tempfile.TemporaryDirectory() as directory:
+            image_path = os.path.join(directory, "input.png")
+            create_synthetic_image(image_path, 256, 256)
+            benchmark_startup(image_path, args.repeats)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,26 @@
+import glob
+import os
+import shlex
 from typing import List, Tuple
-from enums import AdjustmentType, FilterType, OperationType
+from enums import AdjustmentType, FilterType, OperationType, Precision, ResizeType
 import constants
+from editor_options import EditorOptions
 from image_operation import ImageOperation
+from kernels import read_kernel_file
+
+# Valid range and error message of the value of every adjustment
+ADJUSTMENT_VALUE_RANGES = {
+    AdjustmentType.BRIGHTNESS.value: (constants.MIN_BRIGHTNESS_VAL, constants.MAX_BRIGHTNESS_VAL,
+                                      constants.INVALID_BRIGHTNESS_VAL_ERR_MSG),
+    AdjustmentType.CONTRAST.value: (constants.MIN_CONTRAST_VAL, constants.MAX_CONTRAST_VAL,
+                                    constants.INVALID_CONTRAST_VAL_ERR_MSG),
+    AdjustmentType.SATURATION.value: (constants.MIN_SATURATION_VAL, constants.MAX_SATURATION_VAL,
+                                      constants.INVALID_SATURATION_VAL_ERR_MSG),
+    AdjustmentType.TEMPERATURE.value: (constants.MIN_TEMPERATURE_VAL, constants.MAX_TEMPERATURE_VAL,
+                                       constants.INVALID_TEMPERATURE_VAL_ERR_MSG),
+    AdjustmentType.EXPOSURE.value: (constants.MIN_EXPOSURE_VAL, constants.MAX_EXPOSURE_VAL,
+                                    constants.INVALID_EXPOSURE_VAL_ERR_MSG)
+}
 
 
 def parse_command_line_arguments(args: List) -> Tuple:
@@ -22,6 +41,9 @@ def parse_command_line_arguments(args: List) -> Tuple:
         elif cur_arg == constants.ADJUST_CMD:
             i, operations = _parse_adjustment(args, i + 1)
 
+        elif cur_arg in [constants.RESIZE_CMD, constants.FIT_CMD]:
+            i, operations = _parse_resize(args, i + 1, cur_arg)
+
         elif cur_arg == constants.DISPLAY_CMD:
             i, operations = _parse_display(args, i + 1)
 
@@ -35,6 +57,394 @@ def parse_command_line_arguments(args: List) -> Tuple:
     return image_path, all_operations
 
 
+def parse_editor_options(args: List) -> Tuple:
+    """
+    Parses the editor options from the command line arguments. Options can appear anywhere after the command, and
+    don't change the result image, only how the operations are applied, other than the fixed-point precision changing
+    it by at most 1 level, and the color lookup tables and fused color matrices approximating the operations they fuse.
+    :param args: Command line arguments inputted.
+    :return: A tuple containing the command line arguments without the options, and the parsed EditorOptions.
+    :raise: ValueError in case of invalid options.
+    """
+    options = EditorOptions()
+    remaining_args = []
+    i = 0
+    while i < len(args):
+        if args[i] == constants.MAX_MEMORY_CMD:
+            if i + 1 >= len(args):
+                raise ValueError(constants.INVALID_MAX_MEMORY_ARGUMENT_ERR_MSG)
+            options.max_memory = _parse_memory_size(args[i + 1])
+            i += 2
+        elif args[i] == constants.THREADS_CMD:
+            if i + 1 >= len(args) or not args[i + 1].isdigit() or int(args[i + 1]) == 0:
+                raise ValueError(constants.INVALID_THREADS_ARGUMENT_ERR_MSG)
+            options.threads = int(args[i + 1])
+            i += 2
+        elif args[i] == constants.PROFILE_CMD:
+            # The profile path is optional, any following argument that isn't a command is the path
+            if i + 1 < len(args) and not args[i + 1].startswith("--"):
+                options.profile_path = args[i + 1]
+                i += 2
+            else:
+                options.profile_path = constants.DEFAULT_PROFILE_PATH
+                i += 1
+        elif args[i] == constants.PREVIEW_CMD:
+            # The preview size is optional, any following argument that isn't a command is the size
+            if i + 1 < len(args) and not args[i + 1].startswith("--"):
+                if not args[i + 1].isdigit() or int(args[i + 1]) == 0:
+                    raise ValueError(constants.INVALID_PREVIEW_ARGUMENT_ERR_MSG)
+                options.preview_size = int(args[i + 1])
+                i += 2
+            else:
+                options.preview_size = constants.DEFAULT_PREVIEW_SIZE
+                i += 1
+        elif args[i] == constants.PRECISION_CMD:
+            if i + 1 >= len(args) or args[i + 1] not in [precision.value for precision in Precision]:
+                raise ValueError(constants.INVALID_PRECISION_ARGUMENT_ERR_MSG)
+            options.precision = args[i + 1]
+            i += 2
+        elif args[i] == constants.COLOR_LUT_CMD:
+            # The table size is optional, any following argument that isn't a command is the size
+            if i + 1 < len(args) and not args[i + 1].startswith("--"):
+                options.color_lut_size = _parse_color_lut_size(args[i + 1])
+                i += 2
+            else:
+                options.color_lut_size = constants.DEFAULT_COLOR_LUT_SIZE
+                i += 1
+        elif args[i] == constants.FUSE_COLOR_MATRICES_CMD:
+            options.fuse_color_matrices = True
+            i += 1
+        elif args[i] == constants.FRAMES_CMD:
+            options.frames = True
+            i += 1
+        elif args[i] == constants.FRAME_WORKERS_CMD:
+            if i + 1 >= len(args) or not args[i + 1].isdigit() or int(args[i + 1]) == 0:
+                raise ValueError(constants.INVALID_FRAME_WORKERS_ARGUMENT_ERR_MSG)
+            # Spreading the frames across worker processes implies editing all the frames
+            options.frames = True
+            options.frame_workers = int(args[i + 1])
+            i += 2
+        elif args[i] in [constants.VALIDATE_ONLY_CMD, constants.DRY_RUN_CMD]:
+            options.validate_only = True
+            i += 1
+        elif args[i] == constants.WATCH_CMD:
+            if i + 1 >= len(args) or args[i + 1].startswith("--"):
+                raise ValueError(constants.INVALID_WATCH_ARGUMENT_ERR_MSG)
+            options.watch_path = args[i + 1]
+            i += 2
+        elif args[i] == constants.CHECKPOINT_MEMORY_CMD:
+            if i + 1 >= len(args):
+                raise ValueError(constants.INVALID_CHECKPOINT_MEMORY_ARGUMENT_ERR_MSG)
+            options.checkpoint_memory = _parse_memory_size(args[i + 1],
+                                                           constants.INVALID_CHECKPOINT_MEMORY_ARGUMENT_ERR_MSG)
+            i += 2
+        elif args[i] == constants.NO_CACHE_CMD:
+            options.use_cache = False
+            i += 1
+        elif args[i] == constants.CACHE_SIZE_CMD:
+            if i + 1 >= len(args):
+                raise ValueError(constants.INVALID_CACHE_SIZE_ARGUMENT_ERR_MSG)
+            options.cache_size = _parse_memory_size(args[i + 1], constants.INVALID_CACHE_SIZE_ARGUMENT_ERR_MSG)
+            i += 2
+        else:
+            remaining_args.append(args[i])
+            i += 1
+    return remaining_args, options
+
+
+def parse_batch_command_line_arguments(args: List) -> Tuple:
+    """
+    Parses command line arguments of a batch, which applies the same operations on many images.
+    The batch arguments are in format: edit_batch --input <directory|glob|manifest> --output <directory|template>
+    [--workers <count>] followed by the operations, parsed once like the operations of a single image.
+    :param args: Command line arguments inputted.
+    :return: A tuple containing the batch input, the batch output, the number of workers (None for the number of
+    CPUs) and a list of operations to apply on every image.
+    :raise: ValueError in case of invalid arguments.
+    """
+    # Checking if first argument is edit_batch
+    if len(args) < 2 or args[1] != constants.BATCH_CMD:
+        raise ValueError(constants.INVALID_FIRST_ARGUMENT_ERR_MSG)
+    # Checking if second argument is --input
+    if len(args) < 4 or args[2] != constants.INPUT_CMD:
+        raise ValueError(constants.INVALID_BATCH_INPUT_ARGUMENT_ERR_MSG)
+    # Checking if third argument is --output
+    if len(args) < 6 or args[4] != constants.OUTPUT_CMD:
+        raise ValueError(constants.INVALID_BATCH_OUTPUT_ARGUMENT_ERR_MSG)
+    batch_input, batch_output = args[3], args[5]
+
+    i = 6
+    workers = None
+    if i < len(args) and args[i] == constants.WORKERS_CMD:
+        if i + 1 >= len(args) or not args[i + 1].isdigit() or int(args[i + 1]) == 0:
+            raise ValueError(constants.INVALID_WORKERS_ARGUMENT_ERR_MSG)
+        workers = int(args[i + 1])
+        i += 2
+
+    # Parsing the operations once, as if they were given for a single image
+    _, operations = parse_command_line_arguments([args[0], constants.EDIT_CMD, constants.IMAGE_CMD, batch_input]
+                                                 + args[i:])
+    if any(operation.type in [OperationType.DISPLAY.value, OperationType.OUTPUT.value] for operation in operations):
+        raise ValueError(constants.INVALID_BATCH_OPERATION_ERR_MSG)
+    return batch_input, batch_output, workers, operations
+
+
+def parse_serve_command_line_arguments(args: List) -> Tuple:
+    """
+    Parses command line arguments of the daemon, in format: serve [--socket <path>] [--jobs <count>].
+    :param args: Command line arguments inputted.
+    :return: A tuple containing the socket path (None for the default path) and the maximal number of concurrent jobs.
+    :raise: ValueError in case of invalid arguments.
+    """
+    if len(args) < 2 or args[1] != constants.SERVE_CMD:
+        raise ValueError(constants.INVALID_FIRST_ARGUMENT_ERR_MSG)
+    socket_path = None
+    jobs = constants.DEFAULT_DAEMON_JOBS
+    i = 2
+    while i < len(args):
+        if args[i] == constants.SOCKET_CMD:
+            if i + 1 >= len(args):
+                raise ValueError(constants.INVALID_SOCKET_ARGUMENT_ERR_MSG)
+            socket_path = args[i + 1]
+        elif args[i] == constants.JOBS_CMD:
+            if i + 1 >= len(args) or not args[i + 1].isdigit() or int(args[i + 1]) == 0:
+                raise ValueError(constants.INVALID_JOBS_ARGUMENT_ERR_MSG)
+            jobs = int(args[i + 1])
+        else:
+            raise ValueError(constants.INVALID_SERVE_ARGUMENT_ERR_MSG)
+        i += 2
+    return socket_path, jobs
+
+
+def parse_export_lut_command_line_arguments(args: List) -> Tuple:
+    """
+    Parses command line arguments of exporting a color lookup table, in format: export_lut --output <path.cube>
+    [--size <size>] followed by the operations to bake, parsed like the operations of a single image.
+    :param args: Command line arguments inputted.
+    :return: A tuple containing the path of the .cube file, the number of grid nodes along every channel and a list of
+    the operations to bake.
+    :raise: ValueError in case of invalid arguments.
+    """
+    if len(args) < 2 or args[1] != constants.EXPORT_LUT_CMD:
+        raise ValueError(constants.INVALID_FIRST_ARGUMENT_ERR_MSG)
+    if len(args) < 4 or args[2] != constants.OUTPUT_CMD:
+        raise ValueError(constants.INVALID_EXPORT_LUT_OUTPUT_ARGUMENT_ERR_MSG)
+    cube_path = args[3]
+
+    i = 4
+    size = constants.DEFAULT_COLOR_LUT_SIZE
+    if i < len(args) and args[i] == constants.SIZE_CMD:
+        if i + 1 >= len(args):
+            raise ValueError(constants.INVALID_COLOR_LUT_ARGUMENT_ERR_MSG)
+        size = _parse_color_lut_size(args[i + 1])
+        i += 2
+
+    _, operations = parse_command_line_arguments([args[0], constants.EDIT_CMD, constants.IMAGE_CMD, cube_path]
+                                                 + args[i:])
+    if any(operation.type != OperationType.ADJUSTMENT.value
+           and operation.sub_type not in [FilterType.INVERT.value, FilterType.SEPIA.value] for operation in operations):
+        raise ValueError(constants.INVALID_COLOR_LUT_OPERATION_ERR_MSG)
+    return cube_path, size, operations
+
+
+def parse_submit_command_line_arguments(args: List) -> Tuple:
+    """
+    Parses command line arguments of submitting a job to the job queue, in format: submit [--queue <path>] --image
+    <image_path> followed by the operations and editor options, as edit_image gets them. The paths in them are relative
+    to the working directory of the submitting process.
+    :param args: Command line arguments inputted.
+    :return: A tuple containing the queue path (None for the default path), and the command line arguments of
+    edit_image to run as the job.
+    :raise: ValueError in case of invalid arguments.
+    """
+    if len(args) < 2 or args[1] != constants.SUBMIT_CMD:
+        raise ValueError(constants.INVALID_FIRST_ARGUMENT_ERR_MSG)
+    queue_path = None
+    i = 2
+    if i < len(args) and args[i] == constants.QUEUE_CMD:
+        if i + 1 >= len(args):
+            raise ValueError(constants.INVALID_QUEUE_ARGUMENT_ERR_MSG)
+        queue_path = args[i + 1]
+        i += 2
+
+    # Checking the job as edit_image would, so an invalid job is never queued
+    job_args = [args[0], constants.EDIT_CMD] + args[i:]
+    arguments, options = parse_editor_options(job_args)
+    _, operations = parse_command_line_arguments(arguments)
+    validate_operations(operations)
+    if options.frames:
+        validate_frame_operations(operations)
+    if options.preview_size is not None or options.validate_only or options.watch_path is not None \
+            or any(operation.type == OperationType.DISPLAY.value for operation in operations):
+        raise ValueError(constants.INVALID_QUEUED_OPERATION_ERR_MSG)
+    return queue_path, job_args
+
+
+def parse_worker_command_line_arguments(args: List) -> Tuple:
+    """
+    Parses command line arguments of a job queue worker, in format: worker [--queue <path>] [--jobs <count>]
+    [--exit-when-idle].
+    :param args: Command line arguments inputted.
+    :return: A tuple containing the queue path (None for the default path), the maximal number of jobs run at the same
+    time, and whether to exit once no job is left to claim.
+    :raise: ValueError in case of invalid arguments.
+    """
+    if len(args) < 2 or args[1] != constants.WORKER_CMD:
+        raise ValueError(constants.INVALID_FIRST_ARGUMENT_ERR_MSG)
+    queue_path = None
+    jobs = constants.DEFAULT_WORKER_JOBS
+    exit_when_idle = False
+    i = 2
+    while i < len(args):
+        if args[i] == constants.QUEUE_CMD:
+            if i + 1 >= len(args):
+                raise ValueError(constants.INVALID_QUEUE_ARGUMENT_ERR_MSG)
+            queue_path = args[i + 1]
+            i += 2
+        elif args[i] == constants.JOBS_CMD:
+            if i + 1 >= len(args) or not args[i + 1].isdigit() or int(args[i + 1]) == 0:
+                raise ValueError(constants.INVALID_JOBS_ARGUMENT_ERR_MSG)
+            jobs = int(args[i + 1])
+            i += 2
+        elif args[i] == constants.EXIT_WHEN_IDLE_CMD:
+            exit_when_idle = True
+            i += 1
+        else:
+            raise ValueError(constants.INVALID_WORKER_ARGUMENT_ERR_MSG)
+    return queue_path, jobs, exit_when_idle
+
+
+def parse_queue_status_command_line_arguments(args: List) -> Tuple:
+    """
+    Parses command line arguments of the job queue status, in format: queue_status [--queue <path>] [--job <id>].
+    :param args: Command line arguments inputted.
+    :return: A tuple containing the queue path (None for the default path), and the id of a job to show (None for the
+    status of the whole queue).
+    :raise: ValueError in case of invalid arguments.
+    """
+    if len(args) < 2 or args[1] != constants.QUEUE_STATUS_CMD:
+        raise ValueError(constants.INVALID_FIRST_ARGUMENT_ERR_MSG)
+    queue_path = None
+    job_id = None
+    i = 2
+    while i < len(args):
+        if args[i] == constants.QUEUE_CMD:
+            if i + 1 >= len(args):
+                raise ValueError(constants.INVALID_QUEUE_ARGUMENT_ERR_MSG)
+            queue_path = args[i + 1]
+        elif args[i] == constants.JOB_CMD:
+            if i + 1 >= len(args) or not args[i + 1].isdigit() or int(args[i + 1]) == 0:
+                raise ValueError(constants.INVALID_JOB_ARGUMENT_ERR_MSG)
+            job_id = int(args[i + 1])
+        else:
+            raise ValueError(constants.INVALID_QUEUE_STATUS_ARGUMENT_ERR_MSG)
+        i += 2
+    return queue_path, job_id
+
+
+def validate_operations(operations: List[ImageOperation]) -> None:
+    """
+    Checks the values of all the operations, as applying them would, without loading the image. Kernel sizes are
+    checked against the image size only when applying the operations.
+    :param operations: Operations to check.
+    :return: None.
+    :raise: ValueError in case of an invalid value, IOError in case the directory of an output doesn't exist.
+    """
+    for operation in operations:
+        if operation.type == OperationType.ADJUSTMENT.value:
+            min_value, max_value, error_message = ADJUSTMENT_VALUE_RANGES[operation.sub_type]
+            if operation.value > max_value or operation.value < min_value:
+                raise ValueError(error_message)
+
+        elif operation.type == OperationType.FILTER.value:
+            if operation.sub_type == FilterType.BLUR.value and (operation.x <= 0 or operation.y <= 0):
+                raise ValueError(constants.UNSPECIFIED_KERNEL_SIZE_ERR_MSG)
+            if operation.sub_type == FilterType.SHARPEN.value and operation.x < 1:
+                raise ValueError(constants.INVALID_SHARPEN_MAGNITUDE_ERR_MSG)
+            if operation.sub_type == FilterType.KERNEL.value and operation.kernel is None:
+                read_kernel_file(operation.kernel_path)
+
+        elif operation.type == OperationType.OUTPUT.value:
+            output_directory = os.path.dirname(operation.output_path)
+            if output_directory and not os.path.isdir(output_directory):
+                raise IOError(constants.MISSING_OUTPUT_DIRECTORY_ERR_MSG.format(directory=output_directory))
+
+
+def validate_frame_operations(operations: List[ImageOperation]) -> None:
+    """
+    Checks that the operations can be applied on all the frames of an image, which are streamed from the input to the
+    outputs without displaying them.
+    :param operations: Operations to check.
+    :return: None.
+    :raise: ValueError in case an operation displays the image, or outputs it in a format without multiple frames.
+    """
+    for operation in operations:
+        if operation.type == OperationType.DISPLAY.value or (
+                operation.type == OperationType.OUTPUT.value and not operation.output_path.lower().endswith(
+                    (constants.GIF_EXTENSION,) + constants.TIFF_EXTENSIONS)):
+            raise ValueError(constants.INVALID_FRAMES_OPERATION_ERR_MSG)
+
+
+def validate_watch_command(operations: List[ImageOperation], options: EditorOptions) -> None:
+    """
+    Checks that a watched edit takes all its operations from the pipeline file, and renders the full size image.
+    :param operations: Operations given in the command line.
+    :param options: Parsed editor options.
+    :return: None.
+    :raise: ValueError in case operations are given in the command line, or a preview or all frames are asked for.
+    """
+    if operations or options.preview_size is not None or options.frames:
+        raise ValueError(constants.INVALID_WATCH_COMMAND_ERR_MSG)
+
+
+def read_pipeline_file(pipeline_path: str) -> List[ImageOperation]:
+    """
+    Reads a pipeline file, holding operations in command line form split across any number of lines, for example
+    '--filter blur --x 5 --y 5' in one line and '--output result.png' in the next. Text after a # is ignored.
+    :param pipeline_path: Path of the pipeline file.
+    :return: A list of the operations in the file, in order.
+    :raise: IOError in case the file can't be read, ValueError in case it holds invalid operations.
+    """
+    try:
+        with open(pipeline_path) as pipeline_file:
+            pipeline_text = pipeline_file.read()
+    except IOError as e:
+        raise IOError(f"Unable to read pipeline file: {e}.")
+    try:
+        pipeline_args = shlex.split(pipeline_text, comments=True)
+    except ValueError:
+        raise ValueError(constants.INVALID_PIPELINE_FILE_ERR_MSG)
+    # Parsing the operations as if they were given in the command line of the image
+    _, operations = parse_command_line_arguments(["", constants.EDIT_CMD, constants.IMAGE_CMD, pipeline_path]
+                                                 + pipeline_args)
+    return operations
+
+
+def validate_image_path(image_path: str) -> None:
+    """
+    Checks that the image file can be read, without decoding it.
+    :param image_path: Path of the image.
+    :return: None.
+    :raise: IOError in case the file can't be read.
+    """
+    try:
+        with open(image_path, "rb"):
+            pass
+    except IOError as e:
+        raise IOError(f"Unable to open image: {e}.")
+
+
+def validate_batch_input(batch_input: str) -> None:
+    """
+    Checks that the input of a batch exists, without collecting its images.
+    :param batch_input: A directory of images, a glob pattern of images or a manifest file.
+    :return: None.
+    :raise: ValueError in case the input doesn't exist.
+    """
+    if not os.path.exists(batch_input) and not glob.glob(batch_input):
+        raise ValueError(constants.EMPTY_BATCH_ERR_MSG)
+
+
 def _parse_initialization(args) -> str:
     """
     Responsible for parsing the start of the command line arguments.
@@ -96,6 +506,14 @@ def _parse_filter(args, i) -> Tuple:
         operations.append(ImageOperation(type=OperationType.FILTER.value, sub_type=filter, x=float(x_value)))
         return i + 3, operations
 
+    elif filter == FilterType.KERNEL.value:
+        # Checking if got correct arguments, the kernel file is read only when applying or validating the operations
+        if i + 2 >= len(args) or args[i + 1] != constants.FILE_CMD:
+            raise ValueError(constants.INVALID_KERNEL_ARGUMENTS_ERR_MSG)
+
+        operations.append(ImageOperation(type=OperationType.FILTER.value, sub_type=filter, kernel_path=args[i + 2]))
+        return i + 3, operations
+
 
 def _parse_adjustment(args, i) -> Tuple:
     """
@@ -123,6 +541,24 @@ def _parse_adjustment(args, i) -> Tuple:
     return i, operations
 
 
+def _parse_resize(args, i, command) -> Tuple:
+    """
+    Responsible for parsing a resize or fit command from the command line.
+    :param args: Command line arguments inputted.
+    :param i: Current index to start iterating on
+    :param command: The resize or fit command.
+    :return: A tuple containing the next index of command line arguments and a list of the parsed resize operation,
+    holding the width in x and the height in y.
+    :raise: ValueError if got invalid width or height.
+    """
+    if i + 1 >= len(args) or not args[i].isdigit() or not args[i + 1].isdigit() or int(args[i]) == 0 \
+            or int(args[i + 1]) == 0:
+        raise ValueError(constants.INVALID_RESIZE_ARGUMENTS_ERR_MSG)
+    resize_type = ResizeType.RESIZE.value if command == constants.RESIZE_CMD else ResizeType.FIT.value
+    return i + 2, [ImageOperation(type=OperationType.RESIZE.value, sub_type=resize_type, x=int(args[i]),
+                                  y=int(args[i + 1]))]
+
+
 def _parse_display(args, i) -> Tuple:
     """
     Responsible for parsing a display command from the command line.
@@ -146,6 +582,33 @@ def _parse_output(args, i) -> Tuple:
     return i + 1, [ImageOperation(type=OperationType.OUTPUT.value, output_path=args[i])]
 
 
+def _parse_memory_size(s, error_message=constants.INVALID_MAX_MEMORY_ARGUMENT_ERR_MSG) -> int:
+    """
+    Helper function to parse a memory size, in bytes or with a K, M or G suffix.
+    :param s: String to parse.
+    :param error_message: Message of the error raised in case of an invalid size.
+    :return: Memory size in bytes.
+    :raise: ValueError in case the string isn't a positive memory size.
+    """
+    multiplier = constants.MEMORY_SIZE_SUFFIXES.get(s[-1:].upper(), 1)
+    digits = s[:-1] if s[-1:].upper() in constants.MEMORY_SIZE_SUFFIXES else s
+    if not digits.isdigit() or int(digits) == 0:
+        raise ValueError(error_message)
+    return int(digits) * multiplier
+
+
+def _parse_color_lut_size(s) -> int:
+    """
+    Helper function to parse the number of grid nodes along every channel of a color lookup table.
+    :param s: String to parse.
+    :return: The size.
+    :raise: ValueError in case the string isn't an integer between MIN_COLOR_LUT_SIZE and MAX_COLOR_LUT_SIZE.
+    """
+    if not s.isdigit() or not constants.MIN_COLOR_LUT_SIZE <= int(s) <= constants.MAX_COLOR_LUT_SIZE:
+        raise ValueError(constants.INVALID_COLOR_LUT_ARGUMENT_ERR_MSG)
+    return int(s)
+
+
 def _is_signed_int(s):
     """
     Helper function to check if a string is a signed int.
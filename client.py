@@ -0,0 +1,102 @@
+import base64
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import Optional, Tuple
+import constants
+
+# The client only imports the standard library, so forwarding a request to the daemon skips importing NumPy, PIL and
+# the editor modules. They are imported only in case no daemon is running and the image is edited in this process.
+
+
+def default_socket_path() -> str:
+    """
+    Finds the socket path of the daemon, given by the IMAGE_EDITOR_SOCKET environment variable or in the temporary
+    directory.
+    :return: The socket path.
+    """
+    default_path = os.path.join(tempfile.gettempdir(), constants.DEFAULT_DAEMON_SOCKET_NAME.format(uid=os.getuid()))
+    return os.environ.get(constants.DAEMON_SOCKET_ENV_VAR, default_path)
+
+
+def send_request(request: dict, socket_path: str) -> Optional[dict]:
+    """
+    Sends a request to the daemon and waits for its response.
+    :param request: The request.
+    :param socket_path: Path of the daemon socket.
+    :return: The response, or None in case no daemon is listening on the socket.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client_socket:
+        try:
+            client_socket.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        client_socket.sendall(json.dumps(request).encode() + b"\n")
+        with client_socket.makefile("rb") as response_file:
+            return json.loads(response_file.readline())
+
+
+def parse_encode_argument(args) -> Tuple:
+    """
+    Parses the client --encode argument, which writes the result image encoded in the given format to the standard
+    output.
+    :param args: Command line arguments inputted.
+    :return: A tuple containing the command line arguments without --encode, and the format (None if not given).
+    :raise: ValueError in case no format was given.
+    """
+    if constants.ENCODE_CMD not in args:
+        return args, None
+    i = args.index(constants.ENCODE_CMD)
+    if i + 1 >= len(args) or args[i + 1].startswith("--"):
+        raise ValueError(constants.INVALID_ENCODE_ARGUMENT_ERR_MSG)
+    return args[:i] + args[i + 2:], args[i + 1]
+
+
+def print_daemon_statistics(socket_path: str) -> None:
+    """
+    Prints the daemon queue depth, job counts and latencies.
+    :param socket_path: Path of the daemon socket.
+    :return: None
+    """
+    response = send_request({"command": "stats"}, socket_path)
+    if response is None:
+        sys.exit(f"No daemon is listening on {socket_path}.")
+    for name, value in response["statistics"].items():
+        print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
+
+
+def main() -> None:
+    """
+    Forwards edit_image command line arguments to the daemon, or edits the image in this process in case no daemon is
+    running. Prints the output paths, or writes the result image to the standard output with --encode <format>.
+    :return: None
+    """
+    socket_path = default_socket_path()
+    if len(sys.argv) > 1 and sys.argv[1] == constants.DAEMON_STATS_CMD:
+        print_daemon_statistics(socket_path)
+        return
+
+    args, encode_format = parse_encode_argument(sys.argv)
+    response = send_request({"args": args, "cwd": os.getcwd(), "encode": encode_format}, socket_path)
+    if response is None:
+        from daemon import run_edit_job
+        try:
+            response = run_edit_job(args, os.getcwd(), encode_format)
+        except Exception as e:
+            response = {"status": "error", "error": str(e)}
+    if response.get("status", "ok") == "error":
+        sys.exit(response["error"])
+
+    if "message" in response:
+        print(response["message"])
+    elif "image" in response:
+        sys.stdout.buffer.write(base64.b64decode(response["image"]))
+    else:
+        for output_path in response["output_paths"]:
+            print(output_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,42 @@ MAX_TEMPERATURE_VAL = 100
 MIN_EXPOSURE_VAL = -100
 MAX_EXPOSURE_VAL = 100
 
+# Convolution Constants
+# Kernels whose area exceeds this factor times log2 of the padded image area are convolved using the FFT
+FFT_CONVOLUTION_COST_FACTOR = 1
+# Singular values of a kernel smaller than this factor times the largest one are treated as zero, when checking if the
+# kernel is a sum of few separable kernels
+KERNEL_RANK_TOLERANCE = 1e-9
+
+# Fixed-Point Constants
+# Number of fraction bits of the coefficients of fixed-point color transforms
+FIXED_POINT_FRACTION_BITS = 16
+# Largest box blur kernel area whose fixed-point result is identical to the float result. The float filter rounds the
+# box mean to float32, which can round it up to the next integer only once the kernel area exceeds 2 ** 17
+EXACT_FIXED_POINT_BOX_AREA = 1 << 16
+
+# Saturation Constants
+# Maximal number of pixels converted to HLS at once
+SATURATION_CHUNK_PIXELS = 1 << 20
+
+# Color Matrix Constants
+# Maximal number of pixels transformed by a fused color matrix at once
+COLOR_MATRIX_CHUNK_PIXELS = 1 << 18
+# Maximal number of levels a fused run of affine color operations is off applying the operations one by one
+COLOR_MATRIX_MAX_ERROR = 2
+
+# Color Lookup Table Constants
+# Number of grid nodes along every channel of a color lookup table, the table sampling SIZE ** 3 colors
+DEFAULT_COLOR_LUT_SIZE = 33
+MIN_COLOR_LUT_SIZE = 2
+MAX_COLOR_LUT_SIZE = 256
+# Maximal number of pixels interpolated from a color lookup table at once, keeping the float32 corners in the CPU cache
+COLOR_LUT_CHUNK_PIXELS = 1 << 14
+# Number of baked color lookup tables kept in memory for reuse by the same pipeline
+COLOR_LUT_CACHE_ENTRIES = 16
+# Number of red values whose colors are compared at once, when measuring the error of a color lookup table
+COLOR_LUT_ERROR_RED_VALUES = 16
+
 # Error Messages
 INVALID_BRIGHTNESS_VAL_ERR_MSG = "Brightness adjustment value should be between -255 to 255."
 INVALID_CONTRAST_VAL_ERR_MSG = "Contrast adjustment value should be between -255 to 255."
@@ -22,6 +58,7 @@ INVALID_TEMPERATURE_VAL_ERR_MSG = "Temperature adjustment value should be betwee
 INVALID_EXPOSURE_VAL_ERR_MSG = "Exposure adjustment value should be between -100 to 100."
 CONVOLUTION_KERNEL_SIZE_ERR_MSG = "Convolution kernel size should be smaller than image size."
 UNSPECIFIED_KERNEL_SIZE_ERR_MSG = "Kernel size should be inputted by specifying x and y arguments."
+INVALID_KERNEL_ERR_MSG = "Kernel should be a non-empty rectangular grid of numbers."
 UNSPECIFIED_SHARPEN_MAGNITUDE_ERR_MSG = "Sharpening magnitude should be inputted by specifying x argument."
 INVALID_SHARPEN_MAGNITUDE_ERR_MSG = "Sharpening magnitude should be a float greater than 1."
 INVALID_ADJUSTMENT_ERR_MSG = "Invalid adjustment type."
@@ -29,17 +66,182 @@ INVALID_Filter_ERR_MSG = "Invalid filter type."
 INVALID_ADJUSTMENT_VALUE_ERR_MSG = "Every adjustment should get an integer value."
 INVALID_BLUR_ARGUMENTS_ERR_MSG = "Blur filter should get x and y arguments, both positive integers."
 INVALID_SHARPEN_ARGUMENT_ERR_MSG = "Sharpen filter should get x argument, a float."
+INVALID_KERNEL_ARGUMENTS_ERR_MSG = "Kernel filter should get file argument, a path of a kernel file."
+INVALID_RESIZE_ARGUMENTS_ERR_MSG = "Resize and fit should get a width and a height, both positive integers."
 INVALID_OUTPUT_ARGUMENT_ERR_MSG = "Output operation should get a file destination path."
 INVALID_COMMAND_ERR_MSG = "Invalid command."
+INVALID_RAW_IMAGE_ERR_MSG = "Raw image should hold a uint8 array of height x width x 3 RGB values."
 INVALID_FIRST_ARGUMENT_ERR_MSG = "First argument of the program should be edit_image."
 INVALID_IMAGE_ARGUMENT_ERR_MSG = "Program should get an image path in format: '--image <image_path>'."
+INVALID_BATCH_INPUT_ARGUMENT_ERR_MSG = "Batch should get its images in format: '--input <directory|glob|manifest>'."
+INVALID_BATCH_OUTPUT_ARGUMENT_ERR_MSG = "Batch should get its destination in format: '--output <directory|template>'."
+INVALID_WORKERS_ARGUMENT_ERR_MSG = "Workers argument should be a positive integer."
+INVALID_BATCH_OPERATION_ERR_MSG = "Batch operations can't display or output images, use the batch --output instead."
+EMPTY_BATCH_ERR_MSG = "No images were found for the batch input."
+INVALID_MAX_MEMORY_ARGUMENT_ERR_MSG = "Max memory argument should be a positive size in bytes, optionally with a " \
+                                      "K, M or G suffix."
+INVALID_THREADS_ARGUMENT_ERR_MSG = "Threads argument should be a positive integer."
+INVALID_CACHE_SIZE_ARGUMENT_ERR_MSG = "Cache size argument should be a positive size in bytes, optionally with a " \
+                                      "K, M or G suffix."
+MAX_MEMORY_TOO_SMALL_ERR_MSG = "Max memory is too small to hold the image and process it in bands."
+INVALID_PREVIEW_ARGUMENT_ERR_MSG = "Preview argument should be a positive integer, the maximal preview size."
+INVALID_SERVE_ARGUMENT_ERR_MSG = "Serve command accepts only the --socket and --jobs arguments."
+INVALID_SOCKET_ARGUMENT_ERR_MSG = "Socket argument should get a socket path."
+INVALID_JOBS_ARGUMENT_ERR_MSG = "Jobs argument should be a positive integer."
+INVALID_PRECISION_ARGUMENT_ERR_MSG = "Precision argument should be float, fixed or auto."
+INVALID_FRAME_WORKERS_ARGUMENT_ERR_MSG = "Frame workers argument should be a positive integer."
+INVALID_FRAMES_OPERATION_ERR_MSG = "Editing all frames can't display images, and can only output GIF or TIFF files."
+INVALID_FRAMES_ENCODE_ERR_MSG = "Editing all frames can't return an encoded image, use --output instead."
+INVALID_PIPELINE_OPERATION_ERR_MSG = "A pipeline can only apply adjustments, filters and resizes."
+INVALID_IMAGE_ARRAY_ERR_MSG = "Image array should be a uint8 array of height x width x 3 RGB values."
+INVALID_WATCH_ARGUMENT_ERR_MSG = "Watch argument should get a pipeline file path."
+INVALID_WATCH_COMMAND_ERR_MSG = "Watching takes the operations from the pipeline file only, and can't preview or " \
+                                "edit all frames."
+INVALID_PIPELINE_FILE_ERR_MSG = "Pipeline file should hold operations in command line form."
+INVALID_CHECKPOINT_MEMORY_ARGUMENT_ERR_MSG = "Checkpoint memory argument should be a positive size in bytes, " \
+                                             "optionally with a K, M or G suffix."
+INVALID_COLOR_LUT_ARGUMENT_ERR_MSG = "Color lookup table size should be an integer between 2 and 256."
+INVALID_COLOR_LUT_OPERATION_ERR_MSG = "A color lookup table can only bake adjustments, invert and sepia."
+INVALID_EXPORT_LUT_OUTPUT_ARGUMENT_ERR_MSG = "Exporting a lookup table should get its path in format: " \
+                                             "'--output <path.cube>'."
+INVALID_QUEUE_ARGUMENT_ERR_MSG = "Queue argument should get a queue file path."
+INVALID_WORKER_ARGUMENT_ERR_MSG = "Worker command accepts only the --queue, --jobs and --exit-when-idle arguments."
+INVALID_QUEUE_STATUS_ARGUMENT_ERR_MSG = "Queue status command accepts only the --queue and --job arguments."
+INVALID_JOB_ARGUMENT_ERR_MSG = "Job argument should be a job id, a positive integer."
+INVALID_QUEUED_OPERATION_ERR_MSG = "Queued jobs can't display images, preview or validate only."
+JOB_NOT_FOUND_ERR_MSG = "There is no job {job_id} in the queue."
+LOST_JOB_ERR_MSG = "The workers running the job were lost {attempts} times."
+INVALID_ENCODE_ARGUMENT_ERR_MSG = "Encode argument should get an image format, for example PNG."
+MISSING_OUTPUT_DIRECTORY_ERR_MSG = "Output directory doesn't exist: {directory}."
+DAEMON_ALREADY_RUNNING_ERR_MSG = "A daemon is already listening on the socket."
 
 # Commands
 EDIT_CMD = "edit_image"
+BATCH_CMD = "edit_batch"
+INPUT_CMD = "--input"
+WORKERS_CMD = "--workers"
+MAX_MEMORY_CMD = "--max-memory"
+THREADS_CMD = "--threads"
+PROFILE_CMD = "--profile"
+NO_CACHE_CMD = "--no-cache"
+CACHE_SIZE_CMD = "--cache-size"
+CACHE_STATS_CMD = "cache_stats"
+SERVE_CMD = "serve"
+SOCKET_CMD = "--socket"
+JOBS_CMD = "--jobs"
+ENCODE_CMD = "--encode"
+DAEMON_STATS_CMD = "daemon_stats"
+VALIDATE_ONLY_CMD = "--validate-only"
+PRECISION_CMD = "--precision"
+FRAMES_CMD = "--frames"
+FRAME_WORKERS_CMD = "--frame-workers"
+PREVIEW_CMD = "--preview"
+DRY_RUN_CMD = "--dry-run"
+WATCH_CMD = "--watch"
+COLOR_LUT_CMD = "--color-lut"
+FUSE_COLOR_MATRICES_CMD = "--fuse-color-matrices"
+EXPORT_LUT_CMD = "export_lut"
+SIZE_CMD = "--size"
+SUBMIT_CMD = "submit"
+WORKER_CMD = "worker"
+QUEUE_STATUS_CMD = "queue_status"
+QUEUE_CMD = "--queue"
+JOB_CMD = "--job"
+EXIT_WHEN_IDLE_CMD = "--exit-when-idle"
+CHECKPOINT_MEMORY_CMD = "--checkpoint-memory"
 IMAGE_CMD = "--image"
 FILTER_CMD = "--filter"
 ADJUST_CMD = "--adjust"
+RESIZE_CMD = "--resize"
+FIT_CMD = "--fit"
 X_CMD = "--x"
 Y_CMD = "--y"
+FILE_CMD = "--file"
 DISPLAY_CMD = "--display"
 OUTPUT_CMD = "--output"
+
+# Messages
+VALID_COMMAND_MSG = "The command is valid."
+WATCH_STARTED_MSG = "Watching {image_path} and {pipeline_path}, press Ctrl+C to stop."
+COLOR_LUT_EXPORTED_MSG = "Saved a {size}x{size}x{size} lookup table to {path}, at most {max_error} levels off " \
+                         "applying the operations."
+JOB_SUBMITTED_MSG = "Submitted job {job_id}."
+JOB_DONE_MSG = "Job {job_id} done in {seconds:.2f}s, attempt {attempt}."
+JOB_FAILED_MSG = "Job {job_id} failed in {seconds:.2f}s, attempt {attempt}: {error}"
+JOB_LEASE_LOST_MSG = "Job {job_id} ended in {seconds:.2f}s, attempt {attempt}, after its lease expired. Its outcome " \
+                     "wasn't recorded, since another worker claimed the job."
+QUEUE_ERROR_MSG = "Unable to access the job queue: {error}"
+WATCH_RENDER_MSG = "Rendered in {latency:.1f}ms, applied {applied} of {total} operations."
+
+# Tiled Execution Constants
+# Estimated peak bytes of processing a single pixel of a band, bounded by the float64 temporaries of the operations
+TILED_BYTES_PER_PIXEL = 320
+MEMORY_SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+# Profiling Constants
+DEFAULT_PROFILE_PATH = "profile.json"
+
+# Resize Constants
+# Images are reduced while decoding down to at least this factor times the resize size, and then resampled to it
+RESIZE_REDUCING_GAP = 3
+
+# Output Constants
+# Maximal number of outputs waiting to be encoded on the output writer thread, each but the last one holding a copy of
+# the image
+MAX_PENDING_OUTPUTS = 2
+
+# Frames Constants
+GIF_EXTENSION = ".gif"
+TIFF_EXTENSIONS = (".tif", ".tiff")
+# Number of frames handed to every frame worker ahead of writing, bounding the frames held in memory
+FRAMES_IN_FLIGHT_PER_WORKER = 2
+
+# Preview Constants
+# Maximal width and height of the reduced image a preview is computed on
+DEFAULT_PREVIEW_SIZE = 1024
+
+# Raw Image Constants
+# Images with this extension are stored as uint8 RGB arrays in NumPy format, and read by memory mapping them
+RAW_IMAGE_EXTENSION = ".npy"
+RAW_IMAGE_FORMAT = "NPY"
+
+# Cache Constants
+CACHE_DIRECTORY_ENV_VAR = "IMAGE_EDITOR_CACHE_DIR"
+DEFAULT_CACHE_DIRECTORY = "~/.cache/image_editing_cli_tool"
+DEFAULT_CACHE_SIZE = 1 << 30
+CACHE_ENTRY_EXTENSION = ".npy"
+CACHE_STATISTICS_FILE_NAME = "statistics.json"
+
+# Watch Constants
+# Maximal total size of the images kept in memory after every operation, to resume re-rendering from
+DEFAULT_CHECKPOINT_MEMORY = 1 << 29
+# Seconds between checks of the image and pipeline files for changes
+WATCH_POLL_INTERVAL = 0.25
+
+# Daemon Constants
+DAEMON_SOCKET_ENV_VAR = "IMAGE_EDITOR_SOCKET"
+# Socket file name in the temporary directory, formatted with the user id
+DEFAULT_DAEMON_SOCKET_NAME = "image_editing_cli_tool-{uid}.sock"
+DEFAULT_DAEMON_JOBS = 4
+# Number of most recent jobs the latency percentiles are computed over
+DAEMON_LATENCY_WINDOW = 1000
+
+# Job Queue Constants
+QUEUE_PATH_ENV_VAR = "IMAGE_EDITOR_QUEUE"
+DEFAULT_QUEUE_PATH = "~/.cache/image_editing_cli_tool/queue.db"
+# Seconds a claimed job stays leased to its worker without renewal. The workers renew the leases of their jobs every
+# third of it, so the job of a crashed worker is claimed again within this time
+JOB_LEASE_SECONDS = 60
+# Number of times a job is claimed before it is failed, in case its workers keep getting lost
+MAX_JOB_ATTEMPTS = 3
+# Seconds an idle worker waits before looking for a job again
+JOB_POLL_INTERVAL = 1.0
+DEFAULT_WORKER_JOBS = 1
+# Seconds a queue operation waits for another process holding the queue file lock
+QUEUE_LOCK_TIMEOUT = 30
+# Number of most recently finished jobs the timing statistics are computed over
+JOB_STATISTICS_WINDOW = 1000
+
+# Batch Constants
+BATCH_IMAGE_EXTENSIONS = (".bmp", ".gif", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp", RAW_IMAGE_EXTENSION)
+BATCH_GLOB_CHARACTERS = "*?["
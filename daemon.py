@@ -0,0 +1,229 @@
+import base64
+import collections
+import dataclasses
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from typing import List, Optional
+import constants
+from cli import parse_command_line_arguments, parse_editor_options, validate_frame_operations, validate_image_path, \
+    validate_operations
+from enums import OperationType
+from frame_editor import FrameEditor
+from image_editor import run_image_editor
+from result_cache import create_cache
+
+
+class EditorDaemon:
+    """
+    Class of a daemon keeping the editor loaded and editing images on requests sent to a Unix socket, so that every
+    edit skips the startup of the program.
+    Every request is a single line of JSON, answered by a single line of JSON. An edit request holds the command line
+    arguments of edit_image, the working directory they are relative to and optionally a format to return the result
+    image encoded in. A request whose command is stats gets the daemon counters.
+    """
+
+    def __init__(self, socket_path: str, jobs: int = constants.DEFAULT_DAEMON_JOBS):
+        """
+        :param socket_path: Path of the Unix socket to listen on.
+        :param jobs: Maximal number of images edited at the same time. Further requests wait in a queue.
+        """
+        self._socket_path = socket_path
+        self._job_slots = threading.BoundedSemaphore(jobs)
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+        self._queued_jobs = 0
+        self._running_jobs = 0
+        self._completed_jobs = 0
+        self._failed_jobs = 0
+        self._latencies = collections.deque(maxlen=constants.DAEMON_LATENCY_WINDOW)
+
+    def serve(self) -> None:
+        """
+        Listens on the socket until interrupted, handling every connection in its own thread.
+        :return: None.
+        :raise: OSError in case another daemon is already listening on the socket.
+        """
+        _remove_stale_socket(self._socket_path)
+        with _DaemonServer(self._socket_path, _DaemonRequestHandler) as server:
+            server.editor_daemon = self
+            # Only the user running the daemon may send it requests
+            os.chmod(self._socket_path, 0o600)
+            try:
+                server.serve_forever()
+            finally:
+                os.remove(self._socket_path)
+
+    def handle_request(self, request: dict) -> dict:
+        """
+        Handles a single request.
+        :param request: The request, holding either the command stats or the args, cwd and optional encode fields.
+        :return: The response, holding a status field of ok or error.
+        """
+        if request.get("command") == "stats":
+            return {"status": "ok", "statistics": self.statistics()}
+
+        start_time = time.perf_counter()
+        with self._lock:
+            self._queued_jobs += 1
+        with self._job_slots:
+            with self._lock:
+                self._queued_jobs -= 1
+                self._running_jobs += 1
+            try:
+                response = run_edit_job(request["args"], request["cwd"], request.get("encode"))
+                response["status"] = "ok"
+            except Exception as e:
+                response = {"status": "error", "error": str(e)}
+            finally:
+                with self._lock:
+                    self._running_jobs -= 1
+
+        latency = time.perf_counter() - start_time
+        with self._lock:
+            if response["status"] == "ok":
+                self._completed_jobs += 1
+            else:
+                self._failed_jobs += 1
+            self._latencies.append(latency)
+        response["latency_seconds"] = latency
+        return response
+
+    def statistics(self) -> dict:
+        """
+        Reads the daemon counters.
+        :return: A dictionary of the number of queued, running, completed and failed jobs, the uptime, and the mean,
+        median, 95th percentile and maximal latency in seconds of the most recent jobs, from receiving the request to
+        answering it.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            statistics = {
+                "queue_depth": self._queued_jobs,
+                "running": self._running_jobs,
+                "completed": self._completed_jobs,
+                "failed": self._failed_jobs,
+                "uptime_seconds": time.time() - self._start_time
+            }
+        if latencies:
+            statistics["latency_mean_seconds"] = sum(latencies) / len(latencies)
+            statistics["latency_p50_seconds"] = latencies[len(latencies) // 2]
+            statistics["latency_p95_seconds"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            statistics["latency_max_seconds"] = latencies[-1]
+        return statistics
+
+
+class _DaemonServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Unix socket server handling every connection in its own thread, holding the daemon the requests are sent to.
+    """
+    daemon_threads = True
+    editor_daemon: Optional[EditorDaemon] = None
+
+
+class _DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handler of a single connection, reading a request line and writing a response line.
+    """
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            response = {"status": "error", "error": "Invalid request."}
+        else:
+            response = self.server.editor_daemon.handle_request(request)
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+def run_edit_job(args: List[str], cwd: str, encode_format: Optional[str] = None, atomic_outputs: bool = False) -> dict:
+    """
+    Edits an image according to the command line arguments of edit_image, with the paths in them relative to a given
+    working directory.
+    :param args: Command line arguments of edit_image, including the program name.
+    :param cwd: Working directory the paths in the arguments are relative to.
+    :param encode_format: Format to return the result image encoded in, for example PNG. None to return only the paths.
+    :param atomic_outputs: Whether to write every output to a temporary file next to it, and move all of them into
+    place only once they are all written. An interrupted edit then never leaves a partial output, and editing again
+    replaces the outputs whole.
+    :return: A dictionary of the absolute output paths, and the base64 encoded result image in case of a format. In
+    case of --validate-only, a dictionary of no output paths and a message that the arguments are valid.
+    :raise: ValueError in case of invalid arguments, IOError in case the image can't be opened, saved or encoded.
+    """
+    arguments, options = parse_editor_options(args)
+    image_path, operations = parse_command_line_arguments(arguments)
+    # The working directory of the daemon isn't the one of the client, so every path is made absolute
+    operations = [dataclasses.replace(operation, output_path=os.path.join(cwd, operation.output_path))
+                  if operation.type == OperationType.OUTPUT.value else operation for operation in operations]
+    operations = [dataclasses.replace(operation, kernel_path=os.path.join(cwd, operation.kernel_path))
+                  if operation.kernel_path is not None else operation for operation in operations]
+    profile_path = None if options.profile_path is None else os.path.join(cwd, options.profile_path)
+    if options.validate_only:
+        validate_image_path(os.path.join(cwd, image_path))
+        validate_operations(operations)
+        if options.frames:
+            validate_frame_operations(operations)
+        return {"output_paths": [], "message": constants.VALID_COMMAND_MSG}
+
+    output_paths = [operation.output_path for operation in operations if operation.type == OperationType.OUTPUT.value]
+    if options.frames and encode_format is not None:
+        raise ValueError(constants.INVALID_FRAMES_ENCODE_ERR_MSG)
+    temporary_paths = {output_path: _temporary_output_path(output_path) for output_path in output_paths
+                       if atomic_outputs}
+    operations = [dataclasses.replace(operation, output_path=temporary_paths[operation.output_path])
+                  if operation.output_path in temporary_paths else operation for operation in operations]
+    try:
+        if options.frames:
+            FrameEditor(os.path.join(cwd, image_path), operations, options.frame_workers, options).apply_operations()
+            image_editor = None
+        else:
+            image_editor = run_image_editor(os.path.join(cwd, image_path), operations,
+                                            preview_size=options.preview_size, max_memory=options.max_memory,
+                                            threads=options.threads, profile_path=profile_path,
+                                            cache=create_cache(options), precision=options.precision,
+                                            color_lut_size=options.color_lut_size,
+                                            fuse_color_matrices=options.fuse_color_matrices)
+        for output_path, temporary_path in temporary_paths.items():
+            os.replace(temporary_path, output_path)
+    finally:
+        for temporary_path in temporary_paths.values():
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    result = {"output_paths": output_paths}
+    if encode_format is not None:
+        result["image"] = base64.b64encode(image_editor.encode_image(encode_format)).decode("ascii")
+    return result
+
+
+def _temporary_output_path(output_path: str) -> str:
+    """
+    Builds a unique path of a temporary file next to an output, with the same extension so it is saved in the same
+    format.
+    :param output_path: Path of the output.
+    :return: Path of the temporary file.
+    """
+    root, extension = os.path.splitext(output_path)
+    return f"{root}.{uuid.uuid4().hex}.tmp{extension}"
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """
+    Removes the socket file left by a daemon that didn't shut down cleanly.
+    :param socket_path: Path of the socket.
+    :return: None.
+    :raise: OSError in case a daemon is listening on the socket.
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+    raise OSError(constants.DAEMON_ALREADY_RUNNING_ERR_MSG)
@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+from typing import Optional
+import constants
+from enums import Precision
+
+
+@dataclass
+class EditorOptions:
+    """
+    Class representing options of how to apply the operations on an image, which don't change the result image,
+    other than the fixed-point precision changing it by at most 1 level, and the color lookup tables and fused color
+    matrices approximating the operations they fuse
+    """
+    max_memory: Optional[int] = None
+    threads: int = 1
+    profile_path: Optional[str] = None
+    use_cache: bool = True
+    cache_size: int = constants.DEFAULT_CACHE_SIZE
+    validate_only: bool = False
+    preview_size: Optional[int] = None
+    frames: bool = False
+    frame_workers: Optional[int] = None
+    precision: str = Precision.AUTO.value
+    color_lut_size: Optional[int] = None
+    fuse_color_matrices: bool = False
+    watch_path: Optional[str] = None
+    checkpoint_memory: int = constants.DEFAULT_CHECKPOINT_MEMORY
@@ -21,6 +21,33 @@ class FilterType(Enum):
     SHARPEN = "sharpen"
     INVERT = "invert"
     SEPIA = "sepia"
+    KERNEL = "kernel"
+
+
+class ResizeType(Enum):
+    """
+    Enum for image resize types.
+    """
+    RESIZE = "resize"
+    FIT = "fit"
+
+
+class ConvolutionStrategy(Enum):
+    """
+    Enum for the ways of computing a convolution.
+    """
+    SHIFTED = "shifted"
+    FFT = "fft"
+    SEPARABLE = "separable"
+
+
+class Precision(Enum):
+    """
+    Enum for the arithmetic the operations are applied with.
+    """
+    FLOAT = "float"
+    FIXED = "fixed"
+    AUTO = "auto"
 
 
 class OperationType(Enum):
@@ -29,5 +56,6 @@ class OperationType(Enum):
     """
     ADJUSTMENT = "adjustment"
     FILTER = "filter"
+    RESIZE = "resize"
     DISPLAY = "display"
     OUTPUT = "output"
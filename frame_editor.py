@@ -0,0 +1,220 @@
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+from PIL import GifImagePlugin, Image, ImageSequence, TiffImagePlugin
+import constants
+from cli import validate_frame_operations
+from editor_options import EditorOptions
+from enums import OperationType
+from image_operation import ImageOperation
+from image_utils import convert_array_to_image, convert_image_to_uint8_array, convert_to_rgb
+from pipeline import Pipeline
+
+
+class FrameEditor:
+    """
+    Class applying a list of operations on every frame of an animated GIF or a multi-page TIFF. The frames are streamed
+    from the input, through the operations and into the outputs one at a time, so only a few frames are held in memory
+    rather than the whole animation. Optionally, the frames are spread across worker processes.
+    """
+
+    def __init__(self, image_path: str, operations: List[ImageOperation], workers: Optional[int] = None,
+                 options: Optional[EditorOptions] = None):
+        """
+        :param image_path: Path of the animated GIF or multi-page TIFF to edit.
+        :param operations: Operations to apply on every frame, in order of input.
+        :param workers: Number of worker processes editing frames at the same time. None edits the frames in this
+        process.
+        :param options: Options of how the operations are applied on every frame.
+        :raise: ValueError in case an operation displays the image, or outputs it in a format without multiple frames.
+        """
+        validate_frame_operations(operations)
+        options = options or EditorOptions()
+        self._image_path = image_path
+        self._operations = operations
+        self._workers = workers
+        # The operations are compiled once rather than for every frame
+        self._pipelines = compile_frame_pipelines(operations, options)
+
+    def apply_operations(self) -> int:
+        """
+        Applies the operations on all the frames, and writes the frames of every output with the timing of the input
+        frames.
+        :return: Number of frames edited.
+        :raise: IOError in case the image can't be opened or an output can't be saved.
+        """
+        try:
+            image = Image.open(self._image_path)
+        except IOError as e:
+            raise IOError(f"Unable to open image: {e}.")
+        with image:
+            frame_writers = [create_frame_writer(operation.output_path, image.info.get("loop"))
+                             for operation in self._operations if operation.type == OperationType.OUTPUT.value]
+            frame_count = 0
+            try:
+                for output_arrays, duration in self._edit_frames(read_frames(image)):
+                    for frame_writer, output_array in zip(frame_writers, output_arrays):
+                        frame_writer.write(output_array, duration)
+                    frame_count += 1
+            finally:
+                for frame_writer in frame_writers:
+                    frame_writer.close()
+        return frame_count
+
+    def _edit_frames(self, frames: Iterator[Tuple[np.ndarray, Optional[int]]]) -> Iterator[Tuple[List, Optional[int]]]:
+        """
+        Edits the frames in order, in this process or in the worker processes.
+        :param frames: Iterator of tuples of every frame in uint8 numpy array form and its duration in milliseconds.
+        :return: Iterator of tuples of the output images of every frame and its duration.
+        """
+        if self._workers is None:
+            for frame_array, duration in frames:
+                yield edit_frame(frame_array, self._pipelines), duration
+            return
+
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            pending_frames = collections.deque()
+            for frame_array, duration in frames:
+                pending_frames.append((executor.submit(edit_frame, frame_array, self._pipelines), duration))
+                # Reading ahead only a few frames for every worker, so the whole animation is never held in memory
+                if len(pending_frames) >= self._workers * constants.FRAMES_IN_FLIGHT_PER_WORKER:
+                    future, duration = pending_frames.popleft()
+                    yield future.result(), duration
+            while pending_frames:
+                future, duration = pending_frames.popleft()
+                yield future.result(), duration
+
+
+class GifFrameWriter:
+    """
+    Class writing the frames of an animated GIF one at a time, every frame with its own palette and duration.
+    """
+
+    def __init__(self, output_path: str, loop: Optional[int] = None):
+        """
+        :param output_path: Path of the GIF file.
+        :param loop: Number of times the animation repeats, 0 for forever. None to play it once.
+        """
+        self._output_file = open(output_path, "wb")
+        self._loop = loop
+        self._is_first_frame = True
+
+    def write(self, frame_array: np.ndarray, duration: Optional[int]) -> None:
+        """
+        Writes a single frame.
+        :param frame_array: Frame in uint8 numpy array form.
+        :param duration: Duration of the frame in milliseconds, None for no duration.
+        :return: None.
+        """
+        frame = convert_array_to_image(frame_array).convert("P", palette=Image.Palette.ADAPTIVE)
+        if self._is_first_frame:
+            header, _ = GifImagePlugin.getheader(frame, info={} if self._loop is None else {"loop": self._loop})
+            self._output_file.writelines(header)
+            self._is_first_frame = False
+        frame_parameters = {"include_color_table": True}
+        if duration is not None:
+            frame_parameters["duration"] = duration
+        self._output_file.writelines(GifImagePlugin.getdata(frame, **frame_parameters))
+
+    def close(self) -> None:
+        """
+        Ends the GIF file and closes it.
+        :return: None.
+        """
+        self._output_file.write(b";")
+        self._output_file.close()
+
+
+class TiffFrameWriter:
+    """
+    Class writing the pages of a multi-page TIFF one at a time.
+    """
+
+    def __init__(self, output_path: str):
+        """
+        :param output_path: Path of the TIFF file.
+        """
+        self._output_file = open(output_path, "w+b")
+        self._tiff_writer = TiffImagePlugin.AppendingTiffWriter(self._output_file, new=True)
+
+    def write(self, frame_array: np.ndarray, duration: Optional[int]) -> None:
+        """
+        Writes a single page.
+        :param frame_array: Page in uint8 numpy array form.
+        :param duration: Ignored, since TIFF pages have no duration.
+        :return: None.
+        """
+        convert_array_to_image(frame_array).save(self._tiff_writer, format="TIFF")
+        self._tiff_writer.newFrame()
+
+    def close(self) -> None:
+        """
+        Closes the TIFF file.
+        :return: None.
+        """
+        self._tiff_writer.close()
+        self._output_file.close()
+
+
+def create_frame_writer(output_path: str, loop: Optional[int] = None):
+    """
+    Creates the writer of the frames of an output, according to its extension.
+    :param output_path: Path of a GIF or TIFF output.
+    :param loop: Number of times a GIF animation repeats, 0 for forever. None to play it once.
+    :return: A GifFrameWriter or a TiffFrameWriter.
+    :raise: IOError in case the output can't be created.
+    """
+    try:
+        if output_path.lower().endswith(constants.TIFF_EXTENSIONS):
+            return TiffFrameWriter(output_path)
+        return GifFrameWriter(output_path, loop)
+    except IOError as e:
+        raise IOError(f"Unable to save image: {e}.")
+
+
+def read_frames(image: Image) -> Iterator[Tuple[np.ndarray, Optional[int]]]:
+    """
+    Reads the frames of an image one at a time.
+    :param image: Opened image, possibly animated or with multiple pages.
+    :return: Iterator of tuples of every frame in RGB uint8 numpy array form, and its duration in milliseconds (None
+    in case it has none).
+    """
+    for frame in ImageSequence.Iterator(image):
+        yield convert_image_to_uint8_array(convert_to_rgb(frame)), frame.info.get("duration")
+
+
+def compile_frame_pipelines(operations: List[ImageOperation], options: EditorOptions) -> List[Pipeline]:
+    """
+    Compiles the operations before every output into a pipeline.
+    :param operations: Operations to apply on every frame, in order of input.
+    :param options: Options of how the pipelines apply the operations.
+    :return: A list of the pipeline applying the operations between every output and the one before it, in order of
+    the outputs.
+    :raise: ValueError in case an operation got an invalid value, IOError in case a kernel file can't be read.
+    """
+    pipelines = []
+    segment_start = 0
+    for index, operation in enumerate(operations):
+        if operation.type == OperationType.OUTPUT.value:
+            pipelines.append(Pipeline(operations[segment_start:index], max_memory=options.max_memory,
+                                      threads=options.threads, precision=options.precision,
+                                      color_lut_size=options.color_lut_size,
+                                      fuse_color_matrices=options.fuse_color_matrices))
+            segment_start = index + 1
+    return pipelines
+
+
+def edit_frame(frame_array: np.ndarray, pipelines: List[Pipeline]) -> List[np.ndarray]:
+    """
+    Applies the operations on a single frame. Runs in this process or in a worker process.
+    :param frame_array: Frame in uint8 numpy array form. Changed in place.
+    :param pipelines: Compiled pipelines of the operations before every output.
+    :return: A list of the frame at every output operation, in order of the outputs.
+    """
+    output_arrays = []
+    for pipeline in pipelines:
+        frame_array = pipeline.apply_array(frame_array)
+        # The following pipelines change the frame in place, so every output gets its own copy
+        output_arrays.append(frame_array.copy())
+    return output_arrays
@@ -1,55 +1,57 @@
-import colorsys
+from typing import Optional
 from image_utils import *
 
 
-def adjust_brightness(image: Image, value: int) -> Image:
+def adjust_brightness(image_array: np.ndarray, value: int) -> np.ndarray:
     """
     Adjusts brightness of an image.
-    :param image: Input image.
+    :param image_array: Input image in uint8 numpy array form. Adjusted in place.
     :param value: Brightness value to adjust the image. Should be in range [-255, 255]. Negative values decrease
     brightness while positive values increase brightness.
-    :return: New adjusted image.
+    :return: The adjusted image array.
     :raise: ValueError in case the value isn't in range [-255, 255].
     """
     # Checking if value is valid
     if value > constants.MAX_BRIGHTNESS_VAL or value < constants.MIN_BRIGHTNESS_VAL:
         raise ValueError(constants.INVALID_BRIGHTNESS_VAL_ERR_MSG)
-    image_array = convert_image_to_array(image)
-    image_array = np.clip(image_array + value, constants.MIN_INTENSITY, constants.MAX_INTENSITY).astype(np.uint8)
-    return Image.fromarray(image_array)
+    adjusted_array = convert_image_to_array(image_array) + value
+    image_array[...] = np.clip(adjusted_array, constants.MIN_INTENSITY, constants.MAX_INTENSITY, out=adjusted_array)
+    return image_array
 
 
-def adjust_contrast(image: Image, value: int) -> Image:
+def adjust_contrast(image_array: np.ndarray, value: int) -> np.ndarray:
     """
     Adjusts contrast of an image.
-    :param image: Input image.
+    :param image_array: Input image in uint8 numpy array form. Adjusted in place.
     :param value: Contrast value to adjust the image. Should be in range [-255, 255]. Negative values decrease
     contrast while positive values increase contrast.
-    :return: New adjusted image.
+    :return: The adjusted image array.
     :raise: ValueError in case the value isn't in range [-255, 255].
     """
     # Checking if value is valid
     if value > constants.MAX_CONTRAST_VAL or value < constants.MIN_CONTRAST_VAL:
         raise ValueError(constants.INVALID_CONTRAST_VAL_ERR_MSG)
 
-    image_array = convert_image_to_array(image)
     # Calculating contrast factor
     contrast_factor = (constants.CONTRAST_NORM_CONST * (value + constants.MAX_INTENSITY)) / (
             constants.MAX_INTENSITY * (constants.CONTRAST_NORM_CONST - value))
 
-    image_array = np.clip(constants.CONTRAST_MID_VAL + contrast_factor * (image_array - constants.CONTRAST_MID_VAL),
-                          constants.MIN_INTENSITY,
-                          constants.MAX_INTENSITY).astype(np.uint8)
-    return Image.fromarray(image_array)
+    adjusted_array = convert_image_to_array(image_array)
+    adjusted_array = constants.CONTRAST_MID_VAL + contrast_factor * (adjusted_array - constants.CONTRAST_MID_VAL)
+    image_array[...] = np.clip(adjusted_array, constants.MIN_INTENSITY, constants.MAX_INTENSITY, out=adjusted_array)
+    return image_array
 
 
-def adjust_saturation(image: Image, value: int) -> Image:
+def adjust_saturation(image_array: np.ndarray, value: int,
+                      chunk_pixels: Optional[int] = constants.SATURATION_CHUNK_PIXELS) -> np.ndarray:
     """
     Adjusts saturation of an image.
-    :param image: Input image.
+    :param image_array: Input image in uint8 numpy array form. Adjusted in place.
     :param value: Saturation value to adjust the image. Should be in range [-100, 100]. Negative values decrease
     saturation while positive values increase saturation.
-    :return: New adjusted image.
+    :param chunk_pixels: Maximal number of pixels converted to HLS at once, bounding the memory of the float64
+    temporaries. The image is split into chunks of whole rows. None converts the whole image at once.
+    :return: The adjusted image array.
     :raise: ValueError in case the value isn't in range [-100, 100].
     """
     # GEN: I used chatGPT to get the formula for adjusting saturation of an image. input prompt was "What is the
@@ -59,58 +61,52 @@ def adjust_saturation(image: Image, value: int) -> Image:
     if value > constants.MAX_SATURATION_VAL or value < constants.MIN_SATURATION_VAL:
         raise ValueError(constants.INVALID_SATURATION_VAL_ERR_MSG)
 
-    image_array = convert_image_to_array(image)
-    # Normalizing values between 0 and 1
-    image_array = image_array / float(constants.MAX_INTENSITY)
     saturation_factor = 1 + value / float(constants.MAX_SATURATION_VAL)
-    for i in range(image_array.shape[0]):
-        for j in range(image_array.shape[1]):
-            # Converting every pixel from RGB to HLS
-            r, g, b = image_array[i, j]
-            h, l, s = colorsys.rgb_to_hls(r, g, b)
-            # Adjusting Saturation value
-            s = min(max(s * saturation_factor, 0), 1)
-            # Converting back from HLS to RGB
-            r, g, b = colorsys.hls_to_rgb(h, l, s)
-            image_array[i, j] = [r, g, b]
-    # Converting values back to range of [0, 255]
-    image_array = np.clip(image_array * constants.MAX_INTENSITY,
-                          constants.MIN_INTENSITY,
-                          constants.MAX_INTENSITY).astype(np.uint8)
-    return Image.fromarray(image_array)
-
-
-def adjust_temperature(image: Image, value: int) -> Image:
+    # Every chunk holds whole rows of the image
+    height, width = image_array.shape[0], image_array.shape[1]
+    chunk_rows = height if chunk_pixels is None else max(1, chunk_pixels // width)
+    for start_row in range(0, height, chunk_rows):
+        chunk = image_array[start_row:start_row + chunk_rows]
+        # Converting every pixel from RGB to HLS, normalized between 0 and 1
+        h, l, s = convert_rgb_to_hls(convert_image_to_array(chunk) / float(constants.MAX_INTENSITY))
+        # Adjusting Saturation value
+        s = np.clip(s * saturation_factor, 0, 1)
+        # Converting back from HLS to RGB, in range of [0, 255]
+        chunk[...] = np.clip(convert_hls_to_rgb(h, l, s) * constants.MAX_INTENSITY,
+                             constants.MIN_INTENSITY,
+                             constants.MAX_INTENSITY).astype(np.float32)
+    return image_array
+
+
+def adjust_temperature(image_array: np.ndarray, value: int) -> np.ndarray:
     """
     Adjusts color temperature of an image.
-    :param image: Input image.
+    :param image_array: Input image in uint8 numpy array form. Adjusted in place.
     :param value: Temperature value to adjust the image. Should be in range [-100, 100]. Negative values decrease
     temperature while positive values increase temperature.
-    :return: New adjusted image.
+    :return: The adjusted image array.
     :raise: ValueError in case the value isn't in range [-100, 100].
     """
     # Checking if value is valid
     if value > constants.MAX_TEMPERATURE_VAL or value < constants.MIN_TEMPERATURE_VAL:
         raise ValueError(constants.INVALID_TEMPERATURE_VAL_ERR_MSG)
 
-    image_array = convert_image_to_array(image)
     value = (value / 100.0) * 50
 
-    r, g, b = image_array[:, :, 0], image_array[:, :, 1], image_array[:, :, 2]
-    # Changing red and blue values according to input
-    r = np.clip(r + value, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
-    b = np.clip(b - value, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
-    adjusted_image = np.stack((r, g, b), axis=2).astype(np.uint8)
-    return Image.fromarray(adjusted_image)
+    r, b = convert_image_to_array(image_array[:, :, 0]), convert_image_to_array(image_array[:, :, 2])
+    # Changing red and blue values according to input, the green values stay the same
+    image_array[:, :, 0] = np.clip(r + value, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
+    image_array[:, :, 2] = np.clip(b - value, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
+    return image_array
 
 
-def adjust_exposure(image: Image, value: int) -> Image:
+def adjust_exposure(image_array: np.ndarray, value: int) -> np.ndarray:
     """
     Adjusts exposure of an image.
-    :param image: Input image.
+    :param image_array: Input image in uint8 numpy array form. Adjusted in place.
     :param value: Exposure value to adjust the image. Should be in range [-100, 100]. Negative values decrease
     exposure while positive values increase exposure.
-    :return: New adjusted image.
+    :return: The adjusted image array.
     :raise: ValueError in case the value isn't in range [-100, 100].
     """
     # Checking if value is valid
@@ -118,7 +114,6 @@ def adjust_exposure(image: Image, value: int) -> Image:
         raise ValueError(constants.INVALID_EXPOSURE_VAL_ERR_MSG)
     # Calculating exposure factor
     exposure_factor = 1 + value / float(constants.MAX_EXPOSURE_VAL)
-    image_array = convert_image_to_array(image)
-    image_array = np.clip(image_array * exposure_factor, constants.MIN_INTENSITY, constants.MAX_INTENSITY).astype(
-        np.uint8)
-    return Image.fromarray(image_array)
+    adjusted_array = convert_image_to_array(image_array) * exposure_factor
+    image_array[...] = np.clip(adjusted_array, constants.MIN_INTENSITY, constants.MAX_INTENSITY, out=adjusted_array)
+    return image_array
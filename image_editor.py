@@ -1,9 +1,20 @@
-from typing import List
-from enums import AdjustmentType, FilterType, OperationType
-from image_adjustments import *
-from image_filters import *
+import dataclasses
+import functools
+import io
+from typing import List, Optional, Tuple, Union
+import constants
+from enums import FilterType, OperationType, Precision
 from image_utils import *
 from image_operation import ImageOperation
+from kernels import load_operation_kernels
+from operation_fusion import ColorMatrixRun, compute_intensity_bounds, count_fused_operations, \
+    fuse_color_lookup_operations, fuse_color_matrix_operations, fuse_point_operations, \
+    move_resizes_before_pixel_operations, plan_color_matrix_run, resize_size
+from output_writer import OutputWriter
+from pipeline import apply_operation, uses_fixed_point
+from profiler import NullProfiler, Profiler, describe_operation
+from result_cache import MemoryResultCache, ResultCache, hash_file, prefix_keys
+from tiled_execution import apply_operations_in_bands, compute_band_rows, validate_band_operations
 
 
 class ImageEditor:
@@ -11,95 +22,467 @@ class ImageEditor:
     Class applying all the image operation according to given list of operations.
     """
 
-    def __init__(self, image_path: str, operations: List[ImageOperation]):
-        try:
-            self._image = Image.open(image_path)
-            self._image = convert_to_rgb(self._image)
-        except IOError as e:
-            raise IOError(f"Unable to open image: {e}.")
+    def __init__(self, image_path: str, operations: List[ImageOperation], max_memory: Optional[int] = None,
+                 threads: int = 1, profile_path: Optional[str] = None,
+                 cache: Optional[Union[ResultCache, MemoryResultCache]] = None,
+                 preview_size: Optional[int] = None, image_array: Optional[np.ndarray] = None,
+                 precision: str = Precision.AUTO.value, color_lut_size: Optional[int] = None,
+                 fuse_color_matrices: bool = False):
+        """
+        :param image_path: Path of the image to edit.
+        :param operations: Operations to apply on the image, in order of input.
+        :param max_memory: Memory budget in bytes. When given, the adjustments and filters are applied band by band,
+        with bands sized to fit the budget. The result is identical to applying them on the whole image.
+        :param threads: Number of threads applying the adjustments and filters on bands of rows at the same time. The
+        result doesn't depend on it.
+        :param profile_path: Path of a JSON profile to write after applying the operations, recording every step. A
+        Chrome trace-event version is written next to it. None for no profiling.
+        :param cache: Cache of the image after every operation, on disk or in memory. When given, applying the
+        operations resumes from the longest prefix of them found in the cache. None for no caching.
+        :param preview_size: When given, a reduced proxy of the image whose longer side is at most this size is decoded
+        instead of the image, and the blur kernels are scaled to the proxy, so the result looks like the full size
+        result. None for the full size image.
+        :param image_array: Image to edit in uint8 numpy array form, changed in place, instead of decoding image_path.
+        None to decode image_path.
+        :param precision: Arithmetic to apply the operations with, a Precision value. The fixed precision runs the box
+        blur, sharpen, sepia and color matrix operations on integer buffers, at most 1 level off the float precision.
+        The automatic precision runs only the ones identical to the float precision in fixed point.
+        :param color_lut_size: When given, every run of consecutive pixel operations including a saturation is baked
+        into a 3D lookup table with this number of grid nodes along every channel, and applied by trilinear
+        interpolation, approximating the operations. None to apply them as they are.
+        :param fuse_color_matrices: Whether to compose every run of consecutive affine color operations including a
+        sepia into color matrices, skipping the truncation to uint8 between the composed operations. The run is at most
+        COLOR_MATRIX_MAX_ERROR levels off applying the operations one by one, which later operations may scale.
+        """
+        operations = load_operation_kernels(operations)
+        self._profile_path = profile_path
+        self._profiler = Profiler() if profile_path is not None else NullProfiler()
+        if image_array is not None:
+            # A given image, for example a frame of an animation, is used as the working buffer as is
+            self._image_array = image_array
+            full_height, full_width = image_array.shape[:2]
+            operations = move_resizes_before_pixel_operations(operations, full_width, full_height)
+        else:
+            try:
+                self._image_array, operations, full_width, full_height = self._decode_image(image_path, operations,
+                                                                                            preview_size)
+            except BaseException:
+                self._profiler.close()
+                raise
+        if preview_size is not None:
+            operations = _scale_blur_kernels(operations, self._image_array.shape[0] / full_height,
+                                             self._image_array.shape[1] / full_width)
 
+        self._image_path = image_path
         self._operations = operations
+        self._max_memory = max_memory
+        self._threads = threads
+        self._cache = cache
+        self._precision = precision
+        self._apply_operation = functools.partial(apply_operation, precision=precision)
+        self._color_lut_size = color_lut_size
+        self._fuse_color_matrices = fuse_color_matrices
+        # Created on the first output, since the writer refers back to this editor through its write function
+        self._output_writer: Optional[OutputWriter] = None
+        # Number of operations applied so far, and the cache key of the image after every prefix of the operations
+        self._position = 0
+        self._prefix_keys = []
+        # Number of operations whose results were restored from the cache rather than applied
+        self._restored_position = 0
+
+    def _decode_image(self, image_path: str, operations: List[ImageOperation],
+                      preview_size: Optional[int]) -> Tuple[np.ndarray, List[ImageOperation], int, int]:
+        """
+        Decodes the image into the working buffer. A raw image is memory mapped instead, and an image that is first
+        resized or previewed is decoded only at the resolution needed. Once the size of the image is known, the resizes
+        reducing it are moved before the pixel operations preceding them.
+        :param image_path: Path of the image.
+        :param operations: Operations to apply on the image, in order of input.
+        :param preview_size: Maximal width and height of the preview proxy, None for the full size image.
+        :return: A tuple of the working buffer in uint8 numpy array form, the operations after moving the resizes, and
+        the width and height of the full size image.
+        :raise: IOError in case the image can't be opened.
+        """
+        with self._profiler.step(f"decode {image_path}", "decode"):
+            try:
+                if is_raw_image_path(image_path):
+                    raw_image_array = load_raw_image_array(image_path)
+                    full_height, full_width = raw_image_array.shape[:2]
+                else:
+                    raw_image_array = None
+                    image = Image.open(image_path)
+                    full_width, full_height = image.size
+                operations = move_resizes_before_pixel_operations(operations, full_width, full_height)
+                is_resized = operations and operations[0].type == OperationType.RESIZE.value
+                if raw_image_array is not None:
+                    # The mapped raw image is used as the working buffer, unless it is first reduced or resized
+                    image = convert_array_to_image(raw_image_array) if preview_size is not None or is_resized else None
+                if preview_size is not None:
+                    image = convert_to_reduced_rgb(image, preview_size)
+                # When the image is first resized, it is resized while decoding only the resolution needed, which
+                # leaves the resize operation nothing to do
+                elif is_resized:
+                    image = convert_to_resized_rgb(image, *resize_size(operations[0], full_width, full_height))
+                elif raw_image_array is None:
+                    image = convert_to_rgb(image)
+            except (IOError, ValueError) as e:
+                raise IOError(f"Unable to open image: {e}.")
+            # Working buffer of the image, which all the operations change in place
+            image_array = raw_image_array if image is None else convert_image_to_uint8_array(image)
+        return image_array, operations, full_width, full_height
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """
+        Size of the current image.
+        :return: A tuple of the image width and height.
+        """
+        return self._image_array.shape[1], self._image_array.shape[0]
+
+    @property
+    def image_array(self) -> np.ndarray:
+        """
+        The current image.
+        :return: The image in uint8 numpy array form.
+        """
+        return self._image_array
+
+    @property
+    def restored_operations(self) -> int:
+        """
+        Number of operations at the start of the operations whose results were restored from the cache rather than
+        applied.
+        :return: Number of restored operations, 0 before applying the operations.
+        """
+        return self._restored_position
 
-        self._adjustments = {
-            AdjustmentType.BRIGHTNESS.value: adjust_brightness,
-            AdjustmentType.CONTRAST.value: adjust_contrast,
-            AdjustmentType.SATURATION.value: adjust_saturation,
-            AdjustmentType.TEMPERATURE.value: adjust_temperature,
-            AdjustmentType.EXPOSURE.value: adjust_exposure
-        }
-
-        self._filters = {
-            FilterType.BLUR.value: apply_box_blur_filter,
-            FilterType.EDGE_DETECTION.value: apply_edge_detection_filter,
-            FilterType.SHARPEN.value: apply_sharpen_filter,
-            FilterType.INVERT.value: apply_invert_filter,
-            FilterType.SEPIA.value: apply_sepia_filter
-        }
+    def encode_image(self, image_format: str) -> bytes:
+        """
+        Encodes the current image.
+        :param image_format: Format to encode the image in, for example PNG, or NPY for a raw image.
+        :return: The encoded image bytes.
+        :raise: IOError in case the image can't be encoded in the format.
+        """
+        image_bytes = io.BytesIO()
+        if image_format.upper() == constants.RAW_IMAGE_FORMAT:
+            save_raw_image_array(self._image_array, image_bytes)
+            return image_bytes.getvalue()
+        try:
+            convert_array_to_image(self._image_array).save(image_bytes, format=image_format)
+        except (IOError, KeyError, ValueError) as e:
+            raise IOError(f"Unable to encode image: {e}.")
+        return image_bytes.getvalue()
 
     def apply_operations(self) -> None:
         """
-        Applies all operations on the image in order of input.
+        Applies all operations on the image in order of input. Consecutive affine color operations including a
+        cross-channel one are fused into color matrix passes, and consecutive per-channel point operations are fused
+        into a single lookup table pass. Outputs are encoded on a background thread while the operations after them
+        are applied, and are all written once this returns.
         :return: None.
+        :raise: IOError in case an output can't be saved, raised after all the operations are applied.
         """
-        for operation in self._operations:
-            operation_type = operation.type
-            if operation_type == OperationType.ADJUSTMENT.value:
-                self._adjust_image(operation)
+        try:
+            try:
+                self._apply_pipeline()
+            except BaseException:
+                # The pending outputs are still written, but the error raised is the one of the failed operation
+                if self._output_writer is not None:
+                    self._output_writer.close(raise_errors=False)
+                raise
+            if self._output_writer is not None:
+                self._output_writer.close()
+            self._profiler.write(self._profile_path)
+        finally:
+            # Memory tracing slows down everything allocating, so it never outlives a failed edit
+            self._profiler.close()
 
-            elif operation_type == OperationType.FILTER.value:
-                self._filter_image(operation)
+    def _apply_pipeline(self) -> None:
+        """
+        Applies all operations on the image in order of input, queueing the outputs to the output writer.
+        :return: None.
+        """
+        self._position = self._restored_position = self._restore_cached_prefix()
+        with self._profiler.step("plan", "plan"):
+            fused_operations = self._operations[self._position:]
+            if self._color_lut_size is not None:
+                # The tables are baked with the float operations, so they are shared by all the precisions
+                fused_operations = fuse_color_lookup_operations(fused_operations, apply_operation,
+                                                                self._color_lut_size)
+            if self._fuse_color_matrices:
+                fused_operations = fuse_color_matrix_operations(fused_operations)
+            fused_operations = fuse_point_operations(fused_operations, self._apply_operation)
+        transform_operations = []
+        for operation in fused_operations:
+            if isinstance(operation, ImageOperation) and operation.type == OperationType.RESIZE.value:
+                self._transform_image(transform_operations)
+                transform_operations = []
+                self._resize_image(operation)
+                continue
+            if not isinstance(operation, ImageOperation) or _is_transform_operation(operation):
+                transform_operations.append(operation)
+                continue
+            self._transform_image(transform_operations)
+            transform_operations = []
 
-            elif operation_type == OperationType.DISPLAY.value:
+            if operation.type == OperationType.DISPLAY.value:
                 self._display_image()
 
-            elif operation_type == OperationType.OUTPUT.value:
-                self._save_image(operation.output_path)
+            elif operation.type == OperationType.OUTPUT.value:
+                self._save_image(operation.output_path, self._position)
+            self._position += 1
+
+        self._transform_image(transform_operations)
 
-    def _adjust_image(self, adjustment_operation: ImageOperation) -> None:
+    def _transform_image(self, operations: List) -> None:
         """
-        Adjusts the image.
-        :param adjustment_operation: An ImageOperation representing the adjustment.
-        :return: None. Changes self._image to the adjusted image.
+        Applies consecutive adjustments, filters, lookup tables and color matrices on the image, band by band in case
+        of a memory budget or multiple threads. The image after every operation, or after all the bands, is cached.
+        :param operations: Operations to apply, in order of input.
+        :return: None. Changes self._image_array in place.
         """
-        adjustment_type = adjustment_operation.sub_type
-        value = adjustment_operation.value
-        self._image = self._adjustments[adjustment_type](self._image, value)
+        if not operations:
+            return
+        # A color matrix run is planned against the intensity bounds of the whole image it applies on, so the result
+        # doesn't depend on the bands
+        run_index = next((index for index, operation in enumerate(operations)
+                          if isinstance(operation, ColorMatrixRun)), None)
+        if run_index is not None:
+            self._transform_image(operations[:run_index])
+            with self._profiler.step("plan color matrix", "plan"):
+                planned_operations = plan_color_matrix_run(operations[run_index],
+                                                           compute_intensity_bounds(self._image_array))
+                planned_operations = fuse_point_operations(planned_operations, self._apply_operation)
+            self._transform_image(planned_operations + operations[run_index + 1:])
+            return
 
-    def _filter_image(self, filter_operation: ImageOperation) -> None:
+        if self._max_memory is None and self._threads == 1:
+            for operation in operations:
+                with self._profiler.step(self._describe_operation(operation), "operation"):
+                    self._image_array = self._apply_operation(self._image_array, operation)
+                self._position += count_fused_operations(operation)
+                self._cache_image()
+            return
+
+        band_description = "bands: " + ", ".join(self._describe_operation(operation) for operation in operations)
+        with self._profiler.step(band_description, "operation"):
+            validate_band_operations(self._image_array.shape, operations)
+            band_rows = compute_band_rows(self._image_array.shape, operations, self._max_memory, self._threads)
+            apply_operations_in_bands(self._image_array, operations, self._apply_operation, band_rows, self._threads)
+        self._position += sum(count_fused_operations(operation) for operation in operations)
+        self._cache_image()
+
+    def _describe_operation(self, operation) -> str:
         """
-        Filters the image.
-        :param filter_operation: An ImageOperation representing the filter.
-        :return: None. Changes self._image to the filtered image.
+        Describes an operation as its profile step name, reporting the convolution strategy chosen for a kernel filter.
+        :param operation: An ImageOperation, or a fused operation.
+        :return: Description of the operation, empty when profiling is off.
+        """
+        # Choosing the convolution strategy decomposes the kernel, which isn't worth it for a discarded step name
+        if not isinstance(self._profiler, Profiler):
+            return ""
+        description = describe_operation(operation)
+        if isinstance(operation, ImageOperation) and operation.sub_type == FilterType.KERNEL.value:
+            strategy = describe_convolution_strategy(np.array(operation.kernel), self._image_array.shape)
+            description += f" ({strategy})"
+        if uses_fixed_point(operation, self._precision):
+            description += " (fixed point)"
+        return description
+
+    def _restore_cached_prefix(self) -> int:
         """
-        filter_type = filter_operation.sub_type
+        Restores the image after the longest prefix of the operations found in the cache. The display and output
+        operations in that prefix are applied on their cached images.
+        :return: Number of operations in the restored prefix, 0 in case nothing was restored.
+        """
+        if self._cache is None:
+            return 0
+        with self._profiler.step("cache lookup", "cache"):
+            self._prefix_keys = prefix_keys(hash_file(self._image_path), self._operations, _is_transform_operation,
+                                            self._precision, self._color_lut_size, self._fuse_color_matrices)
+            restored_position = self._find_cached_prefix()
+            self._cache.record_lookup(restored_position > 0)
+        if restored_position == 0:
+            return 0
+
+        decoded_array = self._image_array
+        sink_positions = [position for position in range(restored_position)
+                          if not _is_transform_operation(self._operations[position])]
+        for position in sink_positions + [restored_position]:
+            # The image before the first adjustment or filter is the decoded image
+            if self._prefix_keys[position] == self._prefix_keys[0]:
+                self._image_array = decoded_array
+            else:
+                with self._profiler.step("cache restore", "cache"):
+                    cached_array = self._cache.get(self._prefix_keys[position])
+                # The entry may have been evicted by a concurrent run, in which case everything is recomputed
+                if cached_array is None:
+                    self._image_array = decoded_array
+                    return 0
+                self._image_array = cached_array
+
+            if position == restored_position:
+                break
+            operation = self._operations[position]
+            if operation.type == OperationType.DISPLAY.value:
+                self._display_image()
+            elif operation.type == OperationType.OUTPUT.value:
+                self._save_image(operation.output_path, position)
+        return restored_position
 
-        # filters with two parameters
-        if filter_type == FilterType.BLUR.value:
-            self._image = self._filters[filter_type](self._image, filter_operation.x, filter_operation.y)
+    def _find_cached_prefix(self) -> int:
+        """
+        Finds the longest prefix of the operations whose image is cached, along with the images of all the display and
+        output operations in it.
+        :return: Number of operations in the prefix, 0 in case no prefix is cached.
+        """
+        for position in range(len(self._operations), 0, -1):
+            key = self._prefix_keys[position]
+            if key == self._prefix_keys[0]:
+                break
+            if not self._cache.contains(key):
+                continue
+            if all(self._prefix_keys[sink_position] == self._prefix_keys[0]
+                   or self._cache.contains(self._prefix_keys[sink_position])
+                   for sink_position in range(position)
+                   if not _is_transform_operation(self._operations[sink_position])):
+                return position
+        return 0
 
-        # filters with one parameter
-        elif filter_type == FilterType.SHARPEN.value:
-            self._image = self._filters[filter_type](self._image, filter_operation.x)
+    def _cache_image(self) -> None:
+        """
+        Caches the current image, after the operations applied so far.
+        :return: None.
+        """
+        if self._cache is None:
+            return
+        key = self._prefix_keys[self._position]
+        if key != self._prefix_keys[0] and not self._cache.contains(key):
+            with self._profiler.step("cache store", "cache"):
+                self._cache.put(key, self._image_array)
 
-        # Filters with no parameters
-        elif filter_type in [FilterType.EDGE_DETECTION.value, FilterType.INVERT.value, FilterType.SEPIA.value]:
-            self._image = self._filters[filter_type](self._image)
+    def _resize_image(self, resize_operation: ImageOperation) -> None:
+        """
+        Resizes the image, replacing the working buffer.
+        :param resize_operation: An ImageOperation representing the resize or fit.
+        :return: None.
+        """
+        width, height = resize_size(resize_operation, self._image_array.shape[1], self._image_array.shape[0])
+        with self._profiler.step(describe_operation(resize_operation), "operation"):
+            self._image_array = resize_image_array(self._image_array, width, height)
+        self._position += 1
+        self._cache_image()
 
     def _display_image(self) -> None:
         """
         Displays the current image.
         :return: None.
         """
-        self._image.show()
+        with self._profiler.step("display", "display"):
+            convert_array_to_image(self._image_array).show()
 
-    def _save_image(self, output_path: str) -> None:
+    def _save_image(self, output_path: str, position: int) -> None:
         """
-        Saves the current image in a designated path.
+        Queues the current image to be saved in a designated path on the output writer thread. The image is copied only
+        in case a later operation changes it, and with a memory budget, which a copy would exceed, it is saved before
+        the operations go on instead.
+        :param output_path: Path in which to save image into.
+        :param position: Position of the output operation in the operations.
+        :return: None.
+        """
+        if self._output_writer is None:
+            self._output_writer = OutputWriter(self._write_image)
+        changed_later = any(_is_transform_operation(operation) for operation in self._operations[position + 1:])
+        if changed_later and self._max_memory is not None:
+            self._output_writer.submit(self._image_array, output_path, copy=False)
+            self._output_writer.flush()
+            return
+        self._output_writer.submit(self._image_array, output_path, copy=changed_later)
+
+    def _write_image(self, image_array: np.ndarray, output_path: str) -> None:
+        """
+        Saves an image in a designated path.
+        :param image_array: Image to save, in uint8 numpy array form.
         :param output_path: Path in which to save image into.
         :return: None.
         :raise: IOError in case there was a problem in saving the image.
         """
-        try:
-            self._image.save(output_path)
-        except IOError as e:
-            raise IOError(f"Unable to save image: {e}.")
+        with self._profiler.step(f"encode {output_path}", "encode"):
+            try:
+                if is_raw_image_path(output_path):
+                    save_raw_image_array(image_array, output_path)
+                else:
+                    convert_array_to_image(image_array).save(output_path)
+            except IOError as e:
+                raise IOError(f"Unable to save image: {e}.")
+
+
+def run_image_editor(image_path: str, operations: List[ImageOperation], preview_size: Optional[int] = None,
+                     **editor_arguments) -> ImageEditor:
+    """
+    Applies operations on an image. With a preview size, the display operations are first applied on a reduced proxy
+    of the image, so the preview shows quickly, and only then the output operations are rendered at full size.
+    :param image_path: Path of the image to edit.
+    :param operations: Operations to apply on the image, in order of input.
+    :param preview_size: Maximal width and height of the preview proxy. None to display the full size image.
+    :param editor_arguments: Keyword arguments of the ImageEditor rendering the outputs.
+    :return: The image editor that applied the operations last.
+    """
+    display_indices = [index for index, operation in enumerate(operations)
+                       if operation.type == OperationType.DISPLAY.value]
+    output_indices = [index for index, operation in enumerate(operations)
+                      if operation.type == OperationType.OUTPUT.value]
+    if preview_size is None or not display_indices:
+        image_editor = ImageEditor(image_path, operations, **editor_arguments)
+        image_editor.apply_operations()
+        return image_editor
+
+    # The proxy results must not be cached as full size results, and the full size render is profiled if there is one
+    preview_arguments = {key: value for key, value in editor_arguments.items()
+                         if key in ["max_memory", "threads", "precision", "color_lut_size", "fuse_color_matrices"]
+                         or (key == "profile_path" and not output_indices)}
+    preview_operations = [operation for operation in operations[:display_indices[-1] + 1]
+                          if operation.type != OperationType.OUTPUT.value]
+    image_editor = ImageEditor(image_path, preview_operations, preview_size=preview_size, **preview_arguments)
+    image_editor.apply_operations()
+    if not output_indices:
+        return image_editor
+
+    render_operations = [operation for operation in operations[:output_indices[-1] + 1]
+                         if operation.type != OperationType.DISPLAY.value]
+    image_editor = ImageEditor(image_path, render_operations, **editor_arguments)
+    image_editor.apply_operations()
+    return image_editor
+
+
+def _scale_blur_kernels(operations: List[ImageOperation], row_scale: float,
+                        column_scale: float) -> List[ImageOperation]:
+    """
+    Scales the blur kernels of operations to an image of a different size, up to the first resize, after which the
+    image size doesn't depend on the original image size.
+    :param operations: Operations to scale.
+    :param row_scale: Ratio between the heights of the new image and the original image.
+    :param column_scale: Ratio between the widths of the new image and the original image.
+    :return: The operations, with the valid blur kernel sizes scaled and at least 1.
+    """
+    def scale_kernel_size(kernel_size: int, scale: float) -> int:
+        return max(1, round(kernel_size * scale)) if kernel_size > 0 else kernel_size
+
+    scaled_operations = []
+    for index, operation in enumerate(operations):
+        if operation.type == OperationType.RESIZE.value:
+            return scaled_operations + operations[index:]
+        if operation.type == OperationType.FILTER.value and operation.sub_type == FilterType.BLUR.value:
+            operation = dataclasses.replace(operation, x=scale_kernel_size(operation.x, row_scale),
+                                            y=scale_kernel_size(operation.y, column_scale))
+        scaled_operations.append(operation)
+    return scaled_operations
+
+
+def _is_transform_operation(operation: ImageOperation) -> bool:
+    """
+    Checks if an operation changes the image, i.e. is an adjustment, a filter or a resize.
+    :param operation: Operation to check.
+    :return: True if the operation changes the image, False otherwise.
+    """
+    return operation.type in [OperationType.ADJUSTMENT.value, OperationType.FILTER.value, OperationType.RESIZE.value]
@@ -1,97 +1,146 @@
+from typing import List, Optional, Tuple
 from image_utils import *
 
+# Matrix mapping the RGB values of a pixel to its sepia RGB values
+SEPIA_MATRIX = np.array([[0.393, 0.769, 0.189],
+                         [0.349, 0.686, 0.168],
+                         [0.272, 0.534, 0.131]])
+# Sobel kernels of the horizontal and vertical gradients, used by the Edge Detection filter
+SOBEL_X_KERNEL = np.array([[-1, 0, 1],
+                           [-2, 0, 2],
+                           [-1, 0, 1]])
+SOBEL_Y_KERNEL = np.array([[1, 2, 1],
+                           [0, 0, 0],
+                           [-1, -2, -1]])
+# Kernel of the Sharpen filter, before scaling by the sharpening magnitude
+SHARPEN_KERNEL = np.array([[0, -1, 0],
+                           [-1, 5, -1],
+                           [0, -1, 0]])
+# The built-in kernels are decomposed into separable kernels once, rather than on every convolution
+SOBEL_X_SEPARABLE_KERNELS = decompose_kernel(SOBEL_X_KERNEL)
+SOBEL_Y_SEPARABLE_KERNELS = decompose_kernel(SOBEL_Y_KERNEL)
+SHARPEN_SEPARABLE_KERNELS = decompose_kernel(SHARPEN_KERNEL)
 
-def apply_box_blur_filter(image: Image, x: int, y: int) -> Image:
+
+def apply_box_blur_filter(image_array: np.ndarray, x: int, y: int, fixed_point: bool = False) -> np.ndarray:
     """
     Method for applying the Box Blur filter.
-    :param image: Image to apply filter on.
+    :param image_array: Image to apply filter on, in uint8 numpy array form. Filtered in place.
     :param x: x size of kernel.
     :param y: y size of kernel.
-    :return: New filtered image.
+    :param fixed_point: Whether to sum the kernel in integers. Identical to the float filter for kernel areas up to
+    EXACT_FIXED_POINT_BOX_AREA, and at most 1 level off for larger ones.
+    :return: The filtered image array.
     :raise: ValueError if x or y are not positive.
     """
     # Checking if x and y are inputted
     if x <= 0 or y <= 0:
         raise ValueError(constants.UNSPECIFIED_KERNEL_SIZE_ERR_MSG)
-    image_array = convert_image_to_array(image)
-    kernel = np.ones((x, y)) / (x * y)
-    image_array = convolution(image_array, kernel).astype(np.uint8)
-    return Image.fromarray(image_array)
+    if fixed_point:
+        image_array[...] = fixed_point_box_filter(image_array, x, y)
+        return image_array
+    # The kernel has x rows and y columns, normalized by its size
+    image_array[...] = box_filter(convert_image_to_array(image_array), x, y)
+    return image_array
 
 
-def apply_edge_detection_filter(image: Image) -> Image:
+def apply_edge_detection_filter(image_array: np.ndarray) -> np.ndarray:
     """
     Method for applying the Edge Detection filter.
-    :param image: Image to apply filter on.
-    :return: New filtered image.
+    :param image_array: Image to apply filter on, in uint8 numpy array form. Filtered in place.
+    :return: The filtered image array.
     """
     # Converting the image to grayscale is necessary in this filter
-    image = convert_to_grayscale(image)
-    image_array = convert_image_to_array(image)
-    # Initializing filter kernels
-    sobel_x = np.array([[-1, 0, 1],
-                        [-2, 0, 2],
-                        [-1, 0, 1]])
-    sobel_y = np.array([[1, 2, 1],
-                        [0, 0, 0],
-                        [-1, -2, -1]])
+    grayscale_array = convert_image_to_array(convert_rgb_array_to_grayscale(image_array))
     # Applying convolution
-    grad_x = convolution(image_array, sobel_x)
-    grad_y = convolution(image_array, sobel_y)
+    grad_x = convolution(grayscale_array, SOBEL_X_KERNEL, SOBEL_X_SEPARABLE_KERNELS)
+    grad_y = convolution(grayscale_array, SOBEL_Y_KERNEL, SOBEL_Y_SEPARABLE_KERNELS)
     # Summing the output
     grad = np.hypot(grad_x, grad_y)
-    # Making sure output is in valid range
-    image_array = np.clip(grad, constants.MIN_INTENSITY, constants.MAX_INTENSITY).astype(np.uint8)
-    # Converting image back to RGB
-    filtered_image = Image.fromarray(image_array)
-    return convert_to_rgb(filtered_image)
+    # Making sure output is in valid range, and converting image back to RGB
+    image_array[...] = np.clip(grad, constants.MIN_INTENSITY, constants.MAX_INTENSITY)[:, :, np.newaxis]
+    return image_array
 
 
-def apply_sharpen_filter(image: Image, sharpen_magnitude: float) -> Image:
+def apply_sharpen_filter(image_array: np.ndarray, sharpen_magnitude: float, fixed_point: bool = False) -> np.ndarray:
     """
     Method for applying the Sharpen filter.
-    :param image: Image to apply filter on.
+    :param image_array: Image to apply filter on, in uint8 numpy array form. Filtered in place.
     :param sharpen_magnitude: Sharpening magnitude.
-    :return: New filtered image.
+    :param fixed_point: Whether to convolve in int16 and scale the sums through a lookup table. Identical to the float
+    filter, since the sums of the integer kernel are exact in both.
+    :return: The filtered image array.
     :raise: ValueError if sharpen_magnitude is smaller than 1.
     """
     # Checking if sharpen_magnitude is valid
     if sharpen_magnitude < 1:
         raise ValueError(constants.INVALID_SHARPEN_MAGNITUDE_ERR_MSG)
-    image_array = convert_image_to_array(image)
-    kernel = np.array([[0, -1, 0],
-                       [-1, 5, -1],
-                       [0, -1, 0]])
-    image_array = convolution(image_array, kernel) * sharpen_magnitude
-    image_array = np.clip(image_array, constants.MIN_INTENSITY, constants.MAX_INTENSITY).astype(np.uint8)
-    return Image.fromarray(image_array)
+    if fixed_point:
+        low, high = fixed_point_convolution_bounds(SHARPEN_KERNEL)
+        # Scaling every possible sum exactly like the float filter does, in float32
+        table = np.clip(np.arange(low, high + 1, dtype=np.float32) * sharpen_magnitude,
+                        constants.MIN_INTENSITY, constants.MAX_INTENSITY).astype(np.uint8)
+        sums = fixed_point_convolution(image_array, SHARPEN_KERNEL)
+        image_array[...] = np.take(table, np.subtract(sums, low, out=sums))
+        return image_array
+    sharpened_array = convolution(convert_image_to_array(image_array), SHARPEN_KERNEL,
+                                  SHARPEN_SEPARABLE_KERNELS) * sharpen_magnitude
+    image_array[...] = np.clip(sharpened_array, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
+    return image_array
+
+
+def apply_kernel_filter(image_array: np.ndarray, kernel,
+                        separable_kernels: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None) -> np.ndarray:
+    """
+    Method for applying a filter of an arbitrary convolution kernel, for example a Gaussian, motion blur or emboss
+    kernel. The kernel is applied on every channel, with the same padding and orientation as the built-in filters.
+    :param image_array: Image to apply filter on, in uint8 numpy array form. Filtered in place.
+    :param kernel: 2-D kernel, a numpy array or a sequence of rows of numbers.
+    :param separable_kernels: Decomposition of the kernel by decompose_kernel, computed in advance for a kernel that is
+    applied many times. None to decompose the kernel.
+    :return: The filtered image array.
+    :raise: ValueError if the kernel isn't a non-empty 2-D grid of finite numbers, or is bigger than the image.
+    """
+    kernel = compile_kernel(kernel)
+    filtered_array = convolution(convert_image_to_array(image_array), kernel, separable_kernels)
+    image_array[...] = np.clip(filtered_array, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
+    return image_array
 
 
-def apply_invert_filter(image: Image) -> Image:
+def apply_invert_filter(image_array: np.ndarray) -> np.ndarray:
     """
     Method for applying the Invert Colors filter.
-    :param image: Image to apply filter on.
-    :param x: Irrelevant argument.
-    :param y: Irrelevant argument.
-    :return: New filtered image.
+    :param image_array: Image to apply filter on, in uint8 numpy array form. Filtered in place.
+    :return: The filtered image array.
     """
-    image_array = convert_image_to_array(image).astype(np.uint8)
-    inverted_image_array = constants.MAX_INTENSITY - image_array
-    return Image.fromarray(inverted_image_array)
+    return np.subtract(constants.MAX_INTENSITY, image_array, out=image_array)
 
 
-def apply_sepia_filter(image: Image) -> Image:
+def apply_sepia_filter(image_array: np.ndarray, fixed_point: bool = False) -> np.ndarray:
     """
     Method for applying the Sepia filter.
-    :param image: Image to apply filter on.
-    :param x: Irrelevant argument.
-    :param y: Irrelevant argument.
-    :return: New filtered image.
+    :param image_array: Image to apply filter on, in uint8 numpy array form. Filtered in place.
+    :param fixed_point: Whether to transform the colors in int32 fixed point, at most 1 level off the float filter.
+    :return: The filtered image array.
+    """
+    if fixed_point:
+        return apply_fixed_point_color_transform(image_array, SEPIA_MATRIX, np.zeros(3))
+    sepia_array = convert_image_to_array(image_array).dot(SEPIA_MATRIX.T)
+    image_array[...] = np.clip(sepia_array, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
+    return image_array
+
+
+def compile_kernel(kernel) -> np.ndarray:
+    """
+    Converts a kernel to a float64 array, checking it is valid.
+    :param kernel: 2-D kernel, a numpy array or a sequence of rows of numbers.
+    :return: The kernel array, the given array itself in case it's already a float64 array.
+    :raise: ValueError if the kernel isn't a non-empty 2-D grid of finite numbers.
     """
-    image_array = convert_image_to_array(image)
-    sepia_filter = np.array([[0.393, 0.769, 0.189],
-                             [0.349, 0.686, 0.168],
-                             [0.272, 0.534, 0.131]])
-    image_array = image_array.dot(sepia_filter.T)
-    image_array = np.clip(image_array, constants.MIN_INTENSITY, constants.MAX_INTENSITY).astype(np.uint8)
-    return Image.fromarray(image_array)
+    try:
+        kernel = np.asarray(kernel, dtype=np.float64)
+    except ValueError:
+        raise ValueError(constants.INVALID_KERNEL_ERR_MSG)
+    if kernel.ndim != 2 or kernel.size == 0 or not np.isfinite(kernel).all():
+        raise ValueError(constants.INVALID_KERNEL_ERR_MSG)
+    return kernel
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
-from enums import AdjustmentType, FilterType, OperationType
-from typing import Optional, Union
+from enums import AdjustmentType, FilterType, OperationType, ResizeType
+from typing import Optional, Tuple, Union
 
 
 @dataclass
@@ -9,8 +9,10 @@ class ImageOperation:
     Class representing an operation to be done on an image
     """
     type: OperationType
-    sub_type: Optional[Union[AdjustmentType, FilterType]] = None
+    sub_type: Optional[Union[AdjustmentType, FilterType, ResizeType]] = None
     x: Optional[Union[int, float]] = None
     y: Optional[int] = None
     value: Optional[int] = None
     output_path: Optional[str] = None
+    kernel_path: Optional[str] = None
+    kernel: Optional[Tuple[Tuple[float, ...], ...]] = None
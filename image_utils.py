@@ -1,17 +1,96 @@
+import math
+import os
+import uuid
+from typing import List, Optional, Tuple
 import numpy as np
 from PIL import Image
 import constants
+from enums import ConvolutionStrategy
 
 
 def convert_image_to_array(image: Image) -> np.ndarray:
     """
     Converts and image to a numpy array.
-    :param image: Input image.
+    :param image: Input image, either a PIL image or an image array.
     :return: Image in numpy array form.
     """
     return np.array(image, dtype=np.float32)
 
 
+def convert_image_to_uint8_array(image: Image) -> np.ndarray:
+    """
+    Converts an image to a writable uint8 numpy array, used as a working buffer that operations change in place.
+    :param image: Input image.
+    :return: Image in uint8 numpy array form.
+    """
+    return np.array(image, dtype=np.uint8)
+
+
+def convert_array_to_image(image_array: np.ndarray) -> Image:
+    """
+    Converts a uint8 numpy array to an image.
+    :param image_array: Image in uint8 numpy array form.
+    :return: The image.
+    """
+    return Image.fromarray(image_array)
+
+
+def validate_image_array(image_array: np.ndarray) -> None:
+    """
+    Checks that an array holds an RGB image, as the operations expect.
+    :param image_array: Image array to check.
+    :return: None.
+    :raise: ValueError in case the array isn't a uint8 array of height x width x 3 values.
+    """
+    if image_array.dtype != np.uint8 or image_array.ndim != 3 or image_array.shape[2] != 3:
+        raise ValueError(constants.INVALID_IMAGE_ARRAY_ERR_MSG)
+
+
+def is_raw_image_path(image_path: str) -> bool:
+    """
+    Checks if a path is of a raw image, stored as a uint8 RGB array in NumPy format.
+    :param image_path: Path of the image.
+    :return: True if the image is raw, False otherwise.
+    """
+    return image_path.lower().endswith(constants.RAW_IMAGE_EXTENSION)
+
+
+def load_raw_image_array(image_path: str) -> np.ndarray:
+    """
+    Memory maps a raw image copy-on-write, so its pages are read from the file only when accessed, and copied only when
+    an operation changes them in place. The file itself is never changed.
+    :param image_path: Path of the raw image.
+    :return: Image in uint8 numpy array form, backed by the file.
+    :raise: IOError in case the file can't be read, ValueError in case it doesn't hold a uint8 RGB array.
+    """
+    image_array = np.load(image_path, mmap_mode="c")
+    if image_array.dtype != np.uint8 or image_array.ndim != 3 or image_array.shape[2] != 3:
+        raise ValueError(constants.INVALID_RAW_IMAGE_ERR_MSG)
+    return np.ascontiguousarray(image_array)
+
+
+def save_raw_image_array(image_array: np.ndarray, output) -> None:
+    """
+    Saves an image as raw uint8 RGB values in NumPy format, with a short header followed by a single write of the
+    image buffer. A path is written through a temporary file next to it, which then replaces the path, since the image
+    may be memory mapped from the very file it is saved into, and truncating that file would lose the image.
+    :param image_array: Image in uint8 numpy array form.
+    :param output: Path or binary file to save the image into.
+    :return: None.
+    """
+    if not isinstance(output, str):
+        np.save(output, np.ascontiguousarray(image_array), allow_pickle=False)
+        return
+    temporary_path = f"{output}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temporary_path, "wb") as temporary_file:
+            np.save(temporary_file, np.ascontiguousarray(image_array), allow_pickle=False)
+        os.replace(temporary_path, output)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
 def convert_to_rgb(image: Image) -> Image:
     """
     Converts an image to RGB.
@@ -21,6 +100,71 @@ def convert_to_rgb(image: Image) -> Image:
     return image.convert('RGB')
 
 
+def convert_to_reduced_rgb(image: Image, max_size: int) -> Image:
+    """
+    Converts a just opened image to RGB, reduced by an integer factor so that its longer side is at most max_size.
+    JPEG images are decoded at 1/2, 1/4 or 1/8 of their size directly from the compressed data, so the full resolution
+    image is never decoded.
+    :param image: Input image, opened and not yet loaded.
+    :param max_size: Maximal width and height of the reduced image.
+    :return: Reduced image in RGB format.
+    """
+    scale = max(image.size) / max_size
+    if scale <= 1:
+        return convert_to_rgb(image)
+    # Requesting the smallest draft scale that still holds the reduced size, which only JPEG images support
+    image.draft(image.mode, (math.ceil(image.width / scale), math.ceil(image.height / scale)))
+    image = convert_to_rgb(image)
+    factor = math.ceil(max(image.size) / max_size)
+    return image.reduce(factor) if factor > 1 else image
+
+
+def convert_to_resized_rgb(image: Image, width: int, height: int) -> Image:
+    """
+    Converts a just opened image to RGB and resizes it with Lanczos resampling, decoding only the resolution needed.
+    JPEG images are decoded at a reduced scale directly from the compressed data, and then every image is reduced by
+    integer factors before resampling, as long as it stays at least RESIZE_REDUCING_GAP times the given size.
+    :param image: Input image, opened and not yet loaded.
+    :param width: Width of the resized image.
+    :param height: Height of the resized image.
+    :return: Resized image in RGB format.
+    """
+    reducing_gap = constants.RESIZE_REDUCING_GAP
+    draft = image.draft(image.mode, (width * reducing_gap, height * reducing_gap))
+    image = convert_to_rgb(image)
+    # Region of the drafted image matching the whole original image, which the draft may round up
+    box = draft[1] if draft is not None else None
+    return image.resize((width, height), resample=Image.Resampling.LANCZOS, box=box, reducing_gap=reducing_gap)
+
+
+def resize_image_array(image_array: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Resizes an image with Lanczos resampling.
+    :param image_array: Image in uint8 numpy array form.
+    :param width: Width of the resized image.
+    :param height: Height of the resized image.
+    :return: The resized image, in a new uint8 numpy array.
+    """
+    if (width, height) == (image_array.shape[1], image_array.shape[0]):
+        return image_array
+    resized_image = Image.fromarray(image_array).resize((width, height), resample=Image.Resampling.LANCZOS)
+    return convert_image_to_uint8_array(resized_image)
+
+
+def fit_size(width: int, height: int, max_width: int, max_height: int) -> Tuple[int, int]:
+    """
+    Computes the size of an image scaled down to fit in a box, keeping its aspect ratio. Images fitting in the box
+    keep their size.
+    :param width: Width of the image.
+    :param height: Height of the image.
+    :param max_width: Width of the box.
+    :param max_height: Height of the box.
+    :return: A tuple of the fitted width and height, both at least 1.
+    """
+    scale = min(1, max_width / width, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
 def convert_to_grayscale(image: Image) -> Image:
     """
     Converts an image to grayscale.
@@ -30,11 +174,87 @@ def convert_to_grayscale(image: Image) -> Image:
     return image.convert('L')
 
 
-def convolution(image_array: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+def convert_rgb_array_to_grayscale(image_array: np.ndarray) -> np.ndarray:
+    """
+    Converts an RGB image array to grayscale, with the same integer formula as converting a PIL image to 'L' mode.
+    :param image_array: RGB image in uint8 numpy array form.
+    :return: Grayscale image in uint8 numpy array form.
+    """
+    r, g, b = (image_array[:, :, channel].astype(np.uint32) for channel in range(3))
+    return ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+
+def convert_rgb_to_hls(rgb_array: np.ndarray) -> tuple:
+    """
+    Converts an RGB image array to HLS, with the same formulas as colorsys.rgb_to_hls applied on every pixel.
+    :param rgb_array: RGB image in numpy array form, with values in range [0, 1].
+    :return: A tuple of the hue, lightness and saturation arrays, in float64 and in range [0, 1].
+    """
+    rgb_array = rgb_array.astype(np.float64)
+    r, g, b = rgb_array[..., 0], rgb_array[..., 1], rgb_array[..., 2]
+    max_c = rgb_array.max(axis=-1)
+    min_c = rgb_array.min(axis=-1)
+    sum_c = max_c + min_c
+    range_c = max_c - min_c
+    l = sum_c / 2.0
+    # Gray pixels have zero hue and saturation, so they are excluded from the divisions
+    is_gray = range_c == 0
+    safe_range_c = np.where(is_gray, 1.0, range_c)
+    s = np.where(l <= 0.5, range_c / np.where(is_gray, 1.0, sum_c), range_c / np.where(is_gray, 1.0, 2.0 - sum_c))
+    rc = (max_c - r) / safe_range_c
+    gc = (max_c - g) / safe_range_c
+    bc = (max_c - b) / safe_range_c
+    h = np.where(r == max_c, bc - gc, np.where(g == max_c, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = (h / 6.0) % 1.0
+    h[is_gray] = 0.0
+    s[is_gray] = 0.0
+    return h, l, s
+
+
+def convert_hls_to_rgb(h: np.ndarray, l: np.ndarray, s: np.ndarray) -> np.ndarray:
+    """
+    Converts HLS arrays to an RGB image array, with the same formulas as colorsys.hls_to_rgb applied on every pixel.
+    :param h: Hue array, with values in range [0, 1].
+    :param l: Lightness array, with values in range [0, 1].
+    :param s: Saturation array, with values in range [0, 1].
+    :return: RGB image in numpy array form, in float64 and in range [0, 1].
+    """
+    m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+    rgb_array = np.stack((_hue_to_rgb(m1, m2, h + 1.0 / 3.0),
+                          _hue_to_rgb(m1, m2, h),
+                          _hue_to_rgb(m1, m2, h - 1.0 / 3.0)), axis=-1)
+    # Pixels without saturation are gray
+    is_gray = s == 0.0
+    rgb_array[is_gray] = l[is_gray, np.newaxis]
+    return rgb_array
+
+
+def _hue_to_rgb(m1: np.ndarray, m2: np.ndarray, hue: np.ndarray) -> np.ndarray:
+    """
+    Computes a single RGB channel from its hue, like the helper of colorsys.hls_to_rgb.
+    :param m1: Lower bound of the channel value.
+    :param m2: Upper bound of the channel value.
+    :param hue: Hue of the channel.
+    :return: The channel values array.
+    """
+    hue = hue % 1.0
+    return np.select([hue < 1.0 / 6.0, hue < 0.5, hue < 2.0 / 3.0],
+                     [m1 + (m2 - m1) * hue * 6.0, m2, m1 + (m2 - m1) * (2.0 / 3.0 - hue) * 6.0],
+                     default=m1)
+
+
+def convolution(image_array: np.ndarray, kernel: np.ndarray,
+                separable_kernels: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None) -> np.ndarray:
     """
     Applies a convolution with specified kernel to the image array.
-    :param image_array: Image to convolve on in numpy array form.
+    The strategy is chosen according to the kernel and image sizes: small kernels are computed by accumulating shifted
+    slices of the padded image, while large kernels are computed using the FFT. Kernels that are a sum of few separable
+    kernels are computed as vertical and horizontal 1-D passes, in case it's cheaper.
+    :param image_array: Image to convolve on in numpy array form. Either a 2-D grayscale or a 3-D RGB array.
     :param kernel: Kernel of the convolution.
+    :param separable_kernels: Decomposition of the kernel by decompose_kernel, computed in advance for a kernel that is
+    applied many times. None to decompose the kernel.
     :return: The new image array after convolution operation.
     :raise: ValueError in case the kernel size is bigger than the image size.
     """
@@ -51,15 +271,366 @@ def convolution(image_array: np.ndarray, kernel: np.ndarray) -> np.ndarray:
     pad_height, pad_width = kernel_height // 2, kernel_width // 2
     padded_image = np.pad(image_array, ((pad_height, pad_height), (pad_width, pad_width), (0, 0)),
                           mode='reflect')
-    # Creating output array
-    new_image_array = np.zeros_like(image_array)
     # Applying convolution operation
-    for i in range(new_image_array.shape[0]):
-        for j in range(new_image_array.shape[1]):
-            for k in range(new_image_array.shape[2]):
-                new_image_array[i, j, k] = np.sum(kernel * padded_image[i:i + kernel_height, j:j + kernel_width, k])
+    strategy, separable_kernels = plan_convolution(kernel, padded_image.shape, separable_kernels)
+    if strategy == ConvolutionStrategy.SEPARABLE:
+        new_image_array = _separable_convolution(padded_image, separable_kernels, image_array.shape)
+    else:
+        new_image_array = _padded_convolution(padded_image, kernel, image_array.shape)
+    new_image_array = new_image_array.astype(image_array.dtype)
 
     # If the original image was in grayscale we need to remove the added dimension.
     if new_image_array.shape[2] == 1:
         new_image_array = new_image_array.squeeze(axis=2)
     return new_image_array
+
+
+def plan_convolution(kernel: np.ndarray, padded_image_shape: tuple,
+                     separable_kernels: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None) -> Tuple:
+    """
+    Chooses the cheapest strategy of a convolution, comparing the cost of a single 2-D pass with the cost of a pair of
+    1-D passes for every separable kernel the kernel is a sum of.
+    :param kernel: Kernel of the convolution.
+    :param padded_image_shape: Shape of the image array, padded by half the kernel size on each side.
+    :param separable_kernels: Decomposition of the kernel by decompose_kernel, None to decompose the kernel.
+    :return: A tuple of the ConvolutionStrategy, and the list of separable kernels in case of the separable strategy
+    (None otherwise).
+    """
+    kernel_height, kernel_width = kernel.shape
+    fft_cost = constants.FFT_CONVOLUTION_COST_FACTOR * np.log2(padded_image_shape[0] * padded_image_shape[1])
+    single_pass_cost = min(kernel_height * kernel_width, fft_cost)
+    if separable_kernels is None:
+        separable_kernels = decompose_kernel(kernel)
+    separable_cost = len(separable_kernels) * (min(kernel_height, fft_cost) + min(kernel_width, fft_cost))
+    if separable_cost < single_pass_cost:
+        return ConvolutionStrategy.SEPARABLE, separable_kernels
+    if _is_fft_convolution_faster(kernel.shape, padded_image_shape):
+        return ConvolutionStrategy.FFT, None
+    return ConvolutionStrategy.SHIFTED, None
+
+
+def describe_convolution_strategy(kernel: np.ndarray, image_shape: tuple) -> str:
+    """
+    Describes the strategy a convolution of an image with a kernel is computed with.
+    :param kernel: Kernel of the convolution.
+    :param image_shape: Shape of the image array.
+    :return: Name of the strategy, along with the number of separable kernels in case of the separable strategy.
+    """
+    kernel_height, kernel_width = kernel.shape
+    padded_image_shape = (image_shape[0] + kernel_height // 2 * 2, image_shape[1] + kernel_width // 2 * 2)
+    strategy, separable_kernels = plan_convolution(kernel, padded_image_shape)
+    if strategy == ConvolutionStrategy.SEPARABLE:
+        return f"{strategy.value}, rank {len(separable_kernels)}"
+    return strategy.value
+
+
+def decompose_kernel(kernel: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Decomposes a kernel into a sum of separable kernels, each the outer product of a column and a row. The number of
+    separable kernels is the rank of the kernel, found by its singular values. The columns and rows are taken from the
+    kernel itself by elimination with full pivoting rather than from the singular vectors, so that kernels of small
+    integers, like the Sobel kernels, are decomposed exactly.
+    :param kernel: Kernel to decompose.
+    :return: A list of tuples of the column and row of every separable kernel.
+    """
+    residual = np.array(kernel, dtype=np.float64)
+    singular_values = np.linalg.svd(residual, compute_uv=False)
+    rank = int(np.sum(singular_values > constants.KERNEL_RANK_TOLERANCE * singular_values[0]))
+    separable_kernels = []
+    for _ in range(rank):
+        pivot_row, pivot_column = np.unravel_index(np.argmax(np.abs(residual)), residual.shape)
+        column = residual[:, pivot_column].copy()
+        row = residual[pivot_row] / residual[pivot_row, pivot_column]
+        residual -= np.outer(column, row)
+        separable_kernels.append((column, row))
+    return separable_kernels
+
+
+def box_filter(image_array: np.ndarray, kernel_height: int, kernel_width: int) -> np.ndarray:
+    """
+    Applies a box filter, a convolution with a kernel of ones normalized by its size, to the image array.
+    The filter is computed with separable running sums, so its cost per pixel doesn't depend on the kernel size.
+    :param image_array: Image to filter in numpy array form. Either a 2-D grayscale or a 3-D RGB array.
+    :param kernel_height: Height of the box kernel.
+    :param kernel_width: Width of the box kernel.
+    :return: The new image array after the box filter.
+    :raise: ValueError in case the kernel size is bigger than the image size.
+    """
+    # Checking if image is in grayscale, if so we need to add another dimension
+    if image_array.ndim == 2:
+        image_array = image_array[:, :, np.newaxis]
+
+    height, width = image_array.shape[0], image_array.shape[1]
+    # Checking if kernel size is valid
+    if kernel_height > height or kernel_width > width:
+        raise ValueError(constants.CONVOLUTION_KERNEL_SIZE_ERR_MSG)
+
+    # Padding the image exactly like the convolution operation does
+    pad_height, pad_width = kernel_height // 2, kernel_width // 2
+    padded_image = np.pad(image_array, ((pad_height, pad_height), (pad_width, pad_width), (0, 0)),
+                          mode='reflect')
+    # Summing the box rows first and then the box columns
+    box_sums = _running_sum(padded_image, kernel_height, axis=0)[:height]
+    box_sums = _running_sum(box_sums, kernel_width, axis=1)[:, :width]
+    new_image_array = (box_sums / (kernel_height * kernel_width)).astype(image_array.dtype)
+
+    # If the original image was in grayscale we need to remove the added dimension.
+    if new_image_array.shape[2] == 1:
+        new_image_array = new_image_array.squeeze(axis=2)
+    return new_image_array
+
+
+def fixed_point_box_filter(image_array: np.ndarray, kernel_height: int, kernel_width: int) -> np.ndarray:
+    """
+    Applies a box filter on a uint8 image with integer arithmetic. The box sums are exact integers, and every pixel is
+    the floor of their mean, like the float box filter truncated to uint8. The float filter rounds the mean to float32
+    first, so the two are identical for kernel areas up to EXACT_FIXED_POINT_BOX_AREA, and differ by at most 1 level
+    for larger kernels.
+    :param image_array: Image to filter in uint8 numpy array form. Either a 2-D grayscale or a 3-D RGB array.
+    :param kernel_height: Height of the box kernel.
+    :param kernel_width: Width of the box kernel.
+    :return: The new image array after the box filter, in uint8.
+    :raise: ValueError in case the kernel size is bigger than the image size.
+    """
+    if image_array.ndim == 2:
+        return fixed_point_box_filter(image_array[:, :, np.newaxis], kernel_height, kernel_width).squeeze(axis=2)
+
+    height, width = image_array.shape[0], image_array.shape[1]
+    if kernel_height > height or kernel_width > width:
+        raise ValueError(constants.CONVOLUTION_KERNEL_SIZE_ERR_MSG)
+
+    pad_height, pad_width = kernel_height // 2, kernel_width // 2
+    padded_image = np.pad(image_array, ((pad_height, pad_height), (pad_width, pad_width), (0, 0)),
+                          mode='reflect')
+    # The cumulative sums of the box columns reach the sum of a box row times the padded width
+    max_sum = constants.MAX_INTENSITY * kernel_height * padded_image.shape[1]
+    sum_dtype = np.int32 if max_sum <= np.iinfo(np.int32).max else np.int64
+    box_sums = _running_row_sum(padded_image, kernel_height, sum_dtype)[:height]
+    box_sums = _running_sum(box_sums, kernel_width, axis=1, dtype=sum_dtype)[:, :width]
+    return np.floor_divide(box_sums, kernel_height * kernel_width, out=box_sums).astype(np.uint8)
+
+
+def fixed_point_convolution(image_array: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """
+    Applies a convolution with an integer kernel on a uint8 image with integer arithmetic, accumulating shifted slices
+    of the padded image in the narrowest integer type holding every possible sum. The result is exact, like the float
+    convolution of small integer kernels.
+    :param image_array: Image to convolve on in uint8 numpy array form. Either a 2-D grayscale or a 3-D RGB array.
+    :param kernel: Kernel of the convolution, holding integers.
+    :return: The new image array after convolution operation, in int16 or int32.
+    :raise: ValueError in case the kernel size is bigger than the image size.
+    """
+    if image_array.ndim == 2:
+        return fixed_point_convolution(image_array[:, :, np.newaxis], kernel).squeeze(axis=2)
+
+    kernel_height, kernel_width = kernel.shape
+    if kernel_height > image_array.shape[0] or kernel_width > image_array.shape[1]:
+        raise ValueError(constants.CONVOLUTION_KERNEL_SIZE_ERR_MSG)
+
+    pad_height, pad_width = kernel_height // 2, kernel_width // 2
+    padded_image = np.pad(image_array, ((pad_height, pad_height), (pad_width, pad_width), (0, 0)),
+                          mode='reflect')
+    low, high = fixed_point_convolution_bounds(kernel)
+    sum_dtype = np.int16 if max(-low, high) <= np.iinfo(np.int16).max else np.int32
+    height, width = image_array.shape[0], image_array.shape[1]
+    new_image_array = np.zeros(image_array.shape, dtype=sum_dtype)
+    weighted_slice = np.empty(image_array.shape, dtype=sum_dtype)
+    for (i, j), weight in np.ndenumerate(kernel.astype(sum_dtype)):
+        if weight != 0:
+            np.multiply(padded_image[i:i + height, j:j + width], weight, out=weighted_slice)
+            new_image_array += weighted_slice
+    return new_image_array
+
+
+def fixed_point_convolution_bounds(kernel: np.ndarray) -> Tuple[int, int]:
+    """
+    Computes the bounds of the convolution of a uint8 image with an integer kernel.
+    :param kernel: Kernel of the convolution, holding integers.
+    :return: A tuple of the minimal and maximal convolution value.
+    """
+    kernel = np.asarray(kernel, dtype=np.int64)
+    return (int(kernel[kernel < 0].sum()) * constants.MAX_INTENSITY,
+            int(kernel[kernel > 0].sum()) * constants.MAX_INTENSITY)
+
+
+def fits_fixed_point_color_transform(linear: np.ndarray, offset: np.ndarray) -> bool:
+    """
+    Checks if an affine color transform can be computed in fixed point without overflowing int32.
+    :param linear: 3x3 matrix mapping the RGB values of a pixel to its new RGB values, before the offset.
+    :param offset: Offset added to every new RGB value.
+    :return: True if every scaled sum fits in int32, False otherwise.
+    """
+    max_value = np.abs(linear).sum(axis=1) * constants.MAX_INTENSITY + np.abs(offset)
+    return bool(np.all(max_value * (1 << constants.FIXED_POINT_FRACTION_BITS) < np.iinfo(np.int32).max))
+
+
+def apply_fixed_point_color_transform(image_array: np.ndarray, linear: np.ndarray, offset: np.ndarray,
+                                      chunk_pixels: int = constants.COLOR_MATRIX_CHUNK_PIXELS) -> np.ndarray:
+    """
+    Applies an affine color transform on a uint8 RGB image in fixed point, with the coefficients rounded to
+    FIXED_POINT_FRACTION_BITS fraction bits and int32 sums. Every value is floored and saturated to the valid range,
+    like the float transform truncated to uint8, and differs from it by at most 1 level due to the rounded coefficients.
+    The transform should fit in fixed point, as checked by fits_fixed_point_color_transform.
+    :param image_array: RGB image to transform, in uint8 numpy array form. Changed in place.
+    :param linear: 3x3 matrix mapping the RGB values of a pixel to its new RGB values, before the offset.
+    :param offset: Offset added to every new RGB value.
+    :param chunk_pixels: Maximal number of pixels transformed at once, bounding the memory of the int32 temporaries.
+    :return: The image array.
+    """
+    fraction_bits = constants.FIXED_POINT_FRACTION_BITS
+    coefficients = np.round(np.asarray(linear) * (1 << fraction_bits)).astype(np.int32)
+    offsets = np.round(np.asarray(offset) * (1 << fraction_bits)).astype(np.int32)
+    height, width = image_array.shape[0], image_array.shape[1]
+    chunk_rows = max(1, chunk_pixels // width)
+    transformed_chunk = np.empty((min(chunk_rows, height), width, 3), dtype=np.int32)
+    for start_row in range(0, height, chunk_rows):
+        chunk = image_array[start_row:start_row + chunk_rows]
+        channels = [chunk[:, :, channel].astype(np.int32) for channel in range(3)]
+        transformed = transformed_chunk[:chunk.shape[0]]
+        for channel in range(3):
+            output_channel = transformed[:, :, channel]
+            np.multiply(channels[0], coefficients[channel, 0], out=output_channel)
+            output_channel += channels[1] * coefficients[channel, 1]
+            output_channel += channels[2] * coefficients[channel, 2]
+            output_channel += offsets[channel]
+        # The arithmetic shift floors the values, including the negative ones
+        np.right_shift(transformed, fraction_bits, out=transformed)
+        chunk[...] = np.clip(transformed, constants.MIN_INTENSITY, constants.MAX_INTENSITY, out=transformed)
+    return image_array
+
+
+def _running_sum(array: np.ndarray, window: int, axis: int, dtype=np.float64) -> np.ndarray:
+    """
+    Computes the sums of all windows of a given length along an axis, using a cumulative sum.
+    :param array: Array to sum.
+    :param window: Length of the summed windows.
+    :param axis: Axis to sum along.
+    :param dtype: Type of the sums.
+    :return: Array of window sums, whose length along the axis is shorter than the input by window - 1.
+    """
+    # Summing along the axis in place, since a cumulative sum of an axis moved to the front is several times slower
+    cumulative_sum = np.cumsum(array, axis=axis, dtype=dtype)
+    leading_axes = (slice(None),) * axis
+    # The sum of every window except the first is the difference of two cumulative sums
+    window_sums = cumulative_sum[leading_axes + (slice(window - 1, None),)].copy()
+    window_sums[leading_axes + (slice(1, None),)] -= cumulative_sum[leading_axes + (slice(None, -window),)]
+    return window_sums
+
+
+def _running_row_sum(array: np.ndarray, window: int, dtype) -> np.ndarray:
+    """
+    Computes the sums of all windows of a given number of rows, by sliding the window one row at a time. Every step
+    adds and subtracts whole rows, which is much faster than a cumulative sum along the rows.
+    :param array: Array to sum.
+    :param window: Number of rows of the summed windows.
+    :param dtype: Integer type of the sums, so that sliding the window doesn't accumulate rounding errors.
+    :return: Array of window sums, with window - 1 fewer rows than the input.
+    """
+    window_sums = np.empty((array.shape[0] - window + 1,) + array.shape[1:], dtype=dtype)
+    np.sum(array[:window], axis=0, dtype=dtype, out=window_sums[0])
+    for row in range(1, window_sums.shape[0]):
+        np.add(window_sums[row - 1], array[row + window - 1], out=window_sums[row])
+        window_sums[row] -= array[row - 1]
+    return window_sums
+
+
+def _is_fft_convolution_faster(kernel_shape: tuple, padded_image_shape: tuple) -> bool:
+    """
+    Estimates whether the FFT convolution is faster than the shifted slices convolution. The shifted slices cost grows
+    with the kernel area, while the FFT cost grows with the logarithm of the image area.
+    :param kernel_shape: Shape of the convolution kernel.
+    :param padded_image_shape: Shape of the padded image array.
+    :return: True if the FFT convolution should be used, False otherwise.
+    """
+    kernel_area = kernel_shape[0] * kernel_shape[1]
+    padded_image_area = padded_image_shape[0] * padded_image_shape[1]
+    return kernel_area > constants.FFT_CONVOLUTION_COST_FACTOR * np.log2(padded_image_area)
+
+
+def _padded_convolution(padded_image: np.ndarray, kernel: np.ndarray, output_shape: tuple) -> np.ndarray:
+    """
+    Computes a convolution of a padded image in a single pass, using the FFT for large kernels.
+    :param padded_image: Image padded by half the kernel size on each side, in numpy array form.
+    :param kernel: Kernel of the convolution.
+    :param output_shape: Shape of the output image array.
+    :return: The convolved image array, in float64.
+    """
+    if _is_fft_convolution_faster(kernel.shape, padded_image.shape):
+        return _fft_convolution(padded_image, kernel, output_shape)
+    return _shifted_convolution(padded_image, kernel, output_shape)
+
+
+def _separable_convolution(padded_image: np.ndarray, separable_kernels: List[Tuple[np.ndarray, np.ndarray]],
+                           output_shape: tuple) -> np.ndarray:
+    """
+    Computes a convolution with a sum of separable kernels, by convolving the padded image with the column of every
+    separable kernel and then with its row.
+    :param padded_image: Image padded by half the kernel size on each side, in numpy array form.
+    :param separable_kernels: List of tuples of the column and row of every separable kernel.
+    :param output_shape: Shape of the output image array.
+    :return: The convolved image array, in float64.
+    """
+    # The column pass keeps the padded columns, which the row pass consumes
+    column_pass_shape = (output_shape[0], padded_image.shape[1], output_shape[2])
+    new_image_array = np.zeros(output_shape, dtype=np.float64)
+    for column, row in separable_kernels:
+        column_pass = _padded_convolution(padded_image, column[:, np.newaxis], column_pass_shape)
+        new_image_array += _padded_convolution(column_pass, row[np.newaxis, :], output_shape)
+    return new_image_array
+
+
+def _shifted_convolution(padded_image: np.ndarray, kernel: np.ndarray, output_shape: tuple) -> np.ndarray:
+    """
+    Computes a convolution by accumulating a weighted, shifted slice of the padded image for every kernel entry.
+    :param padded_image: Image padded by half the kernel size on each side, in numpy array form.
+    :param kernel: Kernel of the convolution.
+    :param output_shape: Shape of the output image array.
+    :return: The convolved image array, in float64.
+    """
+    height, width = output_shape[0], output_shape[1]
+    new_image_array = np.zeros(output_shape, dtype=np.float64)
+    weighted_slice = np.empty(output_shape, dtype=np.float64)
+    for (i, j), weight in np.ndenumerate(kernel):
+        # Zero weights don't contribute to the sum
+        if weight != 0:
+            np.multiply(padded_image[i:i + height, j:j + width], weight, out=weighted_slice)
+            new_image_array += weighted_slice
+    return new_image_array
+
+
+def _fft_convolution(padded_image: np.ndarray, kernel: np.ndarray, output_shape: tuple) -> np.ndarray:
+    """
+    Computes a convolution by multiplying the padded image and the kernel in the frequency domain.
+    :param padded_image: Image padded by half the kernel size on each side, in numpy array form.
+    :param kernel: Kernel of the convolution.
+    :param output_shape: Shape of the output image array.
+    :return: The convolved image array, in float64.
+    """
+    kernel_height, kernel_width = kernel.shape
+    # Zero padding beyond the padded image size doesn't change the valid part of the result
+    fft_shape = (_next_fast_fft_length(padded_image.shape[0]), _next_fast_fft_length(padded_image.shape[1]))
+    # Flipping the kernel, since the kernel is applied without flipping on the image (correlation)
+    kernel_fft = np.fft.rfft2(kernel[::-1, ::-1], s=fft_shape)
+    image_fft = np.fft.rfft2(padded_image, s=fft_shape, axes=(0, 1))
+    full_convolution = np.fft.irfft2(image_fft * kernel_fft[:, :, np.newaxis], s=fft_shape, axes=(0, 1))
+    # The circular convolution is exact starting at the last kernel row and column, where no wraparound occurs
+    return full_convolution[kernel_height - 1:kernel_height - 1 + output_shape[0],
+                            kernel_width - 1:kernel_width - 1 + output_shape[1]]
+
+
+def _next_fast_fft_length(length: int) -> int:
+    """
+    Finds the smallest length not smaller than the given one whose only prime factors are 2, 3 and 5, for which the FFT
+    is fast.
+    :param length: Minimal length.
+    :return: The fast FFT length.
+    """
+    fast_length = length
+    while True:
+        remainder = fast_length
+        for prime in (2, 3, 5):
+            while remainder % prime == 0:
+                remainder //= prime
+        if remainder == 1:
+            return fast_length
+        fast_length += 1
@@ -0,0 +1,251 @@
+import contextlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+import constants
+
+# The job queue only imports the standard library, so submitting jobs and reading the queue status skip importing
+# NumPy, PIL and the editor modules. Only the workers running the jobs import them.
+
+# States of a job: waiting to be claimed, claimed by a worker, or finished
+QUEUED_STATE = "queued"
+RUNNING_STATE = "running"
+DONE_STATE = "done"
+FAILED_STATE = "failed"
+# Outcome of an attempt whose worker lost the lease of the job
+LOST_OUTCOME = "lost"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    args TEXT NOT NULL,
+    cwd TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires_at REAL,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+CREATE TABLE IF NOT EXISTS attempts (
+    job_id INTEGER NOT NULL,
+    attempt INTEGER NOT NULL,
+    worker TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    outcome TEXT,
+    PRIMARY KEY (job_id, attempt)
+);
+"""
+
+
+@dataclass
+class Job:
+    """
+    Class representing a job claimed by a worker: the command line arguments of edit_image, the working directory the
+    paths in them are relative to, and the number of the attempt at running it.
+    """
+    id: int
+    args: List[str]
+    cwd: str
+    attempt: int
+
+
+class SqliteJobQueue:
+    """
+    Class of a job queue stored in a SQLite file, which workers on any machine sharing the file claim jobs from. A
+    claimed job is leased to its worker for a limited time, which the worker renews while running it, so the job of a
+    crashed worker is claimed again once its lease expires. Every change is a single transaction, so any number of
+    processes can use the queue at the same time.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = constants.JOB_LEASE_SECONDS,
+                 max_attempts: int = constants.MAX_JOB_ATTEMPTS):
+        """
+        :param path: Path of the queue file, created if missing. On shared storage, the storage must support file
+        locks.
+        :param lease_seconds: Seconds a claimed job stays leased to its worker without renewal.
+        :param max_attempts: Number of times a job is claimed before it is failed, in case its workers keep getting
+        lost.
+        """
+        self._path = path
+        self._lease_seconds = lease_seconds
+        self._max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with contextlib.closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+
+    @property
+    def lease_seconds(self) -> float:
+        """
+        Seconds a claimed job stays leased to its worker without renewal.
+        :return: The lease duration.
+        """
+        return self._lease_seconds
+
+    def submit(self, args: List[str], cwd: str) -> int:
+        """
+        Adds a job to the end of the queue.
+        :param args: Command line arguments of edit_image, including the program name.
+        :param cwd: Working directory the paths in the arguments are relative to.
+        :return: The id of the job.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute("INSERT INTO jobs (args, cwd, state, submitted_at) VALUES (?, ?, ?, ?)",
+                                        (json.dumps(args), cwd, QUEUED_STATE, time.time()))
+            return cursor.lastrowid
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        Claims the oldest job that is queued or whose lease expired, and leases it to a worker. A job whose lease
+        expired after its last attempt is failed instead.
+        :param worker: Name of the worker.
+        :return: The claimed job, or None in case no job can be claimed.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            expired = f"state = '{RUNNING_STATE}' AND lease_expires_at < ?"
+            connection.execute(f"UPDATE attempts SET outcome = ?, finished_at = ? WHERE outcome IS NULL AND job_id IN "
+                               f"(SELECT id FROM jobs WHERE {expired})", (LOST_OUTCOME, now, now))
+            lost_jobs = connection.execute(f"SELECT id, attempts FROM jobs WHERE {expired} AND attempts >= ?",
+                                           (now, self._max_attempts)).fetchall()
+            for job_id, attempts in lost_jobs:
+                connection.execute("UPDATE jobs SET state = ?, error = ?, finished_at = ?, lease_expires_at = NULL "
+                                   "WHERE id = ?",
+                                   (FAILED_STATE, constants.LOST_JOB_ERR_MSG.format(attempts=attempts), now, job_id))
+            row = connection.execute(f"SELECT id, args, cwd, attempts FROM jobs WHERE state = ? OR ({expired}) "
+                                     f"ORDER BY id LIMIT 1", (QUEUED_STATE, now)).fetchone()
+            if row is None:
+                return None
+            job = Job(id=row[0], args=json.loads(row[1]), cwd=row[2], attempt=row[3] + 1)
+            connection.execute("UPDATE jobs SET state = ?, attempts = ?, worker = ?, lease_expires_at = ?, "
+                               "started_at = ? WHERE id = ?",
+                               (RUNNING_STATE, job.attempt, worker, now + self._lease_seconds, now, job.id))
+            connection.execute("INSERT INTO attempts (job_id, attempt, worker, started_at) VALUES (?, ?, ?, ?)",
+                               (job.id, job.attempt, worker, now))
+        return job
+
+    def renew_leases(self, worker: str, job_ids: List[int]) -> None:
+        """
+        Renews the leases of jobs a worker is running. Jobs claimed by another worker since are left alone.
+        :param worker: Name of the worker.
+        :param job_ids: Ids of the jobs the worker is running.
+        :return: None.
+        """
+        if not job_ids:
+            return
+        with self._transaction() as connection:
+            connection.execute(f"UPDATE jobs SET lease_expires_at = ? WHERE state = ? AND worker = ? "
+                               f"AND id IN ({', '.join('?' * len(job_ids))})",
+                               (time.time() + self._lease_seconds, RUNNING_STATE, worker, *job_ids))
+
+    def finish(self, job: Job, error: Optional[str] = None) -> bool:
+        """
+        Records the end of an attempt at running a job, which finishes the job unless another worker claimed it since.
+        :param job: The claimed job.
+        :param error: Error of the failed job, None in case it is done.
+        :return: True if the job was finished, False in case another worker claimed it after the lease expired.
+        """
+        now = time.time()
+        state = DONE_STATE if error is None else FAILED_STATE
+        with self._transaction() as connection:
+            connection.execute("UPDATE attempts SET outcome = ?, finished_at = ? WHERE job_id = ? AND attempt = ? "
+                               "AND outcome IS NULL", (state, now, job.id, job.attempt))
+            cursor = connection.execute("UPDATE jobs SET state = ?, error = ?, finished_at = ?, "
+                                        "lease_expires_at = NULL WHERE id = ? AND attempts = ? AND state = ?",
+                                        (state, error, now, job.id, job.attempt, RUNNING_STATE))
+            return cursor.rowcount == 1
+
+    def has_pending_jobs(self) -> bool:
+        """
+        Checks if any job is queued or running.
+        :return: True if a job is queued or running, False otherwise.
+        """
+        with contextlib.closing(self._connect()) as connection:
+            return connection.execute("SELECT 1 FROM jobs WHERE state IN (?, ?) LIMIT 1",
+                                      (QUEUED_STATE, RUNNING_STATE)).fetchone() is not None
+
+    def statistics(self) -> dict:
+        """
+        Reads the queue counters.
+        :return: A dictionary of the number of queued, running, done and failed jobs, the number of jobs claimed more
+        than once, and the mean, median, 95th percentile and maximal time in seconds the most recently finished jobs
+        waited in the queue and ran, in their last attempt.
+        """
+        with contextlib.closing(self._connect()) as connection:
+            counts = dict(connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            retried_jobs = connection.execute("SELECT COUNT(*) FROM jobs WHERE attempts > 1").fetchone()[0]
+            timings = connection.execute("SELECT started_at - submitted_at, finished_at - started_at FROM jobs "
+                                         "WHERE state = ? ORDER BY finished_at DESC LIMIT ?",
+                                         (DONE_STATE, constants.JOB_STATISTICS_WINDOW)).fetchall()
+        statistics = {state: counts.get(state, 0) for state in [QUEUED_STATE, RUNNING_STATE, DONE_STATE, FAILED_STATE]}
+        statistics["retried"] = retried_jobs
+        for name, index in [("wait", 0), ("run", 1)]:
+            durations = sorted(timing[index] for timing in timings)
+            if not durations:
+                continue
+            statistics[f"{name}_mean_seconds"] = sum(durations) / len(durations)
+            statistics[f"{name}_p50_seconds"] = durations[len(durations) // 2]
+            statistics[f"{name}_p95_seconds"] = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            statistics[f"{name}_max_seconds"] = durations[-1]
+        return statistics
+
+    def job_record(self, job_id: int) -> dict:
+        """
+        Reads the record of a job, along with the timing of every attempt at running it.
+        :param job_id: The id of the job.
+        :return: A dictionary of the job fields, with the attempts as a list of dictionaries.
+        :raise: ValueError in case there is no such job.
+        """
+        with contextlib.closing(self._connect()) as connection:
+            connection.row_factory = sqlite3.Row
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise ValueError(constants.JOB_NOT_FOUND_ERR_MSG.format(job_id=job_id))
+            record = dict(row)
+            record["args"] = json.loads(record["args"])
+            record["attempts"] = [dict(attempt) for attempt in connection.execute(
+                "SELECT attempt, worker, started_at, finished_at, outcome FROM attempts WHERE job_id = ? "
+                "ORDER BY attempt", (job_id,))]
+        return record
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection to the queue file, which waits for other processes holding the file lock. The connection
+        doesn't begin transactions by itself.
+        :return: The connection.
+        """
+        return sqlite3.connect(self._path, timeout=constants.QUEUE_LOCK_TIMEOUT, isolation_level=None)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Runs statements in a single transaction, which takes the write lock of the queue file from its start, so two
+        workers never claim the same job. The transaction is rolled back in case of an error.
+        :return: Iterator of the connection to run the statements on.
+        """
+        with contextlib.closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+
+def default_queue_path() -> str:
+    """
+    Finds the path of the job queue file, given by the IMAGE_EDITOR_QUEUE environment variable or in the user cache
+    directory.
+    :return: The queue path.
+    """
+    return os.path.expanduser(os.environ.get(constants.QUEUE_PATH_ENV_VAR, constants.DEFAULT_QUEUE_PATH))
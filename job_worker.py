@@ -0,0 +1,131 @@
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from typing import List, Set
+import constants
+from daemon import run_edit_job
+from job_queue import Job, SqliteJobQueue
+
+
+class JobWorker:
+    """
+    Class of a worker claiming jobs from a job queue and running them, a few at a time. The leases of the running jobs
+    are renewed in the background, so a job is claimed by another worker only in case this worker is lost. Every job
+    writes its outputs to temporary files moved into place once they are all written, so a job run again after a lost
+    worker replaces the outputs whole rather than leaving them partially written.
+    """
+
+    def __init__(self, job_queue: SqliteJobQueue, jobs: int = constants.DEFAULT_WORKER_JOBS,
+                 poll_interval: float = constants.JOB_POLL_INTERVAL, exit_when_idle: bool = False):
+        """
+        :param job_queue: The queue to claim jobs from.
+        :param jobs: Maximal number of jobs run at the same time.
+        :param poll_interval: Seconds between claims when no job is left to claim.
+        :param exit_when_idle: Whether to exit once no job is queued or running, rather than wait for more jobs.
+        """
+        self._job_queue = job_queue
+        self._jobs = jobs
+        self._poll_interval = poll_interval
+        self._exit_when_idle = exit_when_idle
+        # The host name tells workers on different machines sharing the queue apart
+        self._name = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop_event = threading.Event()
+        # Ids of the jobs being run, the only ones whose leases are renewed
+        self._running_job_ids: Set[int] = set()
+        self._running_job_ids_lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        """
+        Name of the worker, recorded on the jobs it claims.
+        :return: The worker name.
+        """
+        return self._name
+
+    def run(self) -> None:
+        """
+        Claims and runs jobs until interrupted, or until no job is left in case of exit when idle.
+        :return: None.
+        """
+        job_threads: List[threading.Thread] = [threading.Thread(target=self._run_jobs, daemon=True)
+                                               for _ in range(self._jobs)]
+        heartbeat_thread = threading.Thread(target=self._renew_leases, daemon=True)
+        for thread in job_threads + [heartbeat_thread]:
+            thread.start()
+        try:
+            for thread in job_threads:
+                thread.join()
+        finally:
+            # Interrupted jobs are left running in the queue, and claimed again once their leases expire
+            self._stop_event.set()
+        heartbeat_thread.join()
+
+    def _run_jobs(self) -> None:
+        """
+        Claims and runs one job at a time, until the worker stops.
+        :return: None.
+        """
+        while not self._stop_event.is_set():
+            try:
+                job = self._job_queue.claim(self._name)
+                if job is None:
+                    if self._exit_when_idle and not self._job_queue.has_pending_jobs():
+                        return
+                    self._stop_event.wait(self._poll_interval)
+                    continue
+                self._run_job(job)
+            # A queue locked by other processes for too long is tried again, rather than ending the thread
+            except sqlite3.Error as e:
+                print(constants.QUEUE_ERROR_MSG.format(error=e), file=sys.stderr)
+                self._stop_event.wait(self._poll_interval)
+
+    def _run_job(self, job: Job) -> None:
+        """
+        Runs a claimed job and records its outcome in the queue. A failed job isn't retried, since running it again
+        would fail the same way. The lease of the job is renewed only while it runs, so in case its outcome can't be
+        recorded the lease expires and the job is claimed again.
+        :param job: The claimed job.
+        :return: None.
+        :raise: sqlite3.Error in case the outcome can't be recorded.
+        """
+        start_time = time.perf_counter()
+        with self._running_job_ids_lock:
+            self._running_job_ids.add(job.id)
+        try:
+            error = None
+            try:
+                run_edit_job(job.args, job.cwd, atomic_outputs=True)
+            # Any error fails the job, rather than ending the thread with the job left running
+            except Exception as e:
+                error = str(e)
+                if not isinstance(e, (IOError, ValueError)):
+                    # Unexpected errors are reported along with their type, since their message may be empty
+                    error = f"{type(e).__name__}: {error}" if error else type(e).__name__
+            seconds = time.perf_counter() - start_time
+            if not self._job_queue.finish(job, error):
+                print(constants.JOB_LEASE_LOST_MSG.format(job_id=job.id, seconds=seconds, attempt=job.attempt))
+            elif error is None:
+                print(constants.JOB_DONE_MSG.format(job_id=job.id, seconds=seconds, attempt=job.attempt))
+            else:
+                print(constants.JOB_FAILED_MSG.format(job_id=job.id, seconds=seconds, attempt=job.attempt,
+                                                      error=error))
+        finally:
+            with self._running_job_ids_lock:
+                self._running_job_ids.discard(job.id)
+
+    def _renew_leases(self) -> None:
+        """
+        Renews the leases of the running jobs a few times in every lease duration, until the worker stops.
+        :return: None.
+        """
+        while not self._stop_event.wait(self._job_queue.lease_seconds / 3):
+            with self._running_job_ids_lock:
+                job_ids = list(self._running_job_ids)
+            # A queue locked by other processes for too long is tried again on the next renewal
+            try:
+                self._job_queue.renew_leases(self._name, job_ids)
+            except sqlite3.Error as e:
+                print(constants.QUEUE_ERROR_MSG.format(error=e), file=sys.stderr)
@@ -0,0 +1,51 @@
+import dataclasses
+import math
+from typing import List, Tuple
+from enums import FilterType, OperationType
+import constants
+from image_operation import ImageOperation
+
+# Reading kernel files only imports the standard library, so the command line can validate kernel files without
+# importing NumPy and PIL
+
+
+def read_kernel_file(kernel_path: str) -> Tuple:
+    """
+    Reads a kernel file, holding a row of the kernel in every line, with the numbers separated by whitespace or commas.
+    Empty lines and text after a # are ignored.
+    :param kernel_path: Path of the kernel file.
+    :return: The kernel, a tuple of rows, each a tuple of floats.
+    :raise: IOError in case the file can't be read, ValueError in case it isn't a rectangular grid of finite numbers.
+    """
+    try:
+        with open(kernel_path) as kernel_file:
+            lines = kernel_file.readlines()
+    except IOError as e:
+        raise IOError(f"Unable to read kernel: {e}.")
+    rows = []
+    for line in lines:
+        values = line.split("#")[0].replace(",", " ").split()
+        if not values:
+            continue
+        try:
+            row = tuple(float(value) for value in values)
+        except ValueError:
+            raise ValueError(constants.INVALID_KERNEL_ERR_MSG)
+        if not all(math.isfinite(value) for value in row):
+            raise ValueError(constants.INVALID_KERNEL_ERR_MSG)
+        rows.append(row)
+    if not rows or any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError(constants.INVALID_KERNEL_ERR_MSG)
+    return tuple(rows)
+
+
+def load_operation_kernels(operations: List[ImageOperation]) -> List[ImageOperation]:
+    """
+    Reads the kernel files of the kernel filters that were given a file rather than a kernel.
+    :param operations: Operations to apply on the image.
+    :return: The operations, with the kernel of every kernel filter.
+    :raise: IOError in case a kernel file can't be read, ValueError in case it isn't a valid kernel.
+    """
+    return [dataclasses.replace(operation, kernel=read_kernel_file(operation.kernel_path))
+            if operation.type == OperationType.FILTER.value and operation.sub_type == FilterType.KERNEL.value
+            and operation.kernel is None else operation for operation in operations]
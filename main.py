@@ -1,6 +1,15 @@
+import os
 import sys
-from cli import parse_command_line_arguments
-from image_editor import ImageEditor
+import constants
+from cli import parse_batch_command_line_arguments, parse_command_line_arguments, parse_editor_options, \
+    parse_export_lut_command_line_arguments, parse_queue_status_command_line_arguments, \
+    parse_serve_command_line_arguments, parse_submit_command_line_arguments, parse_worker_command_line_arguments, \
+    read_pipeline_file, validate_batch_input, validate_frame_operations, validate_image_path, validate_operations, \
+    validate_watch_command
+from editor_options import EditorOptions
+
+# Modules importing NumPy and PIL are imported only by the commands running the editor, so that parsing and validating
+# the command line doesn't pay for importing them
 
 
 def edit_image() -> None:
@@ -9,11 +18,184 @@ def edit_image() -> None:
     image using the command line.
     :return: None
     """
-    arguments = sys.argv
+    arguments, options = parse_editor_options(sys.argv)
     image_path, operations = parse_command_line_arguments(arguments)
-    image_processor = ImageEditor(image_path, operations)
-    image_processor.apply_operations()
+    if options.watch_path is not None:
+        validate_watch_command(operations, options)
+        operations = read_pipeline_file(options.watch_path)
+    # The command line is checked before importing the editor, so a bad value is rejected quickly. A watched edit
+    # reports invalid operations and keeps watching the files, so it is checked only when validating.
+    if options.watch_path is None or options.validate_only:
+        validate_image_path(image_path)
+        validate_operations(operations)
+        if options.frames:
+            validate_frame_operations(operations)
+    if options.validate_only:
+        print(constants.VALID_COMMAND_MSG)
+        return
+
+    if options.watch_path is not None:
+        from watch_editor import WatchEditor
+        print(constants.WATCH_STARTED_MSG.format(image_path=image_path, pipeline_path=options.watch_path))
+        try:
+            WatchEditor(image_path, options.watch_path, options).watch()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if options.frames:
+        from frame_editor import FrameEditor
+        FrameEditor(image_path, operations, options.frame_workers, options).apply_operations()
+        return
+
+    from image_editor import run_image_editor
+    from result_cache import create_cache
+    run_image_editor(image_path, operations, preview_size=options.preview_size, max_memory=options.max_memory,
+                     threads=options.threads, profile_path=options.profile_path, cache=create_cache(options),
+                     precision=options.precision, color_lut_size=options.color_lut_size,
+                     fuse_color_matrices=options.fuse_color_matrices)
+
+
+def edit_batch() -> None:
+    """
+    Main function for running a batch. Allows the user to apply the same filters and adjustments to many images using
+    the command line. Exits with a non-zero status in case some of the images failed.
+    :return: None
+    """
+    arguments, options = parse_editor_options(sys.argv)
+    batch_input, batch_output, workers, operations = parse_batch_command_line_arguments(arguments)
+    validate_batch_input(batch_input)
+    validate_operations(operations)
+    if options.validate_only:
+        print(constants.VALID_COMMAND_MSG)
+        return
+
+    from batch_editor import BatchEditor
+    batch_processor = BatchEditor(batch_input, batch_output, operations, workers, options)
+    failures = batch_processor.apply_operations()
+    if failures:
+        sys.exit(1)
+
+
+def print_cache_statistics() -> None:
+    """
+    Prints the hits, misses and size of the cache of intermediate results.
+    :return: None
+    """
+    from result_cache import create_cache
+    statistics = create_cache(EditorOptions()).statistics()
+    lookups = statistics["hits"] + statistics["misses"]
+    hit_rate = statistics["hits"] / lookups if lookups else 0
+    print(f"Hits: {statistics['hits']}, misses: {statistics['misses']}, hit rate: {hit_rate:.1%}")
+    print(f"Entries: {statistics['entries']}, size: {statistics['size'] / (1 << 20):.1f}MB")
+
+
+def serve() -> None:
+    """
+    Runs the daemon, which keeps the editor loaded and edits images sent by client.py until interrupted.
+    :return: None
+    """
+    socket_path, jobs = parse_serve_command_line_arguments(sys.argv)
+    from client import default_socket_path
+    from daemon import EditorDaemon
+    socket_path = socket_path or default_socket_path()
+    print(f"Listening on {socket_path} with up to {jobs} concurrent jobs.")
+    try:
+        EditorDaemon(socket_path, jobs).serve()
+    except KeyboardInterrupt:
+        pass
+
+
+def export_color_lut() -> None:
+    """
+    Bakes operations into a 3D color lookup table and saves it as a .cube file, reporting the maximal error of the table
+    against applying the operations.
+    :return: None
+    """
+    cube_path, size, operations = parse_export_lut_command_line_arguments(sys.argv)
+    from operation_fusion import bake_color_lookup_table, measure_color_lookup_table_error, write_cube_file
+    from pipeline import apply_operation
+    from profiler import describe_operation
+    lookup_table = bake_color_lookup_table(operations, apply_operation, size)
+    max_error = measure_color_lookup_table_error(lookup_table, apply_operation)
+    description = ", ".join(describe_operation(operation) for operation in operations)
+    write_cube_file(lookup_table, cube_path, description,
+                    [f"Maximal error against applying the operations: {max_error} levels"])
+    print(constants.COLOR_LUT_EXPORTED_MSG.format(size=size, path=cube_path, max_error=max_error))
+
+
+def submit_job() -> None:
+    """
+    Adds a job editing an image to the job queue, for a worker to run.
+    :return: None
+    """
+    queue_path, job_args = parse_submit_command_line_arguments(sys.argv)
+    from job_queue import SqliteJobQueue, default_queue_path
+    job_id = SqliteJobQueue(queue_path or default_queue_path()).submit(job_args, os.getcwd())
+    print(constants.JOB_SUBMITTED_MSG.format(job_id=job_id))
+
+
+def run_worker() -> None:
+    """
+    Runs a worker, which claims jobs from the job queue and runs them until interrupted.
+    :return: None
+    """
+    queue_path, jobs, exit_when_idle = parse_worker_command_line_arguments(sys.argv)
+    from job_queue import SqliteJobQueue, default_queue_path
+    from job_worker import JobWorker
+    queue_path = queue_path or default_queue_path()
+    worker = JobWorker(SqliteJobQueue(queue_path), jobs, exit_when_idle=exit_when_idle)
+    print(f"Worker {worker.name} running up to {jobs} concurrent jobs from {queue_path}.")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+
+
+def print_queue_status() -> None:
+    """
+    Prints the counters of the job queue, or the record of a single job with the timing of its attempts.
+    :return: None
+    """
+    queue_path, job_id = parse_queue_status_command_line_arguments(sys.argv)
+    from job_queue import SqliteJobQueue, default_queue_path
+    job_queue = SqliteJobQueue(queue_path or default_queue_path())
+    if job_id is None:
+        for name, value in job_queue.statistics().items():
+            print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
+        return
+
+    record = job_queue.job_record(job_id)
+    attempts = record.pop("attempts")
+    for name, value in record.items():
+        print(f"{name}: {value}")
+    for attempt in attempts:
+        seconds = "" if attempt["finished_at"] is None else f" in {attempt['finished_at'] - attempt['started_at']:.2f}s"
+        print(f"attempt {attempt['attempt']}: {attempt['outcome'] or 'running'} on {attempt['worker']}{seconds}")
+
+
+def main() -> None:
+    """
+    Runs the command given in the command line.
+    :return: None
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == constants.BATCH_CMD:
+        edit_batch()
+    elif len(sys.argv) > 1 and sys.argv[1] == constants.CACHE_STATS_CMD:
+        print_cache_statistics()
+    elif len(sys.argv) > 1 and sys.argv[1] == constants.SERVE_CMD:
+        serve()
+    elif len(sys.argv) > 1 and sys.argv[1] == constants.EXPORT_LUT_CMD:
+        export_color_lut()
+    elif len(sys.argv) > 1 and sys.argv[1] == constants.SUBMIT_CMD:
+        submit_job()
+    elif len(sys.argv) > 1 and sys.argv[1] == constants.WORKER_CMD:
+        run_worker()
+    elif len(sys.argv) > 1 and sys.argv[1] == constants.QUEUE_STATUS_CMD:
+        print_queue_status()
+    else:
+        edit_image()
 
 
 if __name__ == '__main__':
-    edit_image()
+    main()
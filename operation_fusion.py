@@ -0,0 +1,622 @@
+import collections
+import json
+import math
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Tuple, Union
+from enums import AdjustmentType, FilterType, OperationType, ResizeType
+from image_filters import SEPIA_MATRIX
+from image_operation import ImageOperation
+from image_utils import *
+
+# Operations computing every channel of a pixel only from the same channel of that pixel
+POINT_ADJUSTMENTS = [AdjustmentType.BRIGHTNESS.value, AdjustmentType.CONTRAST.value,
+                     AdjustmentType.TEMPERATURE.value, AdjustmentType.EXPOSURE.value]
+POINT_FILTERS = [FilterType.INVERT.value]
+# Operations computing every pixel as an affine function of its RGB values, before clipping
+COLOR_MATRIX_ADJUSTMENTS = POINT_ADJUSTMENTS
+COLOR_MATRIX_FILTERS = [FilterType.INVERT.value, FilterType.SEPIA.value]
+# Color matrix operations mixing the channels of a pixel
+CROSS_CHANNEL_FILTERS = [FilterType.SEPIA.value]
+# Filters computing every pixel only from itself, so they don't depend on the image resolution
+PIXEL_FILTERS = [FilterType.INVERT.value, FilterType.SEPIA.value]
+# Operations mixing the channels of a pixel non-linearly, which neither lookup tables nor color matrices can fuse
+NONLINEAR_COLOR_ADJUSTMENTS = [AdjustmentType.SATURATION.value]
+
+# Baked color lookup tables by their size and the signature of their operations, least recently used first. Shared by
+# all the pipelines of the process, which may bake tables from several threads
+_baked_color_lookup_tables = collections.OrderedDict()
+_baked_color_lookup_tables_lock = threading.Lock()
+
+
+@dataclass
+class PointLookupTable:
+    """
+    Class representing consecutive per-channel point operations compiled into a single lookup table per channel.
+    """
+    operations: List[ImageOperation]
+    table: np.ndarray
+
+
+@dataclass
+class ColorMatrixRun:
+    """
+    Class representing consecutive affine color operations including a cross-channel one. They are composed into color
+    matrices once the intensity bounds of the image they apply on are known, so that no clipping is skipped.
+    """
+    operations: List[ImageOperation]
+    matrices: List[np.ndarray]
+
+
+@dataclass
+class ColorMatrix:
+    """
+    Class representing consecutive affine color operations composed into a single 3x4 affine color matrix, which none
+    of the operations clip before the last one.
+    """
+    operations: List[ImageOperation]
+    matrix: np.ndarray
+
+
+@dataclass
+class ColorLookupTable:
+    """
+    Class representing consecutive pixel operations baked into a 3D lookup table, by applying them on a grid of RGB
+    colors. Colors between the grid nodes are interpolated, so the table is exact only on the nodes.
+    """
+    operations: List[ImageOperation]
+    # Intensities of the grid nodes along every channel
+    nodes: np.ndarray
+    # The operations applied on every node, indexed by the red, green and blue nodes
+    table: np.ndarray
+
+
+def is_point_operation(operation) -> bool:
+    """
+    Checks if an operation is a per-channel point operation, i.e. maps every channel value independently.
+    :param operation: Operation to check.
+    :return: True if the operation is a per-channel point operation, False otherwise.
+    """
+    if not isinstance(operation, ImageOperation):
+        return False
+    if operation.type == OperationType.ADJUSTMENT.value:
+        return operation.sub_type in POINT_ADJUSTMENTS
+    if operation.type == OperationType.FILTER.value:
+        return operation.sub_type in POINT_FILTERS
+    return False
+
+
+def is_color_matrix_operation(operation) -> bool:
+    """
+    Checks if an operation is an affine color operation, i.e. can be written as a 3x4 color matrix before clipping.
+    :param operation: Operation to check.
+    :return: True if the operation is an affine color operation, False otherwise.
+    """
+    if not isinstance(operation, ImageOperation):
+        return False
+    if operation.type == OperationType.ADJUSTMENT.value:
+        return operation.sub_type in COLOR_MATRIX_ADJUSTMENTS
+    if operation.type == OperationType.FILTER.value:
+        return operation.sub_type in COLOR_MATRIX_FILTERS
+    return False
+
+
+def is_pixel_operation(operation) -> bool:
+    """
+    Checks if an operation computes every pixel only from itself, so it doesn't depend on the image resolution.
+    :param operation: Operation to check.
+    :return: True if the operation is a pixel operation, False otherwise.
+    """
+    if not isinstance(operation, ImageOperation):
+        return False
+    if operation.type == OperationType.ADJUSTMENT.value:
+        return True
+    if operation.type == OperationType.FILTER.value:
+        return operation.sub_type in PIXEL_FILTERS
+    return False
+
+
+def move_resizes_before_pixel_operations(operations: List[ImageOperation], width: int,
+                                         height: int) -> List[ImageOperation]:
+    """
+    Moves every resize reducing the number of pixels before the pixel operations directly preceding it, so they are
+    applied on the fewer pixels of the resized image. Resizes enlarging the image stay after them. Pixel operations
+    don't depend on the resolution, so the result stays close to resizing after them, up to the clipping and the
+    non-linearity of the operations.
+    :param operations: Operations to reorder, in order of input.
+    :param width: Width of the image the operations apply on.
+    :param height: Height of the image the operations apply on.
+    :return: The reordered operations.
+    """
+    planned_operations = []
+    for operation, is_reducing in zip(operations, find_reducing_resizes(operations, width, height)):
+        if not is_reducing:
+            planned_operations.append(operation)
+            continue
+        index = len(planned_operations)
+        while index > 0 and is_pixel_operation(planned_operations[index - 1]):
+            index -= 1
+        planned_operations.insert(index, operation)
+    return planned_operations
+
+
+def find_reducing_resizes(operations: List[ImageOperation], width: int, height: int) -> Tuple[bool, ...]:
+    """
+    Finds the resizes reducing the number of pixels of the image they apply on, by following the image size through
+    the operations.
+    :param operations: Operations to apply, in order of input.
+    :param width: Width of the image the operations apply on.
+    :param height: Height of the image the operations apply on.
+    :return: A tuple of whether every operation is a resize reducing the number of pixels, in order of the operations.
+    """
+    reducing_resizes = []
+    for operation in operations:
+        if operation.type != OperationType.RESIZE.value:
+            reducing_resizes.append(False)
+            continue
+        resized_width, resized_height = resize_size(operation, width, height)
+        reducing_resizes.append(resized_width * resized_height < width * height)
+        width, height = resized_width, resized_height
+    return tuple(reducing_resizes)
+
+
+def resize_size(resize_operation: ImageOperation, width: int, height: int) -> Tuple[int, int]:
+    """
+    Computes the size of an image after a resize or fit.
+    :param resize_operation: An ImageOperation representing the resize or fit, holding the width in x and the height
+    in y.
+    :param width: Width of the image.
+    :param height: Height of the image.
+    :return: A tuple of the width and height of the resized image.
+    """
+    if resize_operation.sub_type == ResizeType.FIT.value:
+        return fit_size(width, height, resize_operation.x, resize_operation.y)
+    return resize_operation.x, resize_operation.y
+
+
+def count_fused_operations(operation) -> int:
+    """
+    Counts the input operations a possibly fused operation stands for.
+    :param operation: An ImageOperation, or a fused operation.
+    :return: Number of input operations.
+    """
+    if isinstance(operation, (PointLookupTable, ColorMatrixRun, ColorMatrix, ColorLookupTable)):
+        return len(operation.operations)
+    return 1
+
+
+def fuse_point_operations(operations: List[ImageOperation],
+                          apply_operation: Callable[[np.ndarray, ImageOperation], np.ndarray]) -> List:
+    """
+    Groups every run of consecutive per-channel point operations into a single lookup table.
+    :param operations: Operations to fuse, in order of input.
+    :param apply_operation: Function applying a single operation on an image array and returning the image array.
+    :return: List of the operations, where every run of point operations is replaced by a PointLookupTable.
+    :raise: ValueError in case one of the point operations got an invalid value.
+    """
+    fused_operations = []
+    point_operations = []
+    for operation in operations:
+        if is_point_operation(operation):
+            point_operations.append(operation)
+            continue
+        if point_operations:
+            fused_operations.append(build_point_lookup_table(point_operations, apply_operation))
+            point_operations = []
+        fused_operations.append(operation)
+
+    if point_operations:
+        fused_operations.append(build_point_lookup_table(point_operations, apply_operation))
+    return fused_operations
+
+
+def build_point_lookup_table(operations: List[ImageOperation],
+                             apply_operation: Callable[[np.ndarray, ImageOperation], np.ndarray]) -> PointLookupTable:
+    """
+    Compiles consecutive point operations into a lookup table, by applying them one at a time on an image holding every
+    possible intensity in every channel. The table is therefore bit-exact with applying the operations on any image.
+    :param operations: Point operations to compile, in order of input.
+    :param apply_operation: Function applying a single operation on an image array and returning the image array.
+    :return: The compiled PointLookupTable.
+    :raise: ValueError in case one of the operations got an invalid value.
+    """
+    intensities = np.arange(constants.MIN_INTENSITY, constants.MAX_INTENSITY + 1, dtype=np.uint8)
+    # A single row image, where the pixel in column i has intensity i in every channel
+    table_array = np.repeat(intensities[np.newaxis, :, np.newaxis], 3, axis=2)
+    for operation in operations:
+        table_array = apply_operation(table_array, operation)
+    # Table of shape (3, 256), holding the output intensities of every channel
+    table = table_array[0].T.copy()
+    return PointLookupTable(operations=list(operations), table=table)
+
+
+def apply_point_lookup_table(image_array: np.ndarray, lookup_table: PointLookupTable) -> np.ndarray:
+    """
+    Applies a compiled lookup table on an image in a single pass.
+    :param image_array: RGB image to apply the table on, in uint8 numpy array form. Changed in place.
+    :param lookup_table: Compiled PointLookupTable.
+    :return: The image array.
+    """
+    for channel in range(3):
+        np.take(lookup_table.table[channel], image_array[:, :, channel], out=image_array[:, :, channel])
+    return image_array
+
+
+def fuse_color_matrix_operations(operations: List) -> List:
+    """
+    Groups every run of consecutive affine color operations including a cross-channel one into a ColorMatrixRun. Runs of
+    only per-channel operations are left for the exact lookup table fusion.
+    :param operations: Operations to fuse, in order of input.
+    :return: List of the operations, where every such run is replaced by a ColorMatrixRun.
+    :raise: ValueError in case one of the fused operations got an invalid value.
+    """
+    fused_operations = []
+    run = []
+    for operation in operations + [None]:
+        if operation is not None and is_color_matrix_operation(operation):
+            run.append(operation)
+            continue
+        if len(run) > 1 and any(run_operation.sub_type in CROSS_CHANNEL_FILTERS for run_operation in run):
+            fused_operations.append(ColorMatrixRun(operations=run, matrices=[build_color_matrix(run_operation)
+                                                                             for run_operation in run]))
+        else:
+            fused_operations.extend(run)
+        run = []
+        if operation is not None:
+            fused_operations.append(operation)
+    return fused_operations
+
+
+def build_color_matrix(operation: ImageOperation) -> np.ndarray:
+    """
+    Builds the 3x4 affine color matrix of an operation, mapping the RGB values of a pixel followed by 1 to its RGB
+    values before clipping.
+    :param operation: Affine color operation.
+    :return: The color matrix.
+    :raise: ValueError in case the operation got an invalid value.
+    """
+    matrix = np.zeros((3, 4))
+    value = operation.value
+    if operation.sub_type == AdjustmentType.BRIGHTNESS.value:
+        _check_value(value, constants.MIN_BRIGHTNESS_VAL, constants.MAX_BRIGHTNESS_VAL,
+                     constants.INVALID_BRIGHTNESS_VAL_ERR_MSG)
+        matrix[:, :3] = np.eye(3)
+        matrix[:, 3] = value
+    elif operation.sub_type == AdjustmentType.CONTRAST.value:
+        _check_value(value, constants.MIN_CONTRAST_VAL, constants.MAX_CONTRAST_VAL,
+                     constants.INVALID_CONTRAST_VAL_ERR_MSG)
+        contrast_factor = (constants.CONTRAST_NORM_CONST * (value + constants.MAX_INTENSITY)) / (
+                constants.MAX_INTENSITY * (constants.CONTRAST_NORM_CONST - value))
+        matrix[:, :3] = contrast_factor * np.eye(3)
+        matrix[:, 3] = constants.CONTRAST_MID_VAL * (1 - contrast_factor)
+    elif operation.sub_type == AdjustmentType.TEMPERATURE.value:
+        _check_value(value, constants.MIN_TEMPERATURE_VAL, constants.MAX_TEMPERATURE_VAL,
+                     constants.INVALID_TEMPERATURE_VAL_ERR_MSG)
+        matrix[:, :3] = np.eye(3)
+        # Red values increase and blue values decrease, the green values stay the same
+        matrix[:, 3] = [(value / 100.0) * 50, 0, -(value / 100.0) * 50]
+    elif operation.sub_type == AdjustmentType.EXPOSURE.value:
+        _check_value(value, constants.MIN_EXPOSURE_VAL, constants.MAX_EXPOSURE_VAL,
+                     constants.INVALID_EXPOSURE_VAL_ERR_MSG)
+        matrix[:, :3] = (1 + value / float(constants.MAX_EXPOSURE_VAL)) * np.eye(3)
+    elif operation.sub_type == FilterType.INVERT.value:
+        matrix[:, :3] = -np.eye(3)
+        matrix[:, 3] = constants.MAX_INTENSITY
+    elif operation.sub_type == FilterType.SEPIA.value:
+        matrix[:, :3] = SEPIA_MATRIX
+    return matrix
+
+
+def compute_intensity_bounds(image_array: np.ndarray) -> Tuple[int, int]:
+    """
+    Computes the bounds of the intensities of an image, over all channels.
+    :param image_array: Image in uint8 numpy array form.
+    :return: A tuple of the minimal and maximal intensity.
+    """
+    # Reducing over the flat array is much faster than reducing every channel separately
+    return int(image_array.min()), int(image_array.max())
+
+
+def plan_color_matrix_run(run: ColorMatrixRun, intensity_bounds: Tuple[int, int]) -> List:
+    """
+    Splits a run of affine color operations into segments which don't clip before their last operation, by tracking
+    the range of every channel through the operations. A segment of several operations is composed into a ColorMatrix,
+    while a segment of a single operation is kept as is.
+    Composing skips the truncation to uint8 after every operation of a segment but the last, which the gains of the
+    following operations amplify. A segment therefore also ends before an operation whose composition could make the
+    result of the run more than COLOR_MATRIX_MAX_ERROR levels off applying the operations one by one.
+    :param run: ColorMatrixRun to plan.
+    :param intensity_bounds: Bounds of the intensities of the image the run is applied on.
+    :return: List of ColorMatrix and ImageOperation items, applying the run in order.
+    """
+    planned_operations = []
+    low, high = np.full(3, float(intensity_bounds[0])), np.full(3, float(intensity_bounds[1]))
+    # Maximal factor by which every operation scales a difference between two pixels
+    gains = [float(np.abs(matrix[:, :3]).sum(axis=1).max()) for matrix in run.matrices]
+    # Bound of the difference between the planned and the step by step values after the current operation
+    error = 0.0
+    segment_start = 0
+    for index, matrix in enumerate(run.matrices):
+        # Range of every output channel over the box of input values
+        linear = matrix[:, :3]
+        low, high = (np.minimum(linear * low, linear * high).sum(axis=1) + matrix[:, 3],
+                     np.maximum(linear * low, linear * high).sum(axis=1) + matrix[:, 3])
+        error = _propagate_color_matrix_error(error, gains[index], index > segment_start)
+        clips = np.any(low < constants.MIN_INTENSITY) or np.any(high > constants.MAX_INTENSITY)
+        if not clips and index < len(run.matrices) - 1 \
+                and _bound_color_matrix_error(error, gains[index + 1:]) <= constants.COLOR_MATRIX_MAX_ERROR:
+            continue
+        # The segment ends with an operation that clips, before an operation too sensitive to compose, or with the
+        # last operation, and the next segment starts from the clipped range
+        segment_operations = run.operations[segment_start:index + 1]
+        if len(segment_operations) == 1:
+            planned_operations.append(segment_operations[0])
+        else:
+            planned_operations.append(ColorMatrix(operations=segment_operations,
+                                                  matrix=compose_color_matrices(run.matrices[segment_start:index + 1])))
+        low = np.clip(low, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
+        high = np.clip(high, constants.MIN_INTENSITY, constants.MAX_INTENSITY)
+        segment_start = index + 1
+    return planned_operations
+
+
+def compose_color_matrices(matrices: List[np.ndarray]) -> np.ndarray:
+    """
+    Composes affine color matrices into a single one.
+    :param matrices: 3x4 color matrices, in order of application.
+    :return: The 3x4 color matrix applying all of them.
+    """
+    composed = np.eye(4)
+    for matrix in matrices:
+        composed = np.vstack([matrix, [0, 0, 0, 1]]) @ composed
+    return composed[:3]
+
+
+def apply_color_matrix(image_array: np.ndarray, color_matrix: ColorMatrix,
+                       chunk_pixels: int = constants.COLOR_MATRIX_CHUNK_PIXELS,
+                       fixed_point: bool = False) -> np.ndarray:
+    """
+    Applies a composed color matrix on an image in a single float32 pass, one chunk of rows at a time.
+    :param image_array: RGB image to apply the matrix on, in uint8 numpy array form. Changed in place.
+    :param color_matrix: Composed ColorMatrix.
+    :param chunk_pixels: Maximal number of pixels transformed at once, bounding the memory of the float32 temporaries.
+    :param fixed_point: Whether to apply the matrix in int32 fixed point, at most 1 level off the float pass. Matrices
+    whose sums don't fit in int32 are applied in float32 regardless.
+    :return: The image array.
+    """
+    if fixed_point and fits_fixed_point_color_transform(color_matrix.matrix[:, :3], color_matrix.matrix[:, 3]):
+        return apply_fixed_point_color_transform(image_array, color_matrix.matrix[:, :3], color_matrix.matrix[:, 3],
+                                                 chunk_pixels)
+    linear = color_matrix.matrix[:, :3].T.astype(np.float32)
+    offset = color_matrix.matrix[:, 3].astype(np.float32)
+    height, width = image_array.shape[0], image_array.shape[1]
+    chunk_rows = max(1, chunk_pixels // width)
+    for start_row in range(0, height, chunk_rows):
+        chunk = image_array[start_row:start_row + chunk_rows]
+        transformed_chunk = convert_image_to_array(chunk).dot(linear)
+        transformed_chunk += offset
+        chunk[...] = np.clip(transformed_chunk, constants.MIN_INTENSITY, constants.MAX_INTENSITY,
+                             out=transformed_chunk)
+    return image_array
+
+
+def fuse_color_lookup_operations(operations: List, apply_operation: Callable[[np.ndarray, ImageOperation], np.ndarray],
+                                 size: int = constants.DEFAULT_COLOR_LUT_SIZE) -> List:
+    """
+    Bakes every run of consecutive pixel operations including a non-linear cross-channel one, which the lookup table
+    and color matrix fusions can't fuse, into a ColorLookupTable.
+    :param operations: Operations to fuse, in order of input.
+    :param apply_operation: Function applying a single operation on an image array and returning the image array.
+    :param size: Number of grid nodes along every channel of the tables.
+    :return: List of the operations, where every such run is replaced by a ColorLookupTable.
+    :raise: ValueError in case one of the baked operations got an invalid value, or the size is invalid.
+    """
+    fused_operations = []
+    run = []
+    for operation in operations + [None]:
+        if operation is not None and is_pixel_operation(operation):
+            run.append(operation)
+            continue
+        if any(run_operation.sub_type in NONLINEAR_COLOR_ADJUSTMENTS for run_operation in run):
+            fused_operations.append(bake_color_lookup_table(run, apply_operation, size))
+        else:
+            fused_operations.extend(run)
+        run = []
+        if operation is not None:
+            fused_operations.append(operation)
+    return fused_operations
+
+
+def bake_color_lookup_table(operations: List[ImageOperation],
+                            apply_operation: Callable[[np.ndarray, ImageOperation], np.ndarray],
+                            size: int = constants.DEFAULT_COLOR_LUT_SIZE) -> ColorLookupTable:
+    """
+    Bakes consecutive pixel operations into a 3D lookup table, by applying them one at a time on an image holding every
+    node of a grid of size x size x size colors. The nodes are the intensities closest to evenly spaced ones. Tables
+    baked before by the process are reused.
+    :param operations: Pixel operations to bake, in order of input.
+    :param apply_operation: Function applying a single operation on an image array and returning the image array. It
+    should apply the operations in float precision, so the baked tables are shared by all the precisions.
+    :param size: Number of grid nodes along every channel, between 2 and 256. A size of 256 samples every color, so the
+    table is exact.
+    :return: The baked ColorLookupTable.
+    :raise: ValueError in case an operation isn't a pixel operation or got an invalid value, or the size is invalid.
+    """
+    if size < constants.MIN_COLOR_LUT_SIZE or size > constants.MAX_COLOR_LUT_SIZE:
+        raise ValueError(constants.INVALID_COLOR_LUT_ARGUMENT_ERR_MSG)
+    if not all(is_pixel_operation(operation) for operation in operations):
+        raise ValueError(constants.INVALID_COLOR_LUT_OPERATION_ERR_MSG)
+    key = (size, json.dumps([asdict(operation) for operation in operations], sort_keys=True))
+    with _baked_color_lookup_tables_lock:
+        lookup_table = _baked_color_lookup_tables.get(key)
+        if lookup_table is not None:
+            _baked_color_lookup_tables.move_to_end(key)
+            return lookup_table
+
+    nodes = np.round(np.linspace(constants.MIN_INTENSITY, constants.MAX_INTENSITY, size)).astype(np.uint8)
+    # An image of size * size rows of size pixels, where the row is the red and green node and the column the blue node
+    grid_array = np.stack(np.meshgrid(nodes, nodes, nodes, indexing="ij"), axis=-1).reshape(size * size, size, 3)
+    for operation in operations:
+        grid_array = apply_operation(grid_array, operation)
+    lookup_table = ColorLookupTable(operations=list(operations), nodes=nodes,
+                                    table=grid_array.reshape(size, size, size, 3))
+    with _baked_color_lookup_tables_lock:
+        _baked_color_lookup_tables[key] = lookup_table
+        while len(_baked_color_lookup_tables) > constants.COLOR_LUT_CACHE_ENTRIES:
+            _baked_color_lookup_tables.popitem(last=False)
+    return lookup_table
+
+
+def apply_color_lookup_table(image_array: np.ndarray, lookup_table: ColorLookupTable,
+                             chunk_pixels: int = constants.COLOR_LUT_CHUNK_PIXELS) -> np.ndarray:
+    """
+    Applies a baked 3D lookup table on an image, interpolating every pixel trilinearly between the 8 nodes of the grid
+    cell holding it, one chunk of rows at a time. A table sampling every color is looked up directly instead.
+    :param image_array: RGB image to apply the table on, in uint8 numpy array form. Changed in place.
+    :param lookup_table: Baked ColorLookupTable.
+    :param chunk_pixels: Maximal number of pixels interpolated at once, bounding the memory of the float32 temporaries.
+    :return: The image array.
+    """
+    height, width = image_array.shape[0], image_array.shape[1]
+    chunk_rows = max(1, chunk_pixels // width)
+    size = len(lookup_table.nodes)
+    if size == constants.MAX_INTENSITY + 1:
+        for start_row in range(0, height, chunk_rows):
+            chunk = image_array[start_row:start_row + chunk_rows]
+            chunk[...] = lookup_table.table[chunk[:, :, 0], chunk[:, :, 1], chunk[:, :, 2]]
+        return image_array
+
+    # Grid cell of every intensity along a channel, and the position of the intensity inside it between 0 and 1
+    intensities = np.arange(constants.MIN_INTENSITY, constants.MAX_INTENSITY + 1)
+    nodes = lookup_table.nodes.astype(np.int32)
+    cells = np.minimum(np.searchsorted(nodes, intensities, side="right") - 1, size - 2).astype(np.int32)
+    weights = ((intensities - nodes[cells]) / (nodes[cells + 1] - nodes[cells])).astype(np.float32)
+    # Offsets of the cell of every intensity of every channel in the flattened table
+    red_offsets, green_offsets = cells * (size * size), cells * size
+    # Padding every node to 4 values, which gathers much faster than 3 values
+    flat_table = np.zeros((size ** 3, 4), dtype=np.float32)
+    flat_table[:, :3] = lookup_table.table.reshape(-1, 3)
+    for start_row in range(0, height, chunk_rows):
+        chunk = image_array[start_row:start_row + chunk_rows]
+        red, green, blue = chunk[:, :, 0], chunk[:, :, 1], chunk[:, :, 2]
+        # Index of the node of the cell with the lowest red, green and blue in the flattened table
+        base = red_offsets[red] + green_offsets[green] + cells[blue]
+        blue_weight = weights[blue][:, :, np.newaxis]
+        # Interpolating along blue between the 4 pairs of nodes of the cell, then along green and then along red.
+        # Taking along an axis gathers faster than fancy indexing
+        blue_interpolated = [_interpolate(np.take(flat_table, base + offset, axis=0),
+                                          np.take(flat_table, base + offset + 1, axis=0), blue_weight)
+                             for offset in [0, size, size * size, size * size + size]]
+        green_weight = weights[green][:, :, np.newaxis]
+        low_red = _interpolate(blue_interpolated[0], blue_interpolated[1], green_weight)
+        high_red = _interpolate(blue_interpolated[2], blue_interpolated[3], green_weight)
+        interpolated = _interpolate(low_red, high_red, weights[red][:, :, np.newaxis])
+        # Rounding to the nearest intensity, the interpolated values are already between the node values
+        interpolated += 0.5
+        chunk[...] = interpolated[:, :, :3]
+    return image_array
+
+
+def measure_color_lookup_table_error(lookup_table: ColorLookupTable,
+                                     apply_operation: Callable[[np.ndarray, ImageOperation], np.ndarray]) -> int:
+    """
+    Measures the maximal error of a color lookup table against applying its operations one at a time, over all the
+    2 ** 24 RGB colors, a few red values at a time. Since pixel operations compute every pixel only from itself, this
+    bounds the error of the table on any image.
+    :param lookup_table: Baked ColorLookupTable.
+    :param apply_operation: Function applying a single operation on an image array and returning the image array.
+    :return: The maximal absolute difference in levels, over all colors and channels.
+    """
+    intensities = np.arange(constants.MIN_INTENSITY, constants.MAX_INTENSITY + 1, dtype=np.uint8)
+    max_error = 0
+    for start_red in range(0, len(intensities), constants.COLOR_LUT_ERROR_RED_VALUES):
+        red = intensities[start_red:start_red + constants.COLOR_LUT_ERROR_RED_VALUES]
+        # An image of a row for every red and green value, and a column for every blue value
+        colors = np.stack(np.meshgrid(red, intensities, intensities, indexing="ij"), axis=-1).reshape(-1, 256, 3)
+        exact_colors = colors.copy()
+        for operation in lookup_table.operations:
+            exact_colors = apply_operation(exact_colors, operation)
+        baked_colors = apply_color_lookup_table(colors, lookup_table)
+        max_error = max(max_error, int(np.abs(exact_colors.astype(np.int16) - baked_colors).max()))
+    return max_error
+
+
+def write_cube_file(lookup_table: ColorLookupTable, cube_path: str, title: str, comments: List[str] = ()) -> None:
+    """
+    Writes a color lookup table in the .cube format, read by most image and video editors. The format places the
+    nodes evenly over the intensities, so the table is exact in it only for sizes whose size - 1 divides 255, such as
+    18, 52 or 256, and elsewhere the nodes move by less than half a level.
+    :param lookup_table: Baked ColorLookupTable.
+    :param cube_path: Path of the .cube file.
+    :param title: Title of the table.
+    :param comments: Lines of comments to write before the table.
+    :return: None.
+    :raise: IOError in case the file can't be written.
+    """
+    size = len(lookup_table.nodes)
+    header = [f"# {comment}" for comment in comments] + [f'TITLE "{title}"', f"LUT_3D_SIZE {size}",
+                                                            "DOMAIN_MIN 0.0 0.0 0.0", "DOMAIN_MAX 1.0 1.0 1.0"]
+    # The red index changes fastest in the .cube format, and the values are between 0 and 1
+    values = lookup_table.table.transpose(2, 1, 0, 3).reshape(-1, 3) / float(constants.MAX_INTENSITY)
+    try:
+        with open(cube_path, "w") as cube_file:
+            cube_file.write("\n".join(header) + "\n")
+            np.savetxt(cube_file, values, fmt="%.6f")
+    except IOError as e:
+        raise IOError(f"Unable to save lookup table: {e}.")
+
+
+def _propagate_color_matrix_error(error: float, gain: float, is_composed: bool) -> float:
+    """
+    Propagates the bound of the difference between fused and step by step values through an affine color operation.
+    Before a composed operation the step by step values are truncated to uint8 while the fused ones aren't, adding
+    less than a level to the difference. Before an operation starting a segment both are truncated, which rounds the
+    difference up to whole levels.
+    :param error: Bound of the difference before the operation, in levels.
+    :param gain: Maximal factor by which the operation scales a difference between two pixels.
+    :param is_composed: Whether the operation is composed with the operation before it.
+    :return: Bound of the difference after the operation, before truncating it.
+    """
+    return gain * (error + 1 if is_composed else math.ceil(error))
+
+
+def _bound_color_matrix_error(error: float, following_gains: List[float]) -> int:
+    """
+    Bounds the difference between the fused and the step by step result of a run of affine color operations, in case
+    the next operation is composed with the current one and none of the following operations is.
+    :param error: Bound of the difference after the current operation, in levels.
+    :param following_gains: Gains of the operations following the current operation, in order.
+    :return: Bound of the difference between the results, in whole levels.
+    """
+    error = _propagate_color_matrix_error(error, following_gains[0], True)
+    for gain in following_gains[1:]:
+        error = _propagate_color_matrix_error(error, gain, False)
+    return math.ceil(error)
+
+
+def _interpolate(low: np.ndarray, high: np.ndarray, weight: np.ndarray) -> np.ndarray:
+    """
+    Helper function to interpolate linearly between two arrays, reusing the array of the high values.
+    :param low: Values at weight 0.
+    :param high: Values at weight 1. Overwritten.
+    :param weight: Weights between 0 and 1.
+    :return: The interpolated values.
+    """
+    high -= low
+    high *= weight
+    high += low
+    return high
+
+
+def _check_value(value: int, min_value: int, max_value: int, error_message: str) -> None:
+    """
+    Helper function to check the value of an adjustment.
+    :param value: Value to check.
+    :param min_value: Minimal valid value.
+    :param max_value: Maximal valid value.
+    :param error_message: Message of the error raised in case the value is invalid.
+    :return: None.
+    :raise: ValueError in case the value isn't in range [min_value, max_value].
+    """
+    if value > max_value or value < min_value:
+        raise ValueError(error_message)
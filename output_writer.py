@@ -0,0 +1,84 @@
+import queue
+import threading
+from typing import Callable, List, Optional
+import numpy as np
+import constants
+
+
+class OutputWriter:
+    """
+    Class writing output images on a background thread, so applying the operations continues while they are encoded.
+    Every output is written from a read-only snapshot of the image, so later operations changing the image in place
+    can't change it, unless the image is handed over since nothing changes it anymore. The outputs are written in order
+    of submission.
+    """
+
+    def __init__(self, write_image: Callable[[np.ndarray, str], None],
+                 max_pending_outputs: int = constants.MAX_PENDING_OUTPUTS):
+        """
+        :param write_image: Function writing an image array into an output path.
+        :param max_pending_outputs: Maximal number of snapshots waiting to be written, each holding a copy of the
+        image. Submitting an output waits while the queue is full.
+        """
+        self._write_image = write_image
+        self._pending_outputs = queue.Queue(maxsize=max_pending_outputs)
+        self._thread: Optional[threading.Thread] = None
+        self._errors: List[Exception] = []
+
+    def submit(self, image_array: np.ndarray, output_path: str, copy: bool = True) -> None:
+        """
+        Queues an image to be written, starting the writer thread on the first output.
+        :param image_array: Image to write, in numpy array form.
+        :param output_path: Path to write the image into.
+        :param copy: Whether to write a snapshot of the image, so it can be changed once this returns. Otherwise the
+        image is handed over, and must not be changed until it is written.
+        :return: None.
+        """
+        snapshot = image_array
+        if copy:
+            snapshot = image_array.copy()
+            snapshot.flags.writeable = False
+        if self._thread is None:
+            # The thread isn't a daemon thread, so the process doesn't exit before the pending outputs are written
+            self._thread = threading.Thread(target=self._write_pending_outputs, name="output-writer")
+            self._thread.start()
+        self._pending_outputs.put((snapshot, output_path))
+
+    def flush(self) -> None:
+        """
+        Waits until all the queued outputs are written, keeping the writer thread.
+        :return: None.
+        """
+        self._pending_outputs.join()
+
+    def close(self, raise_errors: bool = True) -> None:
+        """
+        Waits until all the queued outputs are written, and stops the writer thread.
+        :param raise_errors: Whether to raise the first error of writing an output.
+        :return: None.
+        :raise: The first error raised by writing an output, in case of raise_errors.
+        """
+        if self._thread is not None:
+            self._pending_outputs.put(None)
+            self._thread.join()
+            self._thread = None
+        errors, self._errors = self._errors, []
+        if errors and raise_errors:
+            raise errors[0]
+
+    def _write_pending_outputs(self) -> None:
+        """
+        Writes the queued outputs until closed. An output that fails to write doesn't stop the outputs after it.
+        :return: None.
+        """
+        while True:
+            pending_output = self._pending_outputs.get()
+            if pending_output is None:
+                self._pending_outputs.task_done()
+                return
+            try:
+                self._write_image(*pending_output)
+            except Exception as e:
+                self._errors.append(e)
+            finally:
+                self._pending_outputs.task_done()
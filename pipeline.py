@@ -0,0 +1,287 @@
+import functools
+from typing import Dict, List, Optional, Tuple, Union
+from cli import validate_operations
+from enums import AdjustmentType, FilterType, OperationType, Precision
+from image_adjustments import *
+from image_filters import *
+from image_operation import ImageOperation
+from image_utils import *
+from kernels import load_operation_kernels
+from operation_fusion import ColorLookupTable, ColorMatrix, ColorMatrixRun, PointLookupTable, \
+    apply_color_lookup_table, apply_color_matrix, apply_point_lookup_table, compute_intensity_bounds, \
+    find_reducing_resizes, fuse_color_lookup_operations, fuse_color_matrix_operations, fuse_point_operations, \
+    move_resizes_before_pixel_operations, plan_color_matrix_run, resize_size
+from tiled_execution import apply_operations_in_bands, compute_band_rows, validate_band_operations
+
+# Functions applying every adjustment, given the image array and the adjustment value
+ADJUSTMENTS = {
+    AdjustmentType.BRIGHTNESS.value: adjust_brightness,
+    AdjustmentType.CONTRAST.value: adjust_contrast,
+    AdjustmentType.SATURATION.value: adjust_saturation,
+    AdjustmentType.TEMPERATURE.value: adjust_temperature,
+    AdjustmentType.EXPOSURE.value: adjust_exposure
+}
+
+# Filters with a fixed-point version, selected by the fixed_point argument of their function
+FIXED_POINT_FILTERS = [FilterType.BLUR.value, FilterType.SHARPEN.value, FilterType.SEPIA.value]
+
+# Functions applying every filter, given the image array and the filter arguments
+FILTERS = {
+    FilterType.BLUR.value: apply_box_blur_filter,
+    FilterType.EDGE_DETECTION.value: apply_edge_detection_filter,
+    FilterType.SHARPEN.value: apply_sharpen_filter,
+    FilterType.INVERT.value: apply_invert_filter,
+    FilterType.SEPIA.value: apply_sepia_filter,
+    FilterType.KERNEL.value: apply_kernel_filter
+}
+
+
+class Pipeline:
+    """
+    Class compiling a list of operations once, to apply them on any number of images in memory. Compiling validates the
+    operations, reads the kernel files and decomposes the kernels of the kernel filters, so applying the pipeline
+    repeats none of it. The color operations are fused into lookup tables, and color matrices in case they are asked
+    for, on the first image whose resizes reduce or enlarge it the same way, since only resizes reducing an image are
+    moved before the pixel operations preceding them. Applying the pipeline keeps all its state in the call, so a
+    compiled pipeline can be applied from several threads at the same time.
+    """
+
+    def __init__(self, operations: List[ImageOperation], max_memory: Optional[int] = None, threads: int = 1,
+                 precision: str = Precision.AUTO.value, color_lut_size: Optional[int] = None,
+                 fuse_color_matrices: bool = False):
+        """
+        :param operations: Adjustments, filters and resizes to apply, in order of input.
+        :param max_memory: Memory budget in bytes of applying the pipeline on a single image. When given, the
+        adjustments and filters are applied band by band, with bands sized to fit the budget. The result is identical
+        to applying them on the whole image.
+        :param threads: Number of threads applying the adjustments and filters of a single image on bands of rows at
+        the same time. The result doesn't depend on it.
+        :param precision: Arithmetic to apply the operations with, a Precision value. The fixed precision is at most 1
+        level off the float precision, and the automatic one is identical to it.
+        :param color_lut_size: When given, every run of consecutive pixel operations including a saturation is baked
+        into a 3D lookup table with this number of grid nodes along every channel, approximating the operations. None
+        to apply them as they are.
+        :param fuse_color_matrices: Whether to compose every run of consecutive affine color operations including a
+        sepia into color matrices, at most COLOR_MATRIX_MAX_ERROR levels off applying the operations one by one.
+        :raise: ValueError in case an operation displays or outputs the image, or got an invalid value. IOError in case
+        a kernel file can't be read.
+        """
+        if any(operation.type not in [OperationType.ADJUSTMENT.value, OperationType.FILTER.value,
+                                      OperationType.RESIZE.value] for operation in operations):
+            raise ValueError(constants.INVALID_PIPELINE_OPERATION_ERR_MSG)
+        operations = load_operation_kernels(operations)
+        validate_operations(operations)
+        self._operations = operations
+        self._max_memory = max_memory
+        self._threads = threads
+        self._color_lut_size = color_lut_size
+        self._fuse_color_matrices = fuse_color_matrices
+
+        # Kernel of every kernel filter in array form, along with its decomposition into separable kernels
+        self._compiled_kernels = {}
+        for operation in self._operations:
+            if operation.sub_type == FilterType.KERNEL.value and operation.kernel not in self._compiled_kernels:
+                kernel = compile_kernel(operation.kernel)
+                self._compiled_kernels[operation.kernel] = (kernel, decompose_kernel(kernel))
+        self._apply_operation = functools.partial(apply_operation, compiled_kernels=self._compiled_kernels,
+                                                  precision=precision)
+
+        # Stages of the operations, by which resizes reduce the image. Whether a resize is moved before the pixel
+        # operations preceding it depends on the size of the image, so every image size may need its own stages
+        self._stages: Dict[Tuple[bool, ...], List] = {}
+        # Plans of the color matrix runs, by the run and the intensity bounds of the image. A plan or stages computed
+        # twice by concurrent calls are the same, so the dictionaries need no lock
+        self._planned_runs: Dict[Tuple[int, Tuple[int, int]], List] = {}
+
+    @property
+    def operations(self) -> List[ImageOperation]:
+        """
+        The operations of the pipeline, in order of input. Resizes reducing the image are applied before the pixel
+        operations directly preceding them.
+        :return: The operations, with the kernel of every kernel filter.
+        """
+        return list(self._operations)
+
+    def apply(self, image: Union[np.ndarray, Image.Image]) -> Union[np.ndarray, Image.Image]:
+        """
+        Applies the operations on an image, without changing it.
+        :param image: Image in uint8 numpy array form, or a PIL image of any mode, which is converted to RGB.
+        :return: The edited image, a uint8 numpy array or an RGB PIL image like the given image.
+        :raise: ValueError in case an array isn't a uint8 RGB array, or a kernel is bigger than the image.
+        """
+        if isinstance(image, np.ndarray):
+            validate_image_array(image)
+            return self.apply_array(image.copy())
+        return convert_array_to_image(self.apply_array(convert_image_to_uint8_array(convert_to_rgb(image))))
+
+    def apply_array(self, image_array: np.ndarray) -> np.ndarray:
+        """
+        Applies the operations on an image array in place.
+        :param image_array: Image in uint8 numpy array form. Changed in place.
+        :return: The edited image array, which is image_array itself unless the image is resized.
+        :raise: ValueError in case the array isn't a uint8 RGB array, or a kernel is bigger than the image.
+        """
+        validate_image_array(image_array)
+        for stage in self._compile_stages(image_array.shape[1], image_array.shape[0]):
+            if isinstance(stage, ImageOperation):
+                width, height = resize_size(stage, image_array.shape[1], image_array.shape[0])
+                image_array = resize_image_array(image_array, width, height)
+            else:
+                image_array = self._transform_array(image_array, stage)
+        return image_array
+
+    def _compile_stages(self, width: int, height: int) -> List:
+        """
+        Compiles the operations into stages for an image of a given size, reusing the stages of earlier images whose
+        resizes reduce them the same way.
+        :param width: Width of the image.
+        :param height: Height of the image.
+        :return: List of the stages, every stage either a resize or a list of fused adjustments and filters.
+        """
+        key = find_reducing_resizes(self._operations, width, height)
+        stages = self._stages.get(key)
+        if stages is not None:
+            return stages
+        stages = []
+        transform_operations = []
+        for operation in move_resizes_before_pixel_operations(self._operations, width, height) + [None]:
+            if operation is not None and operation.type != OperationType.RESIZE.value:
+                transform_operations.append(operation)
+                continue
+            if transform_operations:
+                if self._color_lut_size is not None:
+                    transform_operations = fuse_color_lookup_operations(transform_operations, apply_operation,
+                                                                        self._color_lut_size)
+                if self._fuse_color_matrices:
+                    transform_operations = fuse_color_matrix_operations(transform_operations)
+                stages.append(fuse_point_operations(transform_operations, self._apply_operation))
+                transform_operations = []
+            if operation is not None:
+                stages.append(operation)
+        self._stages[key] = stages
+        return stages
+
+    def _transform_array(self, image_array: np.ndarray, operations: List) -> np.ndarray:
+        """
+        Applies consecutive adjustments, filters, lookup tables and color matrices on an image array, band by band in
+        case of a memory budget or multiple threads.
+        :param image_array: Image in uint8 numpy array form. Changed in place.
+        :param operations: Operations to apply, in order of input.
+        :return: The image array.
+        """
+        if not operations:
+            return image_array
+        # A color matrix run is planned against the intensity bounds of the whole image it applies on, so the result
+        # doesn't depend on the bands
+        run_index = next((index for index, operation in enumerate(operations)
+                          if isinstance(operation, ColorMatrixRun)), None)
+        if run_index is not None:
+            image_array = self._transform_array(image_array, operations[:run_index])
+            planned_operations = self._plan_color_matrix_run(operations[run_index],
+                                                             compute_intensity_bounds(image_array))
+            return self._transform_array(image_array, planned_operations + operations[run_index + 1:])
+
+        if self._max_memory is None and self._threads == 1:
+            for operation in operations:
+                image_array = self._apply_operation(image_array, operation)
+            return image_array
+
+        validate_band_operations(image_array.shape, operations)
+        band_rows = compute_band_rows(image_array.shape, operations, self._max_memory, self._threads)
+        apply_operations_in_bands(image_array, operations, self._apply_operation, band_rows, self._threads)
+        return image_array
+
+    def _plan_color_matrix_run(self, run: ColorMatrixRun, intensity_bounds: Tuple[int, int]) -> List:
+        """
+        Plans a color matrix run against the intensity bounds of an image, reusing the plan of earlier images with the
+        same bounds.
+        :param run: ColorMatrixRun of the pipeline.
+        :param intensity_bounds: Bounds of the intensities of the image the run is applied on.
+        :return: List of the planned operations, with the per-channel ones fused into lookup tables.
+        """
+        key = (id(run), intensity_bounds)
+        planned_operations = self._planned_runs.get(key)
+        if planned_operations is None:
+            planned_operations = fuse_point_operations(plan_color_matrix_run(run, intensity_bounds),
+                                                       self._apply_operation)
+            self._planned_runs[key] = planned_operations
+        return planned_operations
+
+
+def apply_operation(image_array: np.ndarray, operation, compiled_kernels: Optional[Dict] = None,
+                    precision: str = Precision.AUTO.value) -> np.ndarray:
+    """
+    Applies a single adjustment, filter, lookup table or color matrix on an image array.
+    :param image_array: Image to apply the operation on, in uint8 numpy array form. Changed in place.
+    :param operation: An ImageOperation representing the adjustment or filter, a PointLookupTable, a ColorMatrix or a
+    ColorLookupTable.
+    :param compiled_kernels: Kernel array and separable kernels of the kernel filters, by their kernel. None to convert
+    and decompose the kernels when applying them.
+    :param precision: Arithmetic to apply the operation with, a Precision value.
+    :return: The image array.
+    """
+    if isinstance(operation, PointLookupTable):
+        return apply_point_lookup_table(image_array, operation)
+    if isinstance(operation, ColorLookupTable):
+        return apply_color_lookup_table(image_array, operation)
+    if isinstance(operation, ColorMatrix):
+        return apply_color_matrix(image_array, operation, fixed_point=uses_fixed_point(operation, precision))
+    if operation.type == OperationType.ADJUSTMENT.value:
+        return ADJUSTMENTS[operation.sub_type](image_array, operation.value)
+    return _filter_image(image_array, operation, compiled_kernels, uses_fixed_point(operation, precision))
+
+
+def uses_fixed_point(operation, precision: str) -> bool:
+    """
+    Checks if an operation is applied in fixed point. The box blur, sharpen, sepia and color matrix operations have
+    fixed-point versions, on narrow integer buffers. The fixed precision uses all of them, while the automatic precision
+    uses only the ones identical to the float operations: the sharpen filter, and box blurs of kernel areas up to
+    EXACT_FIXED_POINT_BOX_AREA. The lookup tables are always applied on the uint8 image.
+    :param operation: An ImageOperation, or a fused operation.
+    :param precision: Arithmetic the operations are applied with, a Precision value.
+    :return: True if the operation is applied in fixed point, False otherwise.
+    """
+    if isinstance(operation, ColorMatrix):
+        return precision == Precision.FIXED.value
+    if not isinstance(operation, ImageOperation) or operation.type != OperationType.FILTER.value:
+        return False
+    if precision == Precision.FIXED.value:
+        return operation.sub_type in FIXED_POINT_FILTERS
+    if precision == Precision.AUTO.value:
+        if operation.sub_type == FilterType.BLUR.value:
+            return operation.x * operation.y <= constants.EXACT_FIXED_POINT_BOX_AREA
+        return operation.sub_type == FilterType.SHARPEN.value
+    return False
+
+
+def _filter_image(image_array: np.ndarray, filter_operation: ImageOperation, compiled_kernels: Optional[Dict] = None,
+                  fixed_point: bool = False) -> np.ndarray:
+    """
+    Filters the image.
+    :param image_array: Image to filter, in uint8 numpy array form. Filtered in place.
+    :param filter_operation: An ImageOperation representing the filter.
+    :param compiled_kernels: Kernel array and separable kernels of the kernel filters, by their kernel.
+    :param fixed_point: Whether to apply the fixed-point version of the filter.
+    :return: The filtered image array.
+    """
+    filter_type = filter_operation.sub_type
+
+    # filters with two parameters
+    if filter_type == FilterType.BLUR.value:
+        return FILTERS[filter_type](image_array, filter_operation.x, filter_operation.y, fixed_point)
+
+    # filters with one parameter
+    elif filter_type == FilterType.SHARPEN.value:
+        return FILTERS[filter_type](image_array, filter_operation.x, fixed_point)
+
+    elif filter_type == FilterType.KERNEL.value:
+        if compiled_kernels is not None and filter_operation.kernel in compiled_kernels:
+            return FILTERS[filter_type](image_array, *compiled_kernels[filter_operation.kernel])
+        return FILTERS[filter_type](image_array, filter_operation.kernel)
+
+    elif filter_type == FilterType.SEPIA.value:
+        return FILTERS[filter_type](image_array, fixed_point)
+
+    # Filters with no parameters
+    elif filter_type in [FilterType.EDGE_DETECTION.value, FilterType.INVERT.value]:
+        return FILTERS[filter_type](image_array)
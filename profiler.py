@@ -0,0 +1,172 @@
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from image_operation import ImageOperation
+from operation_fusion import ColorLookupTable, ColorMatrix, ColorMatrixRun, PointLookupTable
+
+# Memory tracing is global to the process, so it is shared by the profilers of images edited at the same time, for
+# example by the daemon, and stopped only once none of them traces anymore
+_tracing_lock = threading.Lock()
+_tracing_profilers = 0
+_started_tracing = False
+
+
+class Profiler:
+    """
+    Class recording the wall time, CPU time, allocated bytes and peak RSS of every step of editing an image. Memory is
+    traced from the creation of the profiler until it is closed. The allocated bytes of steps running at the same time
+    in other threads, for example while the daemon edits two profiled images, are approximate, since all the threads
+    share the memory tracing.
+    """
+
+    def __init__(self):
+        self._records = []
+        self._start_time = time.perf_counter()
+        self._is_tracing = True
+        _start_tracing()
+
+    @contextmanager
+    def step(self, name: str, category: str):
+        """
+        Context manager recording a single step.
+        :param name: Name of the step.
+        :param category: Category of the step, for example decode, operation or encode.
+        """
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start_wall_time
+            cpu_time = time.process_time() - start_cpu_time
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            self._records.append({
+                "name": name,
+                "category": category,
+                "start_seconds": start_wall_time - self._start_time,
+                "thread_id": threading.get_ident(),
+                "wall_seconds": wall_time,
+                "cpu_seconds": cpu_time,
+                # The peak may have been reset by a step running in another thread since this step started
+                "allocated_bytes": max(0, peak_memory - start_memory),
+                # On Linux the maximal resident set size is reported in kilobytes
+                "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            })
+
+    def write(self, path: str) -> None:
+        """
+        Writes the recorded steps as JSON into the given path, and in Chrome trace-event format into the same path
+        with a .trace.json extension, which can be opened in a trace viewer such as chrome://tracing or Perfetto.
+        :param path: Path of the JSON profile.
+        :return: None.
+        """
+        self.close()
+        with open(path, "w") as profile_file:
+            json.dump({"steps": self._records}, profile_file, indent=2)
+
+        trace_events = [{
+            "name": record["name"],
+            "cat": record["category"],
+            "ph": "X",
+            "ts": record["start_seconds"] * 1e6,
+            "dur": record["wall_seconds"] * 1e6,
+            "pid": os.getpid(),
+            "tid": record["thread_id"],
+            "args": {key: record[key] for key in ["cpu_seconds", "allocated_bytes", "peak_rss_bytes"]}
+        } for record in self._records]
+        with open(os.path.splitext(path)[0] + ".trace.json", "w") as trace_file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, trace_file)
+
+    def close(self) -> None:
+        """
+        Ends the memory tracing of the profiler. Closing it again does nothing.
+        :return: None.
+        """
+        if self._is_tracing:
+            self._is_tracing = False
+            _stop_tracing()
+
+
+class NullProfiler:
+    """
+    Class with the interface of Profiler that records nothing, used when profiling is off.
+    """
+    _null_step = nullcontext()
+
+    def step(self, name: str, category: str):
+        """
+        Returns a context manager that does nothing.
+        :param name: Ignored name of the step.
+        :param category: Ignored category of the step.
+        """
+        return self._null_step
+
+    def write(self, path: str) -> None:
+        """
+        Writes nothing.
+        :param path: Ignored path.
+        :return: None.
+        """
+
+    def close(self) -> None:
+        """
+        Does nothing.
+        :return: None.
+        """
+
+
+def _start_tracing() -> None:
+    """
+    Starts tracing memory allocations, unless another profiler already traces them or they were traced before any
+    profiler.
+    :return: None.
+    """
+    global _tracing_profilers, _started_tracing
+    with _tracing_lock:
+        if _tracing_profilers == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_profilers += 1
+
+
+def _stop_tracing() -> None:
+    """
+    Stops tracing memory allocations once no profiler traces them, in case a profiler started tracing them.
+    :return: None.
+    """
+    global _tracing_profilers, _started_tracing
+    with _tracing_lock:
+        _tracing_profilers -= 1
+        if _tracing_profilers == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def describe_operation(operation) -> str:
+    """
+    Describes an operation by its command line arguments, used as its step name.
+    :param operation: An ImageOperation, or a fused operation.
+    :return: Description of the operation.
+    """
+    if isinstance(operation, PointLookupTable):
+        return "lookup table: " + ", ".join(describe_operation(fused) for fused in operation.operations)
+    if isinstance(operation, ColorLookupTable):
+        size = len(operation.nodes)
+        return f"color lookup table {size}x{size}x{size}: " + ", ".join(describe_operation(fused)
+                                                                        for fused in operation.operations)
+    if isinstance(operation, (ColorMatrix, ColorMatrixRun)):
+        return "color matrix: " + ", ".join(describe_operation(fused) for fused in operation.operations)
+    if not isinstance(operation, ImageOperation):
+        return type(operation).__name__
+    arguments = [operation.type]
+    for argument in [operation.sub_type, operation.x, operation.y, operation.value, operation.output_path,
+                     operation.kernel_path]:
+        if argument is not None:
+            arguments.append(str(argument))
+    return " ".join(arguments)
@@ -0,0 +1,284 @@
+import collections
+import dataclasses
+import hashlib
+import json
+import os
+import uuid
+from typing import List, Optional
+import numpy as np
+import constants
+from editor_options import EditorOptions
+from enums import Precision
+from image_operation import ImageOperation
+
+
+class ResultCache:
+    """
+    Class of an on-disk cache of intermediate image arrays, keyed by the input image and the operations applied on it.
+    The least recently used entries are evicted when the cache exceeds its size cap.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        """
+        :param directory: Directory of the cache entries, created if missing.
+        :param max_size: Maximal total size of the cache entries in bytes.
+        """
+        self._directory = directory
+        self._max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def contains(self, key: str) -> bool:
+        """
+        Checks if an entry is cached.
+        :param key: Key of the entry.
+        :return: True if the entry is cached, False otherwise.
+        """
+        return os.path.exists(self._entry_path(key))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Loads a cached entry, and marks it as recently used.
+        :param key: Key of the entry.
+        :return: The cached image array, or None in case it isn't cached.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            image_array = np.load(entry_path)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        return image_array
+
+    def put(self, key: str, image_array: np.ndarray) -> None:
+        """
+        Caches an entry, evicting the least recently used entries in case the cache exceeds its size cap. Failing to
+        write the entry leaves the cache unchanged.
+        :param key: Key of the entry.
+        :param image_array: Image array to cache.
+        :return: None.
+        """
+        entry_path = self._entry_path(key)
+        # Writing to a temporary file first, so a concurrent run never reads a partially written entry. The name is
+        # unique, since concurrent jobs of the daemon share a process and may write the same entry
+        temporary_path = f"{entry_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temporary_path, "wb") as entry_file:
+                np.save(entry_file, image_array)
+            os.replace(temporary_path, entry_path)
+        except OSError:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            return
+        self._evict()
+
+    def record_lookup(self, hit: bool) -> None:
+        """
+        Counts a lookup of a cached pipeline prefix in the persistent cache statistics.
+        :param hit: True if a cached prefix was found, False otherwise.
+        :return: None.
+        """
+        statistics = self.statistics()
+        statistics["hits" if hit else "misses"] += 1
+        try:
+            with open(os.path.join(self._directory, constants.CACHE_STATISTICS_FILE_NAME), "w") as statistics_file:
+                json.dump({"hits": statistics["hits"], "misses": statistics["misses"]}, statistics_file)
+        except OSError:
+            pass
+
+    def statistics(self) -> dict:
+        """
+        Reads the cache statistics.
+        :return: A dictionary of the hits and misses counts, and the number and total size of the cache entries.
+        """
+        try:
+            with open(os.path.join(self._directory, constants.CACHE_STATISTICS_FILE_NAME)) as statistics_file:
+                statistics = json.load(statistics_file)
+        except (OSError, ValueError):
+            statistics = {"hits": 0, "misses": 0}
+        entries = self._entries()
+        statistics["entries"] = len(entries)
+        statistics["size"] = sum(entry_size for _, _, entry_size in entries)
+        return statistics
+
+    def _entries(self) -> List:
+        """
+        Lists the cache entries.
+        :return: A list of tuples of the path, last use time and size of every entry.
+        """
+        entries = []
+        for file_name in os.listdir(self._directory):
+            if not file_name.endswith(constants.CACHE_ENTRY_EXTENSION):
+                continue
+            entry_path = os.path.join(self._directory, file_name)
+            try:
+                entry_stat = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((entry_path, entry_stat.st_mtime, entry_stat.st_size))
+        return entries
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits its size cap.
+        :return: None.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total_size = sum(entry_size for _, _, entry_size in entries)
+        for entry_path, _, entry_size in entries:
+            if total_size <= self._max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            total_size -= entry_size
+
+    def _entry_path(self, key: str) -> str:
+        """
+        Builds the path of an entry.
+        :param key: Key of the entry.
+        :return: Path of the entry file.
+        """
+        return os.path.join(self._directory, key + constants.CACHE_ENTRY_EXTENSION)
+
+
+class MemoryResultCache:
+    """
+    Class of an in-memory cache of intermediate image arrays, with the same interface as ResultCache, for a process
+    rendering the same image again and again. The least recently used entries are evicted when the cache exceeds its
+    size cap.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        :param max_size: Maximal total size of the cache entries in bytes.
+        """
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    def contains(self, key: str) -> bool:
+        """
+        Checks if an entry is cached.
+        :param key: Key of the entry.
+        :return: True if the entry is cached, False otherwise.
+        """
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Returns a copy of a cached entry, and marks it as recently used.
+        :param key: Key of the entry.
+        :return: The cached image array, or None in case it isn't cached.
+        """
+        image_array = self._entries.get(key)
+        if image_array is None:
+            return None
+        self._entries.move_to_end(key)
+        # The editor changes the image it restores in place, which mustn't change the entry
+        return image_array.copy()
+
+    def put(self, key: str, image_array: np.ndarray) -> None:
+        """
+        Caches a copy of an entry, evicting the least recently used entries in case the cache exceeds its size cap. An
+        entry larger than the size cap isn't cached.
+        :param key: Key of the entry.
+        :param image_array: Image array to cache.
+        :return: None.
+        """
+        if image_array.nbytes > self._max_size:
+            return
+        if key in self._entries:
+            self._size -= self._entries.pop(key).nbytes
+        self._entries[key] = image_array.copy()
+        self._size += image_array.nbytes
+        while self._size > self._max_size:
+            _, evicted_array = self._entries.popitem(last=False)
+            self._size -= evicted_array.nbytes
+
+    def record_lookup(self, hit: bool) -> None:
+        """
+        Counts a lookup of a cached pipeline prefix.
+        :param hit: True if a cached prefix was found, False otherwise.
+        :return: None.
+        """
+        if hit:
+            self._hits += 1
+        else:
+            self._misses += 1
+
+    def statistics(self) -> dict:
+        """
+        Reads the cache statistics.
+        :return: A dictionary of the hits and misses counts, and the number and total size of the cache entries.
+        """
+        return {"hits": self._hits, "misses": self._misses, "entries": len(self._entries), "size": self._size}
+
+    def clear(self) -> None:
+        """
+        Removes all the cache entries, keeping the statistics.
+        :return: None.
+        """
+        self._entries.clear()
+        self._size = 0
+
+
+def create_cache(options: EditorOptions) -> Optional[ResultCache]:
+    """
+    Creates the cache of intermediate results, in the directory given by the IMAGE_EDITOR_CACHE_DIR environment
+    variable or in the user cache directory.
+    :param options: Editor options.
+    :return: The cache, or None in case caching is off.
+    """
+    if not options.use_cache:
+        return None
+    directory = os.environ.get(constants.CACHE_DIRECTORY_ENV_VAR, constants.DEFAULT_CACHE_DIRECTORY)
+    return ResultCache(os.path.expanduser(directory), options.cache_size)
+
+
+def hash_file(path: str) -> str:
+    """
+    Hashes the content of a file.
+    :param path: Path of the file.
+    :return: Hex digest of the file content.
+    """
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(1 << 20), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def prefix_keys(input_hash: str, operations: List[ImageOperation], is_transform,
+                precision: str = Precision.AUTO.value, color_lut_size: Optional[int] = None,
+                fuse_color_matrices: bool = False) -> List[str]:
+    """
+    Builds the cache key of the image after every prefix of the operations. Operations that don't change the image
+    don't change the key.
+    :param input_hash: Hash of the input image bytes.
+    :param operations: Operations applied on the image, in order of input.
+    :param is_transform: Function checking if an operation changes the image.
+    :param precision: Arithmetic the operations are applied with, a Precision value. The fixed precision results differ
+    slightly from the float ones, so they get keys of their own, while the automatic precision results are identical to
+    the float ones and share their keys.
+    :param color_lut_size: Size of the color lookup tables baking the operations, whose results approximate them, so
+    they get keys of their own. None in case the operations aren't baked.
+    :param fuse_color_matrices: Whether the affine color operations are fused into color matrices, whose results
+    approximate them, so they get keys of their own.
+    :return: A list whose i-th item is the key of the image after the first i operations.
+    """
+    prefix_hash = hashlib.sha256(input_hash.encode())
+    if precision == Precision.FIXED.value:
+        prefix_hash.update(precision.encode())
+    if color_lut_size is not None:
+        prefix_hash.update(f"color lookup table {color_lut_size}".encode())
+    if fuse_color_matrices:
+        prefix_hash.update(b"color matrices")
+    keys = [prefix_hash.hexdigest()]
+    for operation in operations:
+        if is_transform(operation):
+            prefix_hash.update(json.dumps(dataclasses.asdict(operation), sort_keys=True).encode())
+        keys.append(prefix_hash.hexdigest())
+    return keys
@@ -0,0 +1,109 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+import constants
+from cli import parse_command_line_arguments
+from enums import AdjustmentType, FilterType, OperationType, Precision
+from image_operation import ImageOperation
+from operation_fusion import ColorMatrix, ColorMatrixRun, build_color_matrix, plan_color_matrix_run
+from pipeline import Pipeline, apply_operation
+
+IMAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images", "input.jpg")
+
+
+def adjustment(adjustment_type, value):
+    return ImageOperation(OperationType.ADJUSTMENT.value, adjustment_type.value, value=value)
+
+
+def color_filter(filter_type):
+    return ImageOperation(OperationType.FILTER.value, filter_type.value)
+
+
+def apply_step_by_step(image_array, operations):
+    """
+    Applies operations one by one, truncating the image to uint8 after every one of them.
+    :param image_array: Image in uint8 numpy array form.
+    :param operations: Operations to apply.
+    :return: The result image.
+    """
+    image_array = image_array.copy()
+    for operation in operations:
+        image_array = apply_operation(image_array, operation, precision=Precision.FLOAT.value)
+    return image_array
+
+
+def fused_error(image_array, operations):
+    """
+    Measures how far the fused result of operations is off applying them one by one.
+    :param image_array: Image in uint8 numpy array form.
+    :param operations: Operations to apply.
+    :return: The maximal absolute difference in levels.
+    """
+    fused_array = Pipeline(operations, precision=Precision.FLOAT.value,
+                           fuse_color_matrices=True).apply_array(image_array.copy())
+    step_array = apply_step_by_step(image_array, operations)
+    return int(np.abs(fused_array.astype(np.int16) - step_array.astype(np.int16)).max())
+
+
+@pytest.mark.parametrize("contrast", [80, 150, 200, 240])
+def test_later_gain_doesnt_amplify_skipped_truncation(contrast):
+    # A dark image, so that the contrast doesn't clip and its gain applies on the skipped truncation of the sepia
+    image_array = np.random.default_rng(0).integers(0, 120, (64, 64, 3), dtype=np.uint8)
+    operations = [color_filter(FilterType.SEPIA), adjustment(AdjustmentType.CONTRAST, contrast)]
+    assert fused_error(image_array, operations) <= constants.COLOR_MATRIX_MAX_ERROR
+
+
+@pytest.mark.parametrize("operations", [
+    [color_filter(FilterType.SEPIA), adjustment(AdjustmentType.TEMPERATURE, 20),
+     adjustment(AdjustmentType.EXPOSURE, 30)],
+    [adjustment(AdjustmentType.BRIGHTNESS, -40), color_filter(FilterType.SEPIA),
+     adjustment(AdjustmentType.CONTRAST, 20)],
+    [color_filter(FilterType.SEPIA), adjustment(AdjustmentType.BRIGHTNESS, 10), color_filter(FilterType.INVERT),
+     adjustment(AdjustmentType.EXPOSURE, -20)],
+    [adjustment(AdjustmentType.EXPOSURE, -60), color_filter(FilterType.SEPIA), adjustment(AdjustmentType.EXPOSURE, 60),
+     adjustment(AdjustmentType.CONTRAST, 100)],
+])
+def test_fused_run_on_sample_image_is_within_bound(operations):
+    image_array = np.array(Image.open(IMAGE_PATH).convert("RGB"))
+    assert fused_error(image_array, operations) <= constants.COLOR_MATRIX_MAX_ERROR
+
+
+def test_random_runs_are_within_bound():
+    rng = np.random.default_rng(1)
+    operation_factories = [
+        lambda: color_filter(FilterType.SEPIA),
+        lambda: color_filter(FilterType.INVERT),
+        lambda: adjustment(AdjustmentType.BRIGHTNESS, int(rng.integers(-100, 100))),
+        lambda: adjustment(AdjustmentType.CONTRAST, int(rng.integers(-200, 250))),
+        lambda: adjustment(AdjustmentType.TEMPERATURE, int(rng.integers(-100, 100))),
+        lambda: adjustment(AdjustmentType.EXPOSURE, int(rng.integers(-100, 100))),
+    ]
+    for _ in range(300):
+        operations = [operation_factories[rng.integers(len(operation_factories))]()
+                      for _ in range(rng.integers(2, 6))]
+        low = int(rng.integers(0, 200))
+        image_array = rng.integers(low, rng.integers(low + 1, 256), (16, 16, 3), dtype=np.uint8)
+        assert fused_error(image_array, operations) <= constants.COLOR_MATRIX_MAX_ERROR, operations
+
+
+def test_insensitive_run_is_composed():
+    operations = [color_filter(FilterType.SEPIA), adjustment(AdjustmentType.BRIGHTNESS, 10),
+                  color_filter(FilterType.INVERT)]
+    run = ColorMatrixRun(operations=operations, matrices=[build_color_matrix(operation) for operation in operations])
+    planned_operations = plan_color_matrix_run(run, (0, 150))
+    assert len(planned_operations) == 1 and isinstance(planned_operations[0], ColorMatrix)
+
+
+@pytest.mark.parametrize("pipeline", [
+    "--filter sepia --filter invert --filter sharpen --x 2.07 --filter sharpen --x 1.6 --adjust exposure 61",
+    "--filter edge_detection --filter sepia --adjust exposure 29 --filter sharpen --x 1.97",
+    "--filter sepia --filter blur --x 5 --y 4 --filter sepia --filter sepia --filter sharpen --x 2.21",
+])
+def test_run_followed_by_sharpen_isnt_fused_by_default(pipeline):
+    # The sharpen scales the skipped truncation of a fused run beyond its bound, so only the option fuses the run. A
+    # low contrast image, so that the run doesn't clip and would be composed
+    _, operations = parse_command_line_arguments(["", constants.EDIT_CMD, constants.IMAGE_CMD, ""] + pipeline.split())
+    image_array = np.random.default_rng(0).integers(30, 90, (64, 64, 3), dtype=np.uint8)
+    default_array = Pipeline(operations, precision=Precision.FLOAT.value).apply_array(image_array.copy())
+    assert np.array_equal(default_array, apply_step_by_step(image_array, operations))
@@ -0,0 +1,48 @@
+import os
+import tracemalloc
+import pytest
+from enums import AdjustmentType, FilterType, OperationType
+from image_editor import ImageEditor
+from image_operation import ImageOperation
+
+IMAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images", "input.jpg")
+# Slack for the allocations holding no image data, such as the fused operations of a longer pipeline
+PEAK_TOLERANCE = 1.1
+
+OPERATIONS = [
+    ImageOperation(OperationType.FILTER.value, FilterType.BLUR.value, x=5, y=5),
+    ImageOperation(OperationType.FILTER.value, FilterType.SHARPEN.value, x=1.5),
+    ImageOperation(OperationType.FILTER.value, FilterType.EDGE_DETECTION.value),
+    ImageOperation(OperationType.ADJUSTMENT.value, AdjustmentType.SATURATION.value, value=30),
+    ImageOperation(OperationType.ADJUSTMENT.value, AdjustmentType.CONTRAST.value, value=20),
+]
+
+
+def measure_peak_allocation(operations):
+    """
+    Measures the peak of the memory allocated while applying operations, not counting the decoded image.
+    :param operations: Operations to apply on the sample image.
+    :return: The peak allocation in bytes.
+    """
+    tracemalloc.start()
+    try:
+        image_editor = ImageEditor(IMAGE_PATH, operations)
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        image_editor.apply_operations()
+        return tracemalloc.get_traced_memory()[1] - start_memory
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("operation", OPERATIONS, ids=lambda operation: operation.sub_type)
+def test_peak_allocation_does_not_grow_with_pipeline_length(operation):
+    single_peak = measure_peak_allocation([operation])
+    long_peak = measure_peak_allocation([operation] * 10)
+    assert long_peak <= single_peak * PEAK_TOLERANCE
+
+
+def test_mixed_pipeline_peak_is_bounded_by_its_largest_operation():
+    largest_peak = max(measure_peak_allocation([operation]) for operation in OPERATIONS)
+    long_peak = measure_peak_allocation(OPERATIONS * 2)
+    assert long_peak <= largest_peak * PEAK_TOLERANCE
@@ -0,0 +1,45 @@
+import glob
+import os
+import numpy as np
+import pytest
+from PIL import Image
+import constants
+from cli import parse_command_line_arguments
+from enums import Precision
+from image_utils import convert_image_to_uint8_array, convert_to_rgb
+from pipeline import Pipeline
+
+SAMPLE_IMAGE_PATHS = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                   "images", "*.jpg")))
+
+# Operations with a fixed-point version, and the documented maximal deviation in levels of their fixed-point result from
+# their float result. Box blurs are exact up to EXACT_FIXED_POINT_BOX_AREA
+FIXED_POINT_DEVIATION_CASES = {
+    "blur": ("--filter blur --x 9 --y 9", 0),
+    "blur_large_kernel": ("--filter blur --x 301 --y 301", 1),
+    "sharpen": ("--filter sharpen --x 1.5", 0),
+    "sepia": ("--filter sepia", 1),
+    "color_matrix": ("--adjust exposure -20 --filter sepia --adjust brightness 10", 1),
+}
+
+
+@pytest.fixture(scope="module")
+def sample_images():
+    return [convert_image_to_uint8_array(convert_to_rgb(Image.open(image_path))) for image_path in SAMPLE_IMAGE_PATHS]
+
+
+@pytest.mark.parametrize("name", FIXED_POINT_DEVIATION_CASES)
+def test_fixed_point_deviation_is_within_documented_bound(name, sample_images):
+    pipeline, max_deviation = FIXED_POINT_DEVIATION_CASES[name]
+    _, operations = parse_command_line_arguments(["", constants.EDIT_CMD, constants.IMAGE_CMD, ""] + pipeline.split())
+    pipelines = {precision: Pipeline(operations, precision=precision.value, fuse_color_matrices=True)
+                 for precision in Precision}
+    for image_array in sample_images:
+        results = {precision: precision_pipeline.apply(image_array).astype(np.int16)
+                   for precision, precision_pipeline in pipelines.items()}
+        assert np.abs(results[Precision.FIXED] - results[Precision.FLOAT]).max() <= max_deviation
+        assert np.array_equal(results[Precision.AUTO], results[Precision.FLOAT])
+
+
+def test_sample_images_are_found():
+    assert len(SAMPLE_IMAGE_PATHS) > 1
@@ -0,0 +1,133 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from enums import FilterType, OperationType
+from image_operation import ImageOperation
+from image_utils import *
+
+
+def operation_kernel_height(operation) -> int:
+    """
+    Finds the number of rows of the neighborhood an operation uses to compute every pixel.
+    :param operation: An ImageOperation, or a fused operation.
+    :return: Height of the operation kernel, 1 for operations computing every pixel only from itself.
+    """
+    if not isinstance(operation, ImageOperation) or operation.type != OperationType.FILTER.value:
+        return 1
+    # The blur kernel has x rows
+    if operation.sub_type == FilterType.BLUR.value:
+        return operation.x
+    if operation.sub_type == FilterType.KERNEL.value:
+        return len(operation.kernel)
+    # Sharpen and edge detection use 3x3 kernels
+    if operation.sub_type in [FilterType.SHARPEN.value, FilterType.EDGE_DETECTION.value]:
+        return 3
+    return 1
+
+
+def operation_halo(operation) -> int:
+    """
+    Finds the number of rows above and below a band that an operation needs to compute every row of the band exactly.
+    :param operation: An ImageOperation, or a fused operation.
+    :return: Number of halo rows, matching the reflect padding of the operation kernel.
+    """
+    return operation_kernel_height(operation) // 2
+
+
+def validate_band_operations(image_shape: Tuple, operations: List) -> None:
+    """
+    Checks the kernel sizes of the operations against the whole image, since every band is smaller than the image.
+    :param image_shape: Shape of the whole image array.
+    :param operations: Operations to apply in bands.
+    :return: None.
+    :raise: ValueError in case a kernel is bigger than the image.
+    """
+    if any(operation_kernel_height(operation) > image_shape[0] for operation in operations):
+        raise ValueError(constants.CONVOLUTION_KERNEL_SIZE_ERR_MSG)
+
+
+def compute_band_rows(image_shape: Tuple, operations: List, max_memory: Optional[int], threads: int = 1) -> int:
+    """
+    Computes the number of rows of every band, so that every thread gets a band and processing the bands fits in a
+    memory budget.
+    :param image_shape: Shape of the whole image array.
+    :param operations: Operations to apply in bands.
+    :param max_memory: Memory budget in bytes, including the uint8 working buffer of the whole image. None for no
+    budget.
+    :param threads: Number of bands processed at the same time.
+    :return: Number of rows of every band.
+    :raise: ValueError in case the memory budget is too small for the smallest possible band.
+    """
+    height, width = image_shape[0], image_shape[1]
+    min_band_rows = max(operation_kernel_height(operation) for operation in operations)
+    band_rows = math.ceil(height / threads)
+    if max_memory is not None:
+        halo = sum(operation_halo(operation) for operation in operations)
+        # The working buffer of the whole image is always kept in memory, and the rest is shared by the threads
+        band_memory = (max_memory - height * width * image_shape[2]) // threads
+        # Every band also holds its halo rows above and below it
+        band_rows = min(band_rows, band_memory // (constants.TILED_BYTES_PER_PIXEL * width) - 2 * halo)
+        if band_rows < min_band_rows:
+            raise ValueError(constants.MAX_MEMORY_TOO_SMALL_ERR_MSG)
+    return max(band_rows, min_band_rows)
+
+
+def split_into_bands(height: int, band_rows: int) -> List[Tuple[int, int]]:
+    """
+    Splits the image rows into bands.
+    :param height: Number of rows of the image.
+    :param band_rows: Number of rows of every band.
+    :return: A list of tuples of the first row and the row after the last of every band. A short last band is merged
+    into the band before it, so no band is shorter than band_rows.
+    """
+    starts = list(range(0, height, band_rows))
+    if len(starts) > 1 and height - starts[-1] < band_rows:
+        starts.pop()
+    return list(zip(starts, starts[1:] + [height]))
+
+
+def apply_operations_in_bands(image_array: np.ndarray, operations: List,
+                              apply_operation: Callable[[np.ndarray, object], np.ndarray], band_rows: int,
+                              threads: int = 1) -> None:
+    """
+    Applies operations on an image band by band, each band padded by halo rows of its neighbors so the band seams are
+    identical to applying the operations on the whole image. The image rows are changed in place.
+    :param image_array: Image in uint8 numpy array form. Changed in place.
+    :param operations: Operations to apply, in order of input.
+    :param apply_operation: Function applying a single operation on an image array and returning the image array.
+    :param band_rows: Number of rows of every band.
+    :param threads: Number of threads processing bands at the same time. The result doesn't depend on it.
+    :return: None.
+    """
+    height = image_array.shape[0]
+    halo = sum(operation_halo(operation) for operation in operations)
+    bands = split_into_bands(height, band_rows)
+    # Copying the rows around every seam before any band is written, since the halo of a band overlaps its neighbors
+    seam_rows = [image_array[max(start - halo, 0):min(start + halo, height)].copy() for start, _ in bands[1:]]
+
+    def apply_operations_on_band(band_index: int) -> None:
+        """
+        Applies the operations on a single band and writes its rows back to the image.
+        :param band_index: Index of the band.
+        :return: None.
+        """
+        start, end = bands[band_index]
+        halo_start, halo_end = max(start - halo, 0), min(end + halo, height)
+        band_parts = [image_array[start:end]]
+        if band_index > 0:
+            band_parts.insert(0, seam_rows[band_index - 1][:start - halo_start])
+        if band_index < len(bands) - 1:
+            seam_start = max(end - halo, 0)
+            band_parts.append(seam_rows[band_index][end - seam_start:halo_end - seam_start])
+        band_array = np.concatenate(band_parts)
+        for operation in operations:
+            band_array = apply_operation(band_array, operation)
+        image_array[start:end] = band_array[start - halo_start:start - halo_start + end - start]
+
+    if threads == 1:
+        for band_index in range(len(bands)):
+            apply_operations_on_band(band_index)
+        return
+    # Every band only writes its own rows, and reads the rows of its neighbors from the seam copies
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(apply_operations_on_band, range(len(bands))))
@@ -0,0 +1,121 @@
+import os
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+import constants
+from cli import read_pipeline_file, validate_operations
+from editor_options import EditorOptions
+from image_editor import ImageEditor
+from image_operation import ImageOperation
+from result_cache import MemoryResultCache
+
+
+class WatchEditor:
+    """
+    Class applying the operations of a pipeline file on an image, and applying them again whenever the image or the
+    pipeline file changes. The decoded image and the image after every operation are kept in memory as checkpoints, so
+    a change of the pipeline file applies only the operations from the first changed one onward.
+    """
+
+    def __init__(self, image_path: str, pipeline_path: str, options: Optional[EditorOptions] = None,
+                 poll_interval: float = constants.WATCH_POLL_INTERVAL):
+        """
+        :param image_path: Path of the image to edit.
+        :param pipeline_path: Path of the pipeline file, holding the operations in command line form.
+        :param options: Options of how the operations are applied, and of the memory of the checkpoints.
+        :param poll_interval: Seconds between checks of the image and pipeline files for changes.
+        """
+        self._image_path = image_path
+        self._pipeline_path = pipeline_path
+        self._options = options or EditorOptions()
+        self._poll_interval = poll_interval
+        # The least recently used checkpoints are evicted once they exceed the checkpoint memory
+        self._checkpoints = MemoryResultCache(self._options.checkpoint_memory)
+        # The decoded image and the operations of the pipeline file, None until they are read after a change
+        self._image_array: Optional[np.ndarray] = None
+        self._operations: Optional[List[ImageOperation]] = None
+        self._image_signature = None
+        self._pipeline_signature = None
+
+    def watch(self) -> None:
+        """
+        Applies the operations, and applies them again whenever the image or the pipeline file changes, until
+        interrupted. A failed render, for example of a pipeline file saved with a typo, is reported and the watching
+        goes on.
+        :return: None.
+        """
+        while True:
+            changed = False
+            image_signature = _file_signature(self._image_path)
+            if image_signature != self._image_signature:
+                self._image_signature = image_signature
+                self._image_array = None
+                changed = True
+            pipeline_signature = _file_signature(self._pipeline_path)
+            if pipeline_signature != self._pipeline_signature:
+                self._pipeline_signature = pipeline_signature
+                self._operations = None
+                changed = True
+            if changed:
+                try:
+                    self.render()
+                except (IOError, ValueError) as e:
+                    print(e)
+            time.sleep(self._poll_interval)
+
+    def render(self) -> int:
+        """
+        Applies the operations on the image, resuming from the checkpoint of the longest unchanged prefix of the
+        operations, and reports the latency. The image and the pipeline file are read again only after they changed.
+        :return: Number of operations applied, not counting the ones restored from the checkpoints.
+        :raise: IOError in case the image or the pipeline file can't be read or an output can't be saved, ValueError in
+        case the pipeline file holds invalid operations.
+        """
+        start_time = time.perf_counter()
+        if self._operations is None:
+            operations = read_pipeline_file(self._pipeline_path)
+            validate_operations(operations)
+            self._operations = operations
+        if self._image_array is None:
+            # The checkpoints of the previous image are never restored again
+            self._checkpoints.clear()
+            self._image_array = self._decode_image()
+
+        image_editor = ImageEditor(self._image_path, self._operations, max_memory=self._options.max_memory,
+                                   threads=self._options.threads, profile_path=self._options.profile_path,
+                                   cache=self._checkpoints, image_array=self._image_array.copy(),
+                                   precision=self._options.precision, color_lut_size=self._options.color_lut_size,
+                                   fuse_color_matrices=self._options.fuse_color_matrices)
+        image_editor.apply_operations()
+        applied_operations = len(self._operations) - image_editor.restored_operations
+        latency = (time.perf_counter() - start_time) * 1000
+        print(constants.WATCH_RENDER_MSG.format(latency=latency, applied=applied_operations,
+                                                total=len(self._operations)))
+        return applied_operations
+
+    def _decode_image(self) -> np.ndarray:
+        """
+        Decodes the full size image.
+        :return: The image in uint8 numpy array form.
+        :raise: IOError in case the image can't be opened.
+        """
+        image_array = ImageEditor(self._image_path, []).image_array
+        # A memory mapped raw image is read into memory, so rewriting the file doesn't change the decoded image. The
+        # decoded array is a view of the memory map rather than the memory map itself
+        base = image_array
+        while base is not None and not isinstance(base, np.memmap):
+            base = getattr(base, "base", None)
+        return np.array(image_array) if base is not None else image_array
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Builds a signature of a file, which changes whenever the file is written.
+    :param path: Path of the file.
+    :return: A tuple of the modification time in nanoseconds and the size of the file, None in case it doesn't exist.
+    """
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return None
+    return file_stat.st_mtime_ns, file_stat.st_size